@@ -14,6 +14,12 @@ class Settings:
     llm_spend_daily_cap_usd: float
     log_level: str
     internal_auth_token: str | None
+    text_engine: str = "pymupdf,pdfplumber"
+    text_page_cap: int = 20
+    ocr_engine: str = "tesserocr,pytesseract"
+    ocr_mode: str = "roi"
+    ocr_cache: str = ""
+    ocr_cache_max_mb: int = 512
 
 
 @lru_cache(maxsize=1)
@@ -29,4 +35,10 @@ def get_settings() -> Settings:
         log_level=os.environ.get("LOG_LEVEL", "INFO"),
         internal_auth_token=os.environ.get("INTERNAL_TOKEN")
         or os.environ.get("INTERNAL_AUTH_TOKEN"),
+        text_engine=os.environ.get("TEXT_ENGINE", "pymupdf,pdfplumber"),
+        text_page_cap=int(os.environ.get("TEXT_PAGE_CAP", "20")),
+        ocr_engine=os.environ.get("OCR_ENGINE", "tesserocr,pytesseract"),
+        ocr_mode=os.environ.get("OCR_MODE", "roi"),
+        ocr_cache=os.environ.get("OCR_CACHE", ""),
+        ocr_cache_max_mb=int(os.environ.get("OCR_CACHE_MAX_MB", "512")),
     )
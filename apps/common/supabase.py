@@ -1,11 +1,47 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from supabase import Client, create_client
 
 from .config import get_settings
 
+DEFAULT_PAGE_SIZE = 500
+
+
+def iter_table_rows(
+    client: Any,
+    table: str,
+    *,
+    filters: Dict[str, Any],
+    key: str = "id",
+    page_size: int = DEFAULT_PAGE_SIZE,
+    columns: str = "*",
+    start_after: Any = None,
+) -> Iterator[Dict[str, Any]]:
+    """Yield rows page by page using keyset pagination on ``key``.
+
+    Each page is fetched with ``key > last_seen`` rather than an offset, so
+    cost per page stays constant however deep the scan goes. List/tuple filter
+    values become ``in`` filters; ``start_after`` resumes from a checkpoint.
+    """
+
+    last_seen: Any = start_after
+    while True:
+        query = client.table(table).select(columns)
+        for column, value in filters.items():
+            if isinstance(value, (list, tuple)):
+                query = query.in_(column, list(value))
+            else:
+                query = query.eq(column, value)
+        if last_seen is not None:
+            query = query.gt(key, last_seen)
+        rows = query.order(key).limit(page_size).execute().data or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last_seen = rows[-1][key]
+
 
 class SupabaseService:
     def __init__(self) -> None:
@@ -25,10 +61,66 @@ class SupabaseService:
         response = self._client.table(table).insert(row).execute()
         return (response.data or [{}])[0]
 
+    def insert_rows(self, table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not rows:
+            return []
+        response = self._client.table(table).insert(rows).execute()
+        return response.data or []
+
+    def insert_row_once(self, table: str, row: Dict[str, Any], *, idempotency_key: str) -> Dict[str, Any]:
+        """Insert ``row`` unless a row with the same ``idempotency_key`` exists; return the stored row."""
+
+        return self.insert_row_if_absent(table, row, idempotency_key=idempotency_key)[0]
+
+    def insert_row_if_absent(
+        self, table: str, row: Dict[str, Any], *, idempotency_key: str
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Like ``insert_row_once``, also reporting whether this call created the row."""
+
+        existing = self.table_select_single(table, match={"idempotency_key": idempotency_key})
+        if existing:
+            return existing, False
+        response = (
+            self._client.table(table)
+            .upsert({**row, "idempotency_key": idempotency_key}, on_conflict="idempotency_key", ignore_duplicates=True)
+            .execute()
+        )
+        data = response.data or []
+        if data:
+            return data[0], True
+        # A concurrent caller inserted it between our select and upsert.
+        return self.table_select_single(table, match={"idempotency_key": idempotency_key}) or {}, False
+
+    def upsert_row(self, table: str, row: Dict[str, Any], *, on_conflict: str) -> Dict[str, Any]:
+        """Insert ``row``, or update the row sharing its ``on_conflict`` columns (a unique index)."""
+
+        response = self._client.table(table).upsert(row, on_conflict=on_conflict).execute()
+        return (response.data or [{}])[0]
+
     def update_row(self, table: str, *, match: Dict[str, Any], updates: Dict[str, Any]) -> Dict[str, Any]:
         response = self._client.table(table).update(updates).match(match).execute()
         return (response.data or [{}])[0]
 
+    def iter_rows(
+        self,
+        table: str,
+        *,
+        filters: Dict[str, Any],
+        key: str = "id",
+        page_size: int = DEFAULT_PAGE_SIZE,
+        columns: str = "*",
+        start_after: Any = None,
+    ) -> Iterator[Dict[str, Any]]:
+        return iter_table_rows(
+            self._client,
+            table,
+            filters=filters,
+            key=key,
+            page_size=page_size,
+            columns=columns,
+            start_after=start_after,
+        )
+
     def rpc(self, function: str, params: Dict[str, Any]) -> Any:
         return self._client.rpc(function, params=params).execute().data
 
@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+import logging
 import os
 from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
 from celery import Celery
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
 
 from apps.common.config import get_settings
+from apps.worker.services.ocr_engine import close_ocr_handles
+from apps.worker.warmup import PROCESS_ROUTINES, resolve_warmup_queues, run_warmup
+
+LOGGER = logging.getLogger(__name__)
 
 settings = get_settings()
 redis_url = os.getenv("REDIS_URL", settings.redis_url)
@@ -27,3 +33,40 @@ celery_app = Celery(
 )
 
 celery_app.autodiscover_tasks(["apps.worker.tasks"])
+
+# Resolved in the parent by ``preload_worker_backends``; forked children inherit it.
+_warm_queues: list[str] = []
+
+
+@worker_init.connect
+def preload_worker_backends(sender=None, **_kwargs) -> None:
+    """Warm OCR/rendering engines in the parent so forked children share them."""
+
+    if os.getenv("WORKER_WARMUP", "1") == "0":
+        return
+    consumed = []
+    if sender is not None:
+        queues = sender.app.amqp.queues
+        consumed = list(queues.consume_from or queues)
+    queues = resolve_warmup_queues(consumed)
+    _warm_queues[:] = queues
+    timings = run_warmup(queues)
+    LOGGER.info(
+        "Worker warmup finished in %.1fms",
+        sum(timings.values()),
+        extra={"queues": queues, "timings_ms": timings},
+    )
+
+
+@worker_process_init.connect
+def open_process_engines(**_kwargs) -> None:
+    """Open per-process OCR handles in each pool child before its first task."""
+
+    if os.getenv("WORKER_WARMUP", "1") == "0":
+        return
+    run_warmup(_warm_queues, PROCESS_ROUTINES)
+
+
+@worker_process_shutdown.connect
+def close_process_engines(**_kwargs) -> None:
+    close_ocr_handles()
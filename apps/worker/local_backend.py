@@ -0,0 +1,554 @@
+"""In-memory stand-ins for Supabase tables and storage.
+
+Used by the test suite and ``scripts/load_generate.py`` to drive the real
+worker tasks without a Supabase project. ``FaultInjector`` adds latency and
+random failures to every backend call so capacity and retry behaviour can be
+exercised locally. Tables keep hash indexes on ``id``/``user_id``/``file_id``
+and sorted indexes per ordered column, so queries stay fast with hundreds of
+thousands of rows.
+"""
+from __future__ import annotations
+
+import bisect
+import heapq
+import itertools
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from apps.common.supabase import DEFAULT_PAGE_SIZE, iter_table_rows
+
+DEFAULT_TABLES = (
+    "jobs",
+    "files",
+    "payslips",
+    "anomalies",
+    "settings",
+    "events",
+    "redactions",
+    "report_cache",
+    "maintenance_checkpoints",
+    "layout_templates",
+)
+
+
+class BackendUnavailable(RuntimeError):
+    """Raised by ``FaultInjector`` to simulate a failed Supabase/storage call."""
+
+
+@dataclass
+class FaultInjector:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    failure_rate: float = 0.0
+    seed: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        self._rng = random.Random(self.seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    def apply(self, operation: str) -> None:
+        with self._lock:
+            self.calls += 1
+            delay = self.latency_ms + (self._rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0)
+            fail = self.failure_rate > 0 and self._rng.random() < self.failure_rate
+            if fail:
+                self.failures += 1
+        if delay:
+            time.sleep(delay / 1000)
+        if fail:
+            raise BackendUnavailable(f"Injected failure in {operation}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "latency_ms": self.latency_ms,
+            "jitter_ms": self.jitter_ms,
+            "failure_rate": self.failure_rate,
+        }
+
+
+INDEXED_COLUMNS = ("id", "user_id", "file_id")
+RANGE_OPS = {"gt", "gte", "lt", "lte"}
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    # NULLs first, and never compared against real values.
+    return (0, "") if value is None else (1, value)
+
+
+def _compare(op: str, actual: Any, expected: Any) -> bool:
+    if op == "eq":
+        return actual == expected
+    if op == "neq":
+        return actual != expected
+    if op == "in":
+        return actual in expected
+    if actual is None:
+        return False
+    if op == "gt":
+        return actual > expected
+    if op == "gte":
+        return actual >= expected
+    if op == "lt":
+        return actual < expected
+    return actual <= expected
+
+
+class LocalTable(list):
+    """Row list with hash indexes on ``INDEXED_COLUMNS`` and lazily built sorted indexes.
+
+    Indexes follow inserts, deletes and ``update_row``; rows mutated in place
+    on indexed or ordered columns must go through the service API.
+    """
+
+    def __init__(self, rows: Iterable[Dict[str, Any]] = ()) -> None:
+        super().__init__()
+        self._reset()
+        for row in rows:
+            self.append(row)
+
+    def _reset(self) -> None:
+        self._hash: Dict[str, Dict[Any, Dict[int, Dict[str, Any]]]] = {column: {} for column in INDEXED_COLUMNS}
+        self._seq: Dict[int, int] = {}
+        self._sorted: Dict[str, List[Tuple[Tuple[int, Any], int, Dict[str, Any]]]] = {}
+        self._next = 0
+
+    def _index(self, row: Dict[str, Any]) -> None:
+        self._seq[id(row)] = self._next
+        self._next += 1
+        for column, buckets in self._hash.items():
+            buckets.setdefault(row.get(column), {})[id(row)] = row
+        for column, ordered in self._sorted.items():
+            bisect.insort(ordered, (_sort_key(row.get(column)), self._seq[id(row)], row), key=lambda item: item[:2])
+
+    def _unindex(self, row: Dict[str, Any]) -> None:
+        for column, buckets in self._hash.items():
+            bucket = buckets.get(row.get(column))
+            if bucket is not None:
+                bucket.pop(id(row), None)
+        self._seq.pop(id(row), None)
+        self._sorted.clear()
+
+    def _rebuild(self) -> None:
+        rows = list(self)
+        self._reset()
+        for row in rows:
+            self._index(row)
+
+    def append(self, row: Dict[str, Any]) -> None:  # type: ignore[override]
+        super().append(row)
+        self._index(row)
+
+    def extend(self, rows: Iterable[Dict[str, Any]]) -> None:  # type: ignore[override]
+        for row in rows:
+            self.append(row)
+
+    def __setitem__(self, index: Any, value: Any) -> None:
+        super().__setitem__(index, value)
+        self._rebuild()
+
+    def __delitem__(self, index: Any) -> None:
+        super().__delitem__(index)
+        self._rebuild()
+
+    def remove(self, row: Dict[str, Any]) -> None:  # type: ignore[override]
+        super().remove(row)
+        self._rebuild()
+
+    def pop(self, index: int = -1) -> Dict[str, Any]:  # type: ignore[override]
+        row = super().pop(index)
+        self._rebuild()
+        return row
+
+    def clear(self) -> None:
+        super().clear()
+        self._reset()
+
+    def lookup(self, column: str, values: Iterable[Any]) -> List[Dict[str, Any]]:
+        """Rows whose indexed ``column`` equals any of ``values``, in insertion order."""
+
+        buckets = self._hash[column]
+        found: Dict[int, Dict[str, Any]] = {}
+        for value in values:
+            found.update(buckets.get(value, {}))
+        if len(found) > 1:
+            return sorted(found.values(), key=lambda row: self._seq[id(row)])
+        return list(found.values())
+
+    def ordered(self, column: str) -> List[Tuple[Tuple[int, Any], int, Dict[str, Any]]]:
+        if column not in self._sorted:
+            self._sorted[column] = sorted(
+                ((_sort_key(row.get(column)), self._seq[id(row)], row) for row in self),
+                key=lambda item: item[:2],
+            )
+        return self._sorted[column]
+
+    def reindex(self, row: Dict[str, Any], updates: Dict[str, Any]) -> None:
+        """Apply ``updates`` to ``row`` keeping every index consistent."""
+
+        touched_hash = [column for column in INDEXED_COLUMNS if column in updates and updates[column] != row.get(column)]
+        for column in touched_hash:
+            self._hash[column].get(row.get(column), {}).pop(id(row), None)
+        row.update(updates)
+        for column in touched_hash:
+            self._hash[column].setdefault(row.get(column), {})[id(row)] = row
+        for column in [column for column in self._sorted if column in updates]:
+            del self._sorted[column]
+
+    def discard(self, doomed: List[Dict[str, Any]]) -> None:
+        if not doomed:
+            return
+        ids = {id(row) for row in doomed}
+        for row in doomed:
+            self._unindex(row)
+        keep = [row for row in self if id(row) not in ids]
+        super().__init__(keep)
+
+
+class LocalTables(dict):
+    """Table map that turns plain lists assigned by callers into indexed tables."""
+
+    def __setitem__(self, name: str, rows: Iterable[Dict[str, Any]]) -> None:
+        super().__setitem__(name, rows if isinstance(rows, LocalTable) else LocalTable(rows))
+
+    def setdefault(self, name: str, default: Any = None) -> LocalTable:  # type: ignore[override]
+        if name not in self:
+            self[name] = default or ()
+        return self[name]
+
+
+class LocalQuery:
+    """PostgREST-style builder: filters, ``order``, ``limit``, ``select`` or ``delete``."""
+
+    def __init__(self, service: "LocalSupabaseService", table: str) -> None:
+        self._service = service
+        self._table = table
+        self._filters: List[Tuple[str, str, Any]] = []
+        self._order: Optional[str] = None
+        self._desc = False
+        self._limit: Optional[int] = None
+        self._delete = False
+
+    def select(self, *_: Any) -> "LocalQuery":
+        return self
+
+    def delete(self) -> "LocalQuery":
+        self._delete = True
+        return self
+
+    def match(self, match: Dict[str, Any]) -> "LocalQuery":
+        for key, value in match.items():
+            self.eq(key, value)
+        return self
+
+    def _filter(self, op: str, key: str, value: Any) -> "LocalQuery":
+        self._filters.append((op, key, value))
+        return self
+
+    def eq(self, key: str, value: Any) -> "LocalQuery":
+        return self._filter("eq", key, value)
+
+    def neq(self, key: str, value: Any) -> "LocalQuery":
+        return self._filter("neq", key, value)
+
+    def gt(self, key: str, value: Any) -> "LocalQuery":
+        return self._filter("gt", key, value)
+
+    def gte(self, key: str, value: Any) -> "LocalQuery":
+        return self._filter("gte", key, value)
+
+    def lt(self, key: str, value: Any) -> "LocalQuery":
+        return self._filter("lt", key, value)
+
+    def lte(self, key: str, value: Any) -> "LocalQuery":
+        return self._filter("lte", key, value)
+
+    def in_(self, key: str, values: Iterable[Any]) -> "LocalQuery":
+        return self._filter("in", key, set(values))
+
+    def order(self, key: str, desc: bool = False) -> "LocalQuery":
+        self._order = key
+        self._desc = desc
+        return self
+
+    def limit(self, value: int) -> "LocalQuery":
+        self._limit = value
+        return self
+
+    def _candidates(self, table: LocalTable) -> Tuple[Iterable[Dict[str, Any]], List[Tuple[str, str, Any]], bool]:
+        """Pick the cheapest access path; returns (rows, remaining filters, already ordered)."""
+
+        lookups = [
+            (op, key, value) for op, key, value in self._filters if key in INDEXED_COLUMNS and op in ("eq", "in")
+        ]
+        if lookups:
+            best = min(lookups, key=lambda item: 1 if item[0] == "eq" else len(item[2]))
+            values = [best[2]] if best[0] == "eq" else best[2]
+            rest = [item for item in self._filters if item is not best]
+            return table.lookup(best[1], values), rest, False
+        if self._order is None:
+            return list(table), self._filters, False
+        ordered = table.ordered(self._order)
+        low, high = 0, len(ordered)
+        rest = []
+        for op, key, value in self._filters:
+            if key != self._order or op not in RANGE_OPS or value is None:
+                rest.append((op, key, value))
+                continue
+            # Range filters never match NULLs, which sort first.
+            low = max(low, bisect.bisect_left(ordered, ((1,),), key=lambda item: item[:1]))
+            probe = (_sort_key(value),)
+            if op in ("gt", "gte"):
+                finder = bisect.bisect_right if op == "gt" else bisect.bisect_left
+                low = max(low, finder(ordered, probe, key=lambda item: item[:1]))
+            else:
+                finder = bisect.bisect_left if op == "lt" else bisect.bisect_right
+                high = min(high, finder(ordered, probe, key=lambda item: item[:1]))
+        window = ordered[low:high] if low < high else []
+        if self._desc:
+            window = window[::-1]
+        return (row for _, _, row in window), rest, True
+
+    def execute(self) -> SimpleNamespace:
+        self._service.faults.apply(f"{'delete' if self._delete else 'select'}:{self._table}")
+        return SimpleNamespace(data=self._run())
+
+    def _run(self) -> List[Dict[str, Any]]:
+        with self._service.lock:
+            table = self._service.tables.setdefault(self._table)
+            rows, filters, ordered = self._candidates(table)
+            matches = (row for row in rows if all(_compare(op, row.get(key), value) for op, key, value in filters))
+            if self._order and not ordered:
+                key = self._order
+                if self._limit is not None:
+                    pick = heapq.nlargest if self._desc else heapq.nsmallest
+                    result = pick(self._limit, matches, key=lambda row: _sort_key(row.get(key)))
+                else:
+                    result = sorted(matches, key=lambda row: _sort_key(row.get(key)), reverse=self._desc)
+            else:
+                result = list(itertools.islice(matches, self._limit)) if self._limit is not None else list(matches)
+            if self._delete:
+                table.discard(result)
+        return result
+
+
+class LocalClient:
+    def __init__(self, service: "LocalSupabaseService") -> None:
+        self._service = service
+
+    def table(self, name: str) -> LocalQuery:
+        return LocalQuery(self._service, name)
+
+
+class LocalSupabaseService:
+    """Mirror of ``SupabaseService`` backed by indexed in-process tables."""
+
+    def __init__(self, *, faults: Optional[FaultInjector] = None) -> None:
+        self.tables = LocalTables()
+        for name in DEFAULT_TABLES:
+            self.tables[name] = ()
+        self.rpc_handlers: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            "rpc_dossier_aggregate": self._dossier_aggregate,
+            "rpc_layout_template_hit": self._layout_template_hit,
+        }
+        self.faults = faults or FaultInjector()
+        self.lock = threading.RLock()
+        self.client = LocalClient(self)
+
+    def _first(self, table: str, match: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # Callers have already paid the injected fault for their own operation.
+        data = self.client.table(table).match(match).limit(1)._run()
+        return data[0] if data else None
+
+    def table_select_single(self, table: str, *, match: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        self.faults.apply(f"select:{table}")
+        with self.lock:
+            return self._first(table, match)
+
+    def insert_row(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        self.faults.apply(f"insert:{table}")
+        payload = dict(row)
+        payload.setdefault("id", str(uuid.uuid4()))
+        payload.setdefault("created_at", datetime.utcnow().isoformat())
+        with self.lock:
+            self.tables.setdefault(table).append(payload)
+        return payload
+
+    def insert_row_once(self, table: str, row: Dict[str, Any], *, idempotency_key: str) -> Dict[str, Any]:
+        return self.insert_row_if_absent(table, row, idempotency_key=idempotency_key)[0]
+
+    def insert_row_if_absent(
+        self, table: str, row: Dict[str, Any], *, idempotency_key: str
+    ) -> Tuple[Dict[str, Any], bool]:
+        with self.lock:
+            existing = self.table_select_single(table, match={"idempotency_key": idempotency_key})
+            if existing:
+                return existing, False
+            return self.insert_row(table, {**row, "idempotency_key": idempotency_key}), True
+
+    def insert_rows(self, table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [self.insert_row(table, row) for row in rows]
+
+    def upsert_row(self, table: str, row: Dict[str, Any], *, on_conflict: str) -> Dict[str, Any]:
+        self.faults.apply(f"upsert:{table}")
+        with self.lock:
+            columns = [column.strip() for column in on_conflict.split(",")]
+            existing = self._first(table, {column: row.get(column) for column in columns})
+            if existing is None:
+                return self.insert_row(table, row)
+            self.tables[table].reindex(existing, row)
+            return existing
+
+    def update_row(self, table: str, *, match: Dict[str, Any], updates: Dict[str, Any]) -> Dict[str, Any]:
+        self.faults.apply(f"update:{table}")
+        with self.lock:
+            row = self._first(table, match)
+            if row is None:
+                return {}
+            self.tables[table].reindex(row, updates)
+            return row
+
+    def iter_rows(
+        self,
+        table: str,
+        *,
+        filters: Dict[str, Any],
+        key: str = "id",
+        page_size: int = DEFAULT_PAGE_SIZE,
+        columns: str = "*",
+        start_after: Any = None,
+    ) -> Iterator[Dict[str, Any]]:
+        # The production keyset pager, run against the local client.
+        return iter_table_rows(
+            self.client,
+            table,
+            filters=filters,
+            key=key,
+            page_size=page_size,
+            columns=columns,
+            start_after=start_after,
+        )
+
+    def rpc(self, function: str, params: Dict[str, Any]) -> Any:
+        self.faults.apply(f"rpc:{function}")
+        handler = self.rpc_handlers.get(function)
+        return handler(params) if handler else {}
+
+    def _layout_template_hit(self, params: Dict[str, Any]) -> Optional[int]:
+        with self.lock:
+            row = self._first("layout_templates", {"id": params["p_id"]})
+            if row is None:
+                return None
+            hits = (row.get("hits") or 0) + 1
+            self.tables["layout_templates"].reindex(row, {"hits": hits, "last_used_at": datetime.utcnow().isoformat()})
+            return hits
+
+    @staticmethod
+    def _dossier_aggregate(params: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "year": params.get("p_year"),
+            "totals": {
+                "gross": 12800.0,
+                "net": 8600.0,
+            },
+        }
+
+
+@dataclass
+class LocalObject:
+    path: str
+    bytes: bytes
+    content_type: str
+
+
+class LocalStorageService:
+    """Mirror of ``StorageService`` keeping objects in memory.
+
+    ``fixtures`` is a directory consulted for PDFs and other objects that were
+    never uploaded, matched on file name (``<file_id>.pdf``).
+    """
+
+    def __init__(self, fixtures: Optional[Path] = None, *, faults: Optional[FaultInjector] = None) -> None:
+        self._fixtures = fixtures
+        self.faults = faults or FaultInjector()
+        self.uploads: Dict[str, bytes] = {}
+        self.deleted: List[str] = []
+
+    def _fixture_bytes(self, name: str) -> Optional[bytes]:
+        if self._fixtures is None:
+            return None
+        candidate = self._fixtures / name
+        return candidate.read_bytes() if candidate.exists() else None
+
+    def download_pdf(self, *, user_id: str, file_id: str, password: Optional[str] = None) -> LocalObject:
+        self.faults.apply("storage:download")
+        path = f"{user_id}/{file_id}.pdf"
+        data = self.uploads.get(path)
+        if data is None:
+            data = self._fixture_bytes(f"{file_id}.pdf")
+        if data is None:
+            raise FileNotFoundError(path)
+        return LocalObject(path=path, bytes=data, content_type="application/pdf")
+
+    def create_signed_url(self, path: str, expires_in: int = 300) -> str:
+        return f"https://storage.local/{path}?expires={expires_in}"
+
+    def fetch_signed_object(self, path: str, *, expires_in: int = 300) -> LocalObject:
+        self.faults.apply("storage:fetch")
+        data = self.uploads.get(path)
+        if data is None:
+            data = self._fixture_bytes(Path(path).name) or b""
+        content_type = "image/png" if path.endswith(".png") else "application/octet-stream"
+        return LocalObject(path=path, bytes=data, content_type=content_type)
+
+    def upload_bytes(self, *, user_id: str, name: str, content_type: str, data: bytes) -> LocalObject:
+        self.faults.apply("storage:upload")
+        path = f"{user_id}/{name}"
+        self.uploads[path] = data
+        return LocalObject(path=path, bytes=data, content_type=content_type)
+
+    def upload_file(self, *, user_id: str, name: str, content_type: str, file_obj: Any) -> str:
+        self.faults.apply("storage:upload")
+        path = f"{user_id}/{name}"
+        self.uploads[path] = file_obj.read()
+        return path
+
+    def delete_objects(self, paths: List[str]) -> None:
+        self.faults.apply("storage:delete")
+        for path in paths:
+            if path:
+                self.uploads.pop(path, None)
+                self.deleted.append(path)
+
+
+def install_local_backend(supabase: LocalSupabaseService, storage: LocalStorageService) -> None:
+    """Route ``get_supabase()``/``get_storage_service()`` to the local stand-ins process-wide."""
+
+    from apps.common import supabase as supabase_module
+    from apps.worker.services import storage as storage_module
+
+    supabase_module._supabase_service = supabase  # type: ignore[assignment]
+    storage_module._storage_service = storage  # type: ignore[assignment]
+
+
+__all__ = [
+    "BackendUnavailable",
+    "FaultInjector",
+    "LocalClient",
+    "LocalQuery",
+    "LocalTable",
+    "LocalTables",
+    "LocalStorageService",
+    "LocalSupabaseService",
+    "install_local_backend",
+]
@@ -3,10 +3,7 @@ from __future__ import annotations
 import logging
 from typing import Optional
 
-try:
-    import pyclamd
-except Exception:  # pragma: no cover - optional dependency may be missing
-    pyclamd = None
+from .backends import load_backend
 
 LOGGER = logging.getLogger(__name__)
 _VERSION_LOGGED = False
@@ -18,6 +15,7 @@ class AntivirusError(RuntimeError):
 
 def scan_bytes(data: bytes, *, host: str = "clamav", port: int = 3310, timeout: int = 30) -> None:
     """Scan payload using ClamAV if available."""
+    pyclamd = load_backend("pyclamd")
     if pyclamd is None:
         LOGGER.warning("pyclamd unavailable; skipping antivirus scan.")
         return
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import importlib
+import logging
+import sys
+import time
+from functools import lru_cache
+from types import ModuleType
+from typing import Dict, List, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+# Heavy optional libraries are only imported on first use so that processes
+# serving cheap queues (generic jobs, retention cleanup) never pay for them.
+BACKENDS: Dict[str, str] = {
+    "fitz": "fitz",
+    "pdfplumber": "pdfplumber",
+    "pytesseract": "pytesseract",
+    "tesserocr": "tesserocr",
+    "image": "PIL.Image",
+    "image_draw": "PIL.ImageDraw",
+    "image_font": "PIL.ImageFont",
+    "weasyprint": "weasyprint",
+    "jinja2": "jinja2",
+    "pyarrow": "pyarrow",
+    "openai": "openai",
+    "pyclamd": "pyclamd",
+    "redis": "redis",
+}
+
+
+@lru_cache(maxsize=None)
+def load_backend(name: str) -> Optional[ModuleType]:
+    """Import a registered backend once per process, returning ``None`` if unavailable."""
+
+    module_name = BACKENDS[name]
+    started = time.perf_counter()
+    try:
+        module = importlib.import_module(module_name)
+    except Exception as exc:  # pragma: no cover - optional dependency may be missing
+        LOGGER.warning("Backend %s unavailable: %s", module_name, exc)
+        return None
+    LOGGER.debug("Loaded backend %s in %.1fms", module_name, (time.perf_counter() - started) * 1000)
+    return module
+
+
+def require_backend(name: str) -> ModuleType:
+    module = load_backend(name)
+    if module is None:
+        raise RuntimeError(f"Required backend {BACKENDS[name]} is not installed")
+    return module
+
+
+def loaded_backends() -> List[str]:
+    return [name for name, module_name in BACKENDS.items() if module_name in sys.modules]
+
+
+__all__ = ["BACKENDS", "load_backend", "require_backend", "loaded_backends"]
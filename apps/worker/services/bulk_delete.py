@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from apps.common.supabase import get_supabase
+from .ocr_cache import purge_ocr_cache
+from .storage import StorageService, get_storage_service
+
+LOGGER = logging.getLogger(__name__)
+
+# Supabase storage accepts a list of paths per remove() call; stay well under request limits.
+STORAGE_BATCH_SIZE = 1000
+USER_BATCH_SIZE = 200
+EXPIRED_PAGE_SIZE = 500
+NIL_UUID = "00000000-0000-0000-0000-000000000000"
+CHECKPOINT_TABLE = "maintenance_checkpoints"
+FILE_COLUMNS = "id, user_id, s3_key_original, s3_key_redacted, created_at"
+
+
+@dataclass(slots=True)
+class DeletionReport:
+    users: int = 0
+    batches: int = 0
+    storage_objects: int = 0
+    rows: Dict[str, int] = field(default_factory=dict)
+    per_user: Dict[str, int] = field(default_factory=dict)
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+    resumed_from: Optional[str] = None
+
+    def add_rows(self, counts: Dict[str, Any]) -> None:
+        for table, count in (counts or {}).items():
+            self.rows[table] = self.rows.get(table, 0) + int(count or 0)
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.timings_ms[stage] = round(self.timings_ms.get(stage, 0.0) + elapsed, 2)
+
+    def as_dict(self) -> Dict[str, Any]:
+        summary = asdict(self)
+        summary.pop("per_user")
+        return summary
+
+
+class StoragePurger:
+    """Accumulate storage paths and remove them in large batches.
+
+    ``max_per_second`` paces removals so parallel shards stay under the
+    storage API's request budget.
+    """
+
+    def __init__(
+        self,
+        storage: StorageService,
+        *,
+        batch_size: int = STORAGE_BATCH_SIZE,
+        max_per_second: Optional[float] = None,
+    ) -> None:
+        self._storage = storage
+        self._batch_size = batch_size
+        self._max_per_second = max_per_second
+        self._started = time.monotonic()
+        self._pending: List[str] = []
+        self.removed = 0
+
+    def add(self, paths: Iterable[Optional[str]]) -> None:
+        self._pending.extend(path for path in paths if path)
+        while len(self._pending) >= self._batch_size:
+            self._remove(self._pending[: self._batch_size])
+            self._pending = self._pending[self._batch_size :]
+
+    def flush(self) -> None:
+        if self._pending:
+            self._remove(self._pending)
+            self._pending = []
+
+    def _remove(self, paths: List[str]) -> None:
+        if self._max_per_second:
+            earliest = self._started + self.removed / self._max_per_second
+            delay = earliest - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        self._storage.delete_objects(paths)
+        self.removed += len(paths)
+
+
+def file_paths(row: Dict[str, Any]) -> List[str]:
+    user_id = row["user_id"]
+    return [
+        row.get("s3_key_original") or f"{user_id}/{row['id']}.pdf",
+        row.get("s3_key_redacted") or f"{user_id}/{row['id']}_redacted.png",
+    ]
+
+
+def load_checkpoint(name: str) -> Optional[str]:
+    row = get_supabase().table_select_single(CHECKPOINT_TABLE, match={"name": name})
+    return (row or {}).get("cursor")
+
+
+def save_checkpoint(name: str, cursor: Optional[str]) -> None:
+    supabase = get_supabase()
+    updates = {"cursor": cursor, "updated_at": datetime.now(timezone.utc).isoformat()}
+    if supabase.table_select_single(CHECKPOINT_TABLE, match={"name": name}):
+        supabase.update_row(CHECKPOINT_TABLE, match={"name": name}, updates=updates)
+    else:
+        supabase.insert_row(CHECKPOINT_TABLE, {"name": name, **updates})
+
+
+def clear_checkpoint(name: str) -> None:
+    save_checkpoint(name, None)
+
+
+def _chunks(items: Sequence[str], size: int) -> Iterator[List[str]]:
+    for start in range(0, len(items), size):
+        yield list(items[start : start + size])
+
+
+def _purge_cached_ocr(report: DeletionReport, user_ids: Sequence[str]) -> None:
+    """Cached OCR results hold payslip text, so they go with the user's data."""
+
+    with report.timer("ocr_cache"):
+        purged = purge_ocr_cache(user_ids)
+    if purged:
+        report.add_rows({"ocr_cache": purged})
+
+
+def delete_users(
+    user_ids: Iterable[str],
+    *,
+    purge_all: bool = False,
+    batch_size: int = USER_BATCH_SIZE,
+    checkpoint: Optional[str] = None,
+) -> DeletionReport:
+    """Delete all data for many users.
+
+    Storage objects are collected across users and removed in large batches,
+    then every table is cleared by one ``rpc_delete_user_data`` call per user
+    batch. With ``checkpoint`` set, the last finished user id is persisted so
+    an interrupted run resumes after it.
+    """
+
+    supabase = get_supabase()
+    purger = StoragePurger(get_storage_service())
+    report = DeletionReport()
+    ordered = sorted(set(user_ids))
+    if checkpoint:
+        report.resumed_from = load_checkpoint(checkpoint)
+        if report.resumed_from:
+            ordered = [user_id for user_id in ordered if user_id > report.resumed_from]
+    for batch in _chunks(ordered, batch_size):
+        with report.timer("storage"):
+            for row in supabase.iter_rows("files", filters={"user_id": batch}, columns=FILE_COLUMNS):
+                purger.add(file_paths(row))
+            for row in supabase.iter_rows("report_cache", filters={"user_id": batch}, columns="id, storage_path"):
+                purger.add([row.get("storage_path")])
+            purger.flush()
+        with report.timer("rows"):
+            counts = supabase.rpc("rpc_delete_user_data", {"p_user_ids": batch, "p_purge_settings": purge_all})
+        report.add_rows(counts or {})
+        _purge_cached_ocr(report, batch)
+        report.users += len(batch)
+        report.batches += 1
+        if checkpoint:
+            save_checkpoint(checkpoint, batch[-1])
+    report.storage_objects = purger.removed
+    if checkpoint:
+        clear_checkpoint(checkpoint)
+    LOGGER.info("Bulk user deletion finished", extra=report.as_dict())
+    return report
+
+
+def _split_cursor(cursor: Optional[str]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Parse ``user_id:created_at:file_id``; a pre-0010 ``user_id:file_id`` cursor has no created_at."""
+
+    if not cursor:
+        return None, None, None
+    user_id, _, rest = cursor.partition(":")
+    created_at, _, file_id = rest.rpartition(":")
+    return user_id, created_at or None, file_id
+
+
+def shard_bounds(index: int, count: int) -> Tuple[Optional[str], Optional[str]]:
+    """Return the ``[low, high)`` user id range of shard ``index`` out of ``count``.
+
+    User ids are random UUIDs, so splitting on the leading 32 bits spreads
+    users evenly. ``None`` means unbounded.
+    """
+
+    def boundary(position: int) -> Optional[str]:
+        if position <= 0 or position >= count:
+            return None
+        return f"{position * 0x100000000 // count:08x}-0000-0000-0000-000000000000"
+
+    return boundary(index), boundary(index + 1)
+
+
+def _expired_pages(
+    report: DeletionReport,
+    function: str,
+    *,
+    checkpoint: str,
+    as_of: str,
+    default_days: int,
+    user_range: Tuple[Optional[str], Optional[str]],
+    page_size: int,
+) -> Iterator[List[Dict[str, Any]]]:
+    """Page through an expired set in (user_id, created_at, id) order.
+
+    The keyset cursor is checkpointed once the caller has finished with a
+    page, so a crash replays at most the page being deleted.
+    """
+
+    supabase = get_supabase()
+    low, high = user_range
+    after_user, after_created_at, after_id = _split_cursor(load_checkpoint(checkpoint))
+    if after_user is None and low is not None:
+        after_user, after_id = low, NIL_UUID
+    while True:
+        with report.timer("scan"):
+            page = supabase.rpc(
+                function,
+                {
+                    "p_as_of": as_of,
+                    "p_default_days": default_days,
+                    "p_after_user": after_user,
+                    "p_after_created_at": after_created_at,
+                    "p_after_id": after_id,
+                    "p_before_user": high,
+                    "p_limit": page_size,
+                },
+            ) or []
+        if not page:
+            return
+        yield page
+        report.batches += 1
+        after_user, after_created_at, after_id = page[-1]["user_id"], page[-1]["created_at"], page[-1]["id"]
+        save_checkpoint(checkpoint, f"{after_user}:{after_created_at}:{after_id}")
+        if len(page) < page_size:
+            return
+
+
+def retention_sweep(
+    default_days: int = 90,
+    *,
+    page_size: int = EXPIRED_PAGE_SIZE,
+    checkpoint: str = "retention_cleanup",
+    user_range: Tuple[Optional[str], Optional[str]] = (None, None),
+    max_storage_per_second: Optional[float] = None,
+) -> DeletionReport:
+    """Delete files and payslips past each user's retention window.
+
+    ``rpc_retention_expired_files`` computes the expired set across all users
+    in one indexed query; pages of it are purged from storage and then
+    deleted by id (their payslips go with them), so the sweep costs
+    O(expired rows) rather than a round trip per user. Payslips without a
+    file expire on their own ``created_at`` through
+    ``rpc_retention_expired_payslips``. Each pass checkpoints its
+    (user_id, created_at, id) keyset cursor after every page, under
+    ``checkpoint`` and ``checkpoint:payslips``. ``user_range`` restricts the
+    sweep to one shard.
+    """
+
+    supabase = get_supabase()
+    purger = StoragePurger(get_storage_service(), max_per_second=max_storage_per_second)
+    report = DeletionReport(resumed_from=load_checkpoint(checkpoint))
+    scan = {
+        "as_of": datetime.now(timezone.utc).isoformat(),
+        "default_days": default_days,
+        "user_range": user_range,
+        "page_size": page_size,
+    }
+    users: Set[str] = set()
+    for page in _expired_pages(report, "rpc_retention_expired_files", checkpoint=checkpoint, **scan):
+        with report.timer("storage"):
+            for row in page:
+                purger.add(file_paths(row))
+            purger.flush()
+        with report.timer("rows"):
+            removed = supabase.rpc("rpc_retention_delete_files", {"p_file_ids": [row["id"] for row in page]})
+        for row in removed or []:
+            user_id = row["user_id"]
+            report.per_user[user_id] = report.per_user.get(user_id, 0) + int(row.get("payslips") or 0)
+            report.add_rows({"payslips": row.get("payslips"), "files": row.get("files")})
+        users.update(row["user_id"] for row in page)
+    orphans = f"{checkpoint}:payslips"
+    for page in _expired_pages(report, "rpc_retention_expired_payslips", checkpoint=orphans, **scan):
+        with report.timer("rows"):
+            removed = supabase.rpc("rpc_retention_delete_payslips", {"p_payslip_ids": [row["id"] for row in page]})
+        for row in removed or []:
+            user_id = row["user_id"]
+            report.per_user[user_id] = report.per_user.get(user_id, 0) + int(row.get("payslips") or 0)
+            report.add_rows({"payslips": row.get("payslips")})
+        users.update(row["user_id"] for row in page)
+    report.users = len(users)
+    report.storage_objects = purger.removed
+    # Cache entries are keyed by user, not file: drop the whole cache of anyone whose files expired.
+    _purge_cached_ocr(report, sorted(users))
+    clear_checkpoint(checkpoint)
+    clear_checkpoint(orphans)
+    LOGGER.info("Retention sweep finished", extra=report.as_dict())
+    return report
+
+
+__all__ = [
+    "DeletionReport",
+    "StoragePurger",
+    "delete_users",
+    "retention_sweep",
+    "shard_bounds",
+    "load_checkpoint",
+    "save_checkpoint",
+    "clear_checkpoint",
+]
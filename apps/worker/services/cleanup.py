@@ -1,61 +1,75 @@
 from __future__ import annotations
 
 import logging
-from datetime import datetime, timedelta, timezone
-from typing import Dict
+from typing import List, Optional
 
 from apps.common.supabase import get_supabase
-from .storage import get_storage_service
+
+from .bulk_delete import CHECKPOINT_TABLE, DeletionReport, clear_checkpoint, delete_users, retention_sweep, shard_bounds
 
 LOGGER = logging.getLogger(__name__)
 
+RETENTION_CHECKPOINT = "retention_cleanup"
+
+
+def retention_checkpoint(shard: int, shards: int) -> str:
+    return RETENTION_CHECKPOINT if shards == 1 else f"{RETENTION_CHECKPOINT}:{shard}/{shards}"
+
+
+def _checkpoint_shards(name: str) -> Optional[int]:
+    """Shard count a retention checkpoint (files or ``:payslips`` pass) was written under; ``None`` if not one."""
+
+    if name != RETENTION_CHECKPOINT and not name.startswith(f"{RETENTION_CHECKPOINT}:"):
+        return None
+    rest = name[len(RETENTION_CHECKPOINT):].removesuffix(":payslips")
+    if not rest:
+        return 1
+    _, _, count = rest.partition("/")
+    return int(count) if count.isdigit() else None
+
+
+def delete_user_data(user_id: str, *, purge_all: bool = False) -> DeletionReport:
+    return delete_users([user_id], purge_all=purge_all)
 
-def delete_user_data(user_id: str, *, purge_all: bool = False) -> None:
-    supabase = get_supabase()
-    storage = get_storage_service()
-    files_response = (
-        supabase.client.table("files")
-        .select("id, s3_key_original, s3_key_redacted")
-        .eq("user_id", user_id)
-        .execute()
+
+def retention_cleanup(
+    default_days: int = 90,
+    *,
+    shard: int = 0,
+    shards: int = 1,
+    max_storage_per_second: Optional[float] = None,
+) -> DeletionReport:
+    return retention_sweep(
+        default_days,
+        checkpoint=retention_checkpoint(shard, shards),
+        user_range=shard_bounds(shard, shards),
+        max_storage_per_second=max_storage_per_second,
     )
-    for row in files_response.data or []:
-        path = row.get("s3_key_original") or f"{user_id}/{row['id']}.pdf"
-        preview_path = row.get("s3_key_redacted") or f"{user_id}/{row['id']}_redacted.png"
-        storage.delete_objects([path, preview_path])
-    tables = ["payslips", "files", "anomalies", "redactions", "llm_usage", "events", "jobs"]
-    for table in tables:
-        LOGGER.info("Deleting from %s", table)
-        supabase.client.table(table).delete().eq("user_id", user_id).execute()
-    if purge_all:
-        supabase.client.table("settings").delete().eq("user_id", user_id).execute()
-
-
-def retention_cleanup(default_days: int = 90) -> Dict[str, int]:
-    supabase = get_supabase()
-    storage = get_storage_service()
-    settings_response = supabase.client.table("settings").select("user_id, retention_days").execute()
-    now = datetime.now(timezone.utc)
-    counts: Dict[str, int] = {}
-    for row in settings_response.data or []:
-        user_id = row["user_id"]
-        retention_days = row.get("retention_days") or default_days
-        cutoff = (now - timedelta(days=retention_days)).isoformat()
-        old_files = (
-            supabase.client.table("files")
-            .select("id, s3_key_original, s3_key_redacted, created_at")
-            .eq("user_id", user_id)
-            .lt("created_at", cutoff)
-            .execute()
-        )
-        for file_row in old_files.data or []:
-            path = file_row.get("s3_key_original") or f"{user_id}/{file_row['id']}.pdf"
-            preview_path = file_row.get("s3_key_redacted") or f"{user_id}/{file_row['id']}_redacted.png"
-            storage.delete_objects([path, preview_path])
-        supabase.client.table("files").delete().eq("user_id", user_id).lt("created_at", cutoff).execute()
-        response = supabase.client.table("payslips").delete().eq("user_id", user_id).lt("created_at", cutoff).execute()
-        counts[user_id] = len(response.data or [])
-    return counts
-
-
-__all__ = ["delete_user_data", "retention_cleanup"]
+
+
+def reset_stale_retention_checkpoints(shards: int) -> List[str]:
+    """Clear cursors left by an interrupted run under a different shard count.
+
+    Shard ranges move when ``RETENTION_SHARDS`` changes, so an old cursor
+    would skip users in the new shard, or resume a shard that no longer
+    exists. Returns the cleared checkpoint names.
+    """
+
+    stale = [
+        row["name"]
+        for row in get_supabase().iter_rows(CHECKPOINT_TABLE, filters={}, key="name")
+        if row.get("cursor") and _checkpoint_shards(row["name"]) not in (None, shards)
+    ]
+    for name in stale:
+        clear_checkpoint(name)
+    if stale:
+        LOGGER.info("Cleared %d retention checkpoints from a run with another shard count", len(stale))
+    return stale
+
+
+__all__ = [
+    "delete_user_data",
+    "reset_stale_retention_checkpoints",
+    "retention_checkpoint",
+    "retention_cleanup",
+]
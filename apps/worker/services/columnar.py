@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import json
+import logging
+import shutil
+import tempfile
+import zipfile
+from datetime import date, datetime, timezone
+from decimal import Decimal, InvalidOperation
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+from apps.worker.services.backends import load_backend
+
+LOGGER = logging.getLogger(__name__)
+
+COLUMNAR_FORMATS = {"parquet": "parquet", "arrow": "arrow"}
+BATCH_ROWS = 1000
+MONEY_PRECISION = 12
+MONEY_SCALE = 2
+
+# (column, kind) pairs; kinds map to Arrow types in _arrow_type.
+PAYSLIP_COLUMNS: List[Tuple[str, str]] = [
+    ("id", "string"),
+    ("file_id", "string"),
+    ("employer_name", "string"),
+    ("pay_date", "date"),
+    ("period_start", "date"),
+    ("period_end", "date"),
+    ("period_type", "category"),
+    ("country", "category"),
+    ("currency", "category"),
+    ("gross", "money"),
+    ("net", "money"),
+    ("tax_income", "money"),
+    ("ni_prsi", "money"),
+    ("pension_employee", "money"),
+    ("pension_employer", "money"),
+    ("student_loan", "money"),
+    ("other_deductions", "json"),
+    ("tax_code", "string"),
+    ("confidence_overall", "float"),
+    ("review_required", "bool"),
+    ("conflict", "bool"),
+    ("created_at", "timestamp"),
+]
+ANOMALY_COLUMNS: List[Tuple[str, str]] = [
+    ("id", "string"),
+    ("payslip_id", "string"),
+    ("type", "category"),
+    ("severity", "category"),
+    ("message", "string"),
+    ("muted", "bool"),
+    ("snoozed_until", "date"),
+    ("created_at", "timestamp"),
+]
+YTD_COLUMNS: List[Tuple[str, str]] = [
+    ("payslip_id", "string"),
+    ("pay_date", "date"),
+    ("currency", "category"),
+    ("field", "category"),
+    ("amount", "money"),
+]
+
+COLUMNAR_TABLES = {"payslips", "anomalies"}
+# Row keys exported through another table rather than as a column of their own.
+DERIVED_KEYS = {"payslips": {"ytd"}, "anomalies": set()}
+# Rows are spooled to disk past this size while undeclared columns are collected.
+SPOOL_BYTES = 1024 * 1024
+
+
+def resolve_columnar_format(export_format: Optional[str]) -> Optional[str]:
+    """Return the columnar format to write, or ``None`` for the JSON Lines/CSV export."""
+
+    fmt = COLUMNAR_FORMATS.get((export_format or "").lower())
+    if fmt is None:
+        return None
+    if load_backend("pyarrow") is None:
+        LOGGER.warning("pyarrow unavailable; falling back to JSON Lines export")
+        return None
+    return fmt
+
+
+def _arrow_type(pa: Any, kind: str) -> Any:
+    return {
+        "string": pa.string(),
+        "json": pa.string(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+        "date": pa.date32(),
+        "money": pa.decimal128(MONEY_PRECISION, MONEY_SCALE),
+        "float": pa.float64(),
+        "bool": pa.bool_(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+        "text": pa.string(),
+    }[kind]
+
+
+def _to_date(value: Any) -> Optional[date]:
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def _to_timestamp(value: Any) -> Optional[datetime]:
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _to_money(value: Any) -> Optional[Decimal]:
+    if value in (None, ""):
+        return None
+    try:
+        amount = Decimal(str(value)).quantize(Decimal(1).scaleb(-MONEY_SCALE))
+    except (InvalidOperation, ValueError):
+        return None
+    # NaN, infinities and amounts wider than decimal128(12, 2) would make pa.array raise mid-export.
+    if not amount.is_finite() or len(amount.as_tuple().digits) > MONEY_PRECISION:
+        LOGGER.warning("Dropping money value outside decimal128(%d, %d)", MONEY_PRECISION, MONEY_SCALE)
+        return None
+    return amount
+
+
+def _convert(kind: str, value: Any) -> Any:
+    if kind == "date":
+        return _to_date(value)
+    if kind == "timestamp":
+        return _to_timestamp(value)
+    if kind == "money":
+        return _to_money(value)
+    if kind == "json":
+        return None if value is None else json.dumps(value, default=str, sort_keys=True)
+    if kind == "float":
+        return None if value in (None, "") else float(value)
+    if kind == "bool":
+        return None if value is None else bool(value)
+    if kind == "text" and isinstance(value, (dict, list)):
+        return json.dumps(value, default=str, sort_keys=True)
+    return None if value is None else str(value)
+
+
+class _ColumnarSink:
+    """Buffer rows into Arrow record batches and write them to a spooled temp file."""
+
+    def __init__(self, columns: List[Tuple[str, str]], fmt: str) -> None:
+        pa = load_backend("pyarrow")
+        self._pa = pa
+        self._columns = columns
+        self._schema = pa.schema([(name, _arrow_type(pa, kind)) for name, kind in columns])
+        self._buffer: Dict[str, List[Any]] = {name: [] for name, _ in columns}
+        self._pending = 0
+        self.count = 0
+        self.file: BinaryIO = tempfile.TemporaryFile()
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+
+            self._writer = pq.ParquetWriter(self.file, self._schema, compression="zstd")
+        else:
+            self._writer = pa.ipc.new_file(self.file, self._schema)
+
+    def append(self, row: Dict[str, Any]) -> None:
+        for name, kind in self._columns:
+            self._buffer[name].append(_convert(kind, row.get(name)))
+        self._pending += 1
+        self.count += 1
+        if self._pending >= BATCH_ROWS:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        arrays = [
+            self._pa.array(self._buffer[name], type=field.type) for name, field in zip(self._buffer, self._schema)
+        ]
+        self._writer.write_batch(self._pa.RecordBatch.from_arrays(arrays, schema=self._schema))
+        self._buffer = {name: [] for name, _ in self._columns}
+        self._pending = 0
+
+    def close(self) -> BinaryIO:
+        self._flush()
+        self._writer.close()
+        self.file.seek(0)
+        return self.file
+
+    def discard(self) -> None:
+        self.file.close()
+
+
+def _copy_into(archive: zipfile.ZipFile, name: str, source: BinaryIO) -> None:
+    with archive.open(name, "w") as target:
+        shutil.copyfileobj(source, target)
+    source.close()
+
+
+def _spool_rows(
+    name: str, rows: Iterable[Dict[str, Any]], declared: List[Tuple[str, str]]
+) -> Tuple[BinaryIO, List[Tuple[str, str]]]:
+    """Spool ``rows`` as JSON Lines, returning them with the undeclared columns they carry (as strings)."""
+
+    known = {column for column, _ in declared} | DERIVED_KEYS[name]
+    extra: List[Tuple[str, str]] = []
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES, mode="w+", encoding="utf-8")
+    try:
+        for row in rows:
+            for column in row:
+                if column not in known:
+                    known.add(column)
+                    extra.append((column, "text"))
+            spool.write(json.dumps(row, default=str))
+            spool.write("\n")
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, extra
+
+
+def write_columnar_table(
+    archive: zipfile.ZipFile,
+    name: str,
+    rows: Iterable[Dict[str, Any]],
+    fmt: str,
+) -> Dict[str, int]:
+    """Write ``payslips`` (plus a long-format ``ytd`` table) or ``anomalies`` as typed columns.
+
+    Columns the rows carry beyond the declared schema (later migrations,
+    ``user_id``) are appended as string fields, so the typed export keeps
+    every column the JSON Lines export would.
+    """
+
+    declared = ANOMALY_COLUMNS if name == "anomalies" else PAYSLIP_COLUMNS
+    spool, extra = _spool_rows(name, rows, declared)
+    sinks: Dict[str, _ColumnarSink] = {}
+    try:
+        sinks[name] = _ColumnarSink(declared + extra, fmt)
+        if name == "payslips":
+            sinks["ytd"] = _ColumnarSink(YTD_COLUMNS, fmt)
+        for line in spool:
+            row = json.loads(line)
+            sinks[name].append(row)
+            ytd = row.get("ytd") if name == "payslips" else None
+            if not isinstance(ytd, dict):
+                continue
+            for field, amount in ytd.items():
+                sinks["ytd"].append(
+                    {
+                        "payslip_id": row.get("id"),
+                        "pay_date": row.get("pay_date"),
+                        "currency": row.get("currency"),
+                        "field": field,
+                        "amount": amount,
+                    }
+                )
+        counts: Dict[str, int] = {}
+        for table, sink in sinks.items():
+            _copy_into(archive, f"{table}.{fmt}", sink.close())
+            counts[table] = sink.count
+        return counts
+    finally:
+        spool.close()
+        for sink in sinks.values():
+            sink.discard()
+
+
+__all__ = ["COLUMNAR_FORMATS", "COLUMNAR_TABLES", "resolve_columnar_format", "write_columnar_table"]
@@ -0,0 +1,215 @@
+"""Per-layout extraction templates learned from confident extractions.
+
+Payslips from the same payroll provider share a layout. Once a job passes
+the identity check with ``confidence_overall >= LEARN_CONFIDENCE``, the page
+regions holding each field's value are stored under a fingerprint of the
+label layout. Later uploads with the same fingerprint read those regions
+directly and skip OCR and the LLM. Templates hold label anchors (hashed)
+and coordinates only, never payslip values.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from apps.common.supabase import SupabaseService
+from apps.worker.services.merge import NativeExtraction, validate_identity_rule
+from apps.worker.services.native import (
+    AMOUNT_FIELDS,
+    AMOUNT_PATTERN,
+    DATE_PATTERN,
+    LABEL_PATTERN,
+    Row,
+    parse_native,
+    read_value,
+    rows_from_words,
+)
+from apps.worker.services.pdf import PageWord, PdfText
+
+LOGGER = logging.getLogger(__name__)
+
+TEMPLATE_TABLE = "layout_templates"
+TEMPLATE_HIT_RPC = "rpc_layout_template_hit"
+TEMPLATE_VERSION = 1
+LEARN_CONFIDENCE = 0.9
+MIN_ANCHORS = 4
+ANCHOR_GRID = 0.02
+# Employer names vary between companies on the same payroll layout, so they
+# keep coming from the labelled row in ``parse_native``.
+TEMPLATE_FIELDS = ("pay_date", "period_start", "period_end", "tax_code", *AMOUNT_FIELDS)
+REQUIRED_FIELDS = ("gross", "net")
+YTD_PREFIX = "ytd:"
+
+
+@dataclass(slots=True)
+class LayoutTemplate:
+    fingerprint: str
+    regions: Dict[str, Dict[str, float]]
+    id: Optional[str] = None
+    hits: int = 0
+
+
+@dataclass(slots=True)
+class _Claims:
+    taken: Set[Tuple[int, int]] = field(default_factory=set)
+
+    def claim(self, row_index: int, start: int) -> bool:
+        if (row_index, start) in self.taken:
+            return False
+        self.taken.add((row_index, start))
+        return True
+
+
+def _snap(value: float) -> int:
+    return int(round(value / ANCHOR_GRID))
+
+
+def layout_fingerprint(words: Sequence[PageWord]) -> Optional[str]:
+    """Digest of which labels sit where; ``None`` when the page has too few labels to identify it."""
+
+    anchors: Set[str] = set()
+    for row in rows_from_words(words):
+        for match in LABEL_PATTERN.finditer(row.text):
+            word = row.word_at(match.start())
+            if word is None:
+                continue
+            label = " ".join(match.group(0).lower().split())
+            anchors.add(f"{label}@{word.page}:{_snap(word.x0)}:{_snap(word.y0)}")
+    if len(anchors) < MIN_ANCHORS:
+        return None
+    material = f"v{TEMPLATE_VERSION}\n" + "\n".join(sorted(anchors))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _base_field(name: str) -> str:
+    return name[len(YTD_PREFIX) :] if name.startswith(YTD_PREFIX) else name
+
+
+def _region(box: Dict[str, float], name: str) -> Dict[str, float]:
+    # Amounts are usually right-aligned, so wider values grow to the left.
+    left = 0.06 if _base_field(name) in AMOUNT_FIELDS else 0.01
+    return {
+        "page": box["page"],
+        "x0": round(max(0.0, box["x0"] - left), 4),
+        "y0": round(max(0.0, box["y0"] - 0.004), 4),
+        "x1": round(min(1.0, box["x1"] + 0.01), 4),
+        "y1": round(min(1.0, box["y1"] + 0.004), 4),
+    }
+
+
+def _locate(name: str, value: Any, rows: List[Row], claims: _Claims) -> Optional[Dict[str, float]]:
+    base = _base_field(name)
+    for index, row in enumerate(rows):
+        if base in AMOUNT_FIELDS:
+            candidates = [
+                (match.start(), match.end())
+                for match in AMOUNT_PATTERN.finditer(row.text)
+                if abs(abs(float(match.group("number").replace(",", ""))) - abs(float(value))) < 0.005
+            ]
+        elif base == "tax_code":
+            offset = row.text.upper().find(str(value).upper())
+            candidates = [(offset, offset + len(str(value)))] if offset >= 0 else []
+        else:
+            candidates = [
+                (match.start(), match.end())
+                for match in DATE_PATTERN.finditer(row.text)
+                if read_value(base, match.group(0)) == value
+            ]
+        for start, end in candidates:
+            box = row.box(start, end)
+            if box is not None and claims.claim(index, start):
+                return _region(box, name)
+    return None
+
+
+def learn_regions(words: Sequence[PageWord], values: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """Find where each extracted value sits on the page."""
+
+    rows = list(rows_from_words(words))
+    claims = _Claims()
+    wanted: List[Tuple[str, Any]] = [(name, values.get(name)) for name in TEMPLATE_FIELDS]
+    # Current-period fields claim their boxes first so YTD columns map to the later occurrence.
+    wanted += [(f"{YTD_PREFIX}{key}", amount) for key, amount in sorted((values.get("ytd") or {}).items())]
+    regions: Dict[str, Dict[str, float]] = {}
+    for name, value in wanted:
+        if value in (None, "", 0, 0.0):
+            continue
+        region = _locate(name, value, rows, claims)
+        if region is not None:
+            regions[name] = region
+    return regions
+
+
+def _words_in(region: Dict[str, float], words: Sequence[PageWord]) -> str:
+    inside = [
+        word
+        for word in words
+        if word.page == region["page"]
+        and region["x0"] <= (word.x0 + word.x1) / 2 <= region["x1"]
+        and region["y0"] <= (word.y0 + word.y1) / 2 <= region["y1"]
+    ]
+    inside.sort(key=lambda word: (word.line, word.x0))
+    return " ".join(word.text for word in inside)
+
+
+def read_template(template: LayoutTemplate, text: PdfText) -> Optional[NativeExtraction]:
+    """Read every templated field from its region; ``None`` if any region is empty or the totals do not balance."""
+
+    native = parse_native(text)
+    ytd = dict(native.ytd or {})
+    for name, region in template.regions.items():
+        value = read_value(_base_field(name), _words_in(region, text.words))
+        if value is None:
+            return None
+        if name.startswith(YTD_PREFIX):
+            ytd[_base_field(name)] = value
+        else:
+            setattr(native, name, value)
+    native.ytd = ytd
+    if not validate_identity_rule(asdict(native)):
+        return None
+    return native
+
+
+class LayoutTemplateStore:
+    """Look up, learn and count hits on ``layout_templates`` rows."""
+
+    def __init__(self, supabase: SupabaseService) -> None:
+        self._supabase = supabase
+
+    def find(self, fingerprint: str) -> Optional[LayoutTemplate]:
+        row = self._supabase.table_select_single(TEMPLATE_TABLE, match={"fingerprint": fingerprint})
+        if not row or row.get("version") != TEMPLATE_VERSION:
+            return None
+        return LayoutTemplate(
+            fingerprint=fingerprint, regions=row.get("regions") or {}, id=row.get("id"), hits=row.get("hits") or 0
+        )
+
+    def learn(self, fingerprint: str, words: Sequence[PageWord], values: Dict[str, Any]) -> Optional[LayoutTemplate]:
+        regions = learn_regions(words, values)
+        if not all(name in regions for name in REQUIRED_FIELDS):
+            return None
+        row = self._supabase.insert_row_once(
+            TEMPLATE_TABLE,
+            {"fingerprint": fingerprint, "version": TEMPLATE_VERSION, "regions": regions, "hits": 0},
+            idempotency_key=fingerprint,
+        )
+        LOGGER.info("Learned layout template %s with %d fields", fingerprint[:12], len(regions))
+        return LayoutTemplate(fingerprint=fingerprint, regions=regions, id=row.get("id"))
+
+    def record_hit(self, template: LayoutTemplate) -> None:
+        # Incremented in SQL so concurrent hits on a shared template are all counted.
+        hits = self._supabase.rpc(TEMPLATE_HIT_RPC, {"p_id": template.id})
+        template.hits = hits if isinstance(hits, int) else template.hits + 1
+
+
+__all__ = [
+    "LEARN_CONFIDENCE",
+    "LayoutTemplate",
+    "LayoutTemplateStore",
+    "layout_fingerprint",
+    "learn_regions",
+    "read_template",
+]
@@ -6,10 +6,9 @@ from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Any, Dict, Optional
 
-from openai import OpenAI
-
 from apps.common.config import get_settings
 from apps.common.supabase import get_supabase
+from apps.worker.services.backends import require_backend
 
 LOGGER = logging.getLogger(__name__)
 
@@ -78,7 +77,7 @@ class LlmVisionClient:
         settings = get_settings()
         if not settings.openai_api_key:
             raise RuntimeError("OPENAI_API_KEY missing")
-        self._client = OpenAI(api_key=settings.openai_api_key)
+        self._client = require_backend("openai").OpenAI(api_key=settings.openai_api_key)
         self._cap = settings.llm_spend_daily_cap_usd
         self._supabase = get_supabase()
 
@@ -68,7 +68,10 @@ def merge_native_with_llm(native: NativeExtraction, llm: LlmExtraction) -> Dict[
             merged[field] = native_value
         else:
             merged[field] = payload.get(field)
-    merged["other_deductions"] = _sum_other_deductions(payload.get("other_deductions", []))
+    # The LLM itemises other deductions; without that list (no LLM, template hits) keep the native total,
+    # which the identity rule was already checked against.
+    llm_other = payload.get("other_deductions") or []
+    merged["other_deductions"] = _sum_other_deductions(llm_other) if llm_other else native.other_deductions or 0.0
     merged["confidence_overall"] = payload.get("confidence_overall", 0.0)
     merged["currency"] = merged.get("currency") or payload.get("currency")
     merged["country"] = merged.get("country") or payload.get("country")
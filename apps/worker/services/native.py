@@ -0,0 +1,433 @@
+"""Single-pass key/value extraction from native or OCR page text.
+
+Rows come from word boxes (``PdfText.words``) when present, otherwise from
+``raw_text`` lines. One compiled, word-boundary aware pattern finds every
+label in a row; the text up to the next label is that label's value. A
+"This period / Year to date" header row sets up a column model so amounts
+under the YTD column land in ``ytd`` instead of the current-period fields.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .merge import NativeExtraction
+from .pdf import PageWord, PdfText, guess_country, guess_currency
+
+AMOUNT_FIELDS = (
+    "gross",
+    "net",
+    "tax_income",
+    "ni_prsi",
+    "pension_employee",
+    "pension_employer",
+    "student_loan",
+    "other_deductions",
+)
+DEDUCTION_FIELDS = frozenset(AMOUNT_FIELDS) - {"gross", "net"}
+YTD_HEADER = "@ytd"
+CURRENT_HEADER = "@current"
+IGNORED = "@ignore"
+
+# Field -> labels. Matching is case-insensitive on word boundaries and the
+# longest label wins, so "tax code" never reads as "tax" and "employer
+# pension" never as "employer". IGNORED labels exist only to swallow text
+# that would otherwise hit a shorter label ("ni number", "tax credits").
+LABELS: Dict[str, Tuple[str, ...]] = {
+    "gross": ("total gross pay", "gross pay", "total gross", "gross earnings", "total earnings", "gross"),
+    "net": ("net pay", "net salary", "net wage", "take home pay", "take home", "amount payable", "net"),
+    "tax_income": ("paye income tax", "income tax", "paye tax", "tax deducted", "paye", "tax"),
+    "ni_prsi": ("national insurance", "employee ni", "ee ni", "ni contributions", "ee prsi", "prsi", "ni"),
+    "pension_employee": ("employee pension", "pension (employee)", "pension employee", "ee pension", "pension"),
+    "pension_employer": (
+        "employer pension",
+        "employer's pension",
+        "pension (employer)",
+        "pension employer",
+        "er pension",
+    ),
+    "student_loan": ("student loan repayment", "student loan"),
+    "other_deductions": ("total other deductions", "other deductions"),
+    "employer_name": ("employer name", "company name", "employer", "company"),
+    "pay_date": ("payment date", "pay date", "date paid", "paid on"),
+    "period_start": ("pay period start", "period start", "period from"),
+    "period_end": ("pay period end", "period end", "period to", "period ending"),
+    "period": ("pay period", "period"),
+    "tax_code": ("tax code",),
+    YTD_HEADER: ("year to date", "ytd", "to date"),
+    CURRENT_HEADER: ("this period", "current period", "this pay", "current"),
+    IGNORED: (
+        "ni number",
+        "ni no",
+        "ni category",
+        "ni letter",
+        "national insurance number",
+        "national insurance no",
+        "employer ni",
+        "er ni",
+        "employer prsi",
+        "er prsi",
+        "prsi class",
+        "paye ref",
+        "paye reference",
+        "tax credits",
+        "tax credit",
+        "tax period",
+        "tax year",
+        "tax week",
+        "tax month",
+        "tax ref",
+        "taxable pay",
+        "net pay adjustment",
+    ),
+}
+
+
+def _compile_labels() -> Tuple["re.Pattern[str]", Dict[str, str]]:
+    alternatives: List[Tuple[str, str]] = [(label, name) for name, labels in LABELS.items() for label in labels]
+    alternatives.sort(key=lambda item: len(item[0]), reverse=True)
+    groups: Dict[str, str] = {}
+    parts: List[str] = []
+    for index, (label, name) in enumerate(alternatives):
+        group = f"l{index}"
+        groups[group] = name
+        body = r"\s+".join(re.escape(word) for word in label.split())
+        parts.append(f"(?P<{group}>{body})")
+    pattern = r"(?<![a-z0-9])(?:" + "|".join(parts) + r")(?![a-z0-9])"
+    return re.compile(pattern, re.IGNORECASE), groups
+
+
+LABEL_PATTERN, LABEL_GROUPS = _compile_labels()
+AMOUNT_PATTERN = re.compile(
+    r"(?<![\w/.,-])(?P<sign>[-−(])?\s?"
+    r"(?P<number>\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?|\d+(?:\.\d{1,2})?)"
+    r"(?![\w/%-]|[.,]\d)"
+)
+DATE_PATTERN = re.compile(
+    r"(?P<iso>\d{4}-\d{2}-\d{2})"
+    r"|(?P<dmy>\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4})"
+    r"|(?P<text>\d{1,2}(?:st|nd|rd|th)?\s+[A-Za-z]{3,9}\.?,?\s+\d{4})"
+)
+TAX_CODE_PATTERN = re.compile(r"^(?:[SC]?K?\d{1,4}[LMNTPY]|[SC]?(?:BR|D0|D1|NT|0T)|[A-Z]{1,2}\d{1,3}[A-Z]{0,2})$")
+YTD_QUALIFIER = re.compile(r"(?<![a-z])(?:ytd|year\s+to\s+date|to\s+date)(?![a-z])", re.IGNORECASE)
+CID_PATTERN = re.compile(r"\(cid:\d+\)")
+DATE_FORMATS = ("%d/%m/%Y", "%d/%m/%y", "%d %b %Y", "%d %B %Y")
+
+
+@dataclass(slots=True)
+class Row:
+    """One line of page text; ``spans`` maps character ranges back to word boxes."""
+
+    text: str
+    # (start, end, word) for each word; empty for rows built from raw text.
+    spans: List[Tuple[int, int, PageWord]] = field(default_factory=list)
+    page: int = 0
+
+    def word_at(self, offset: int) -> Optional[PageWord]:
+        for start, end, word in self.spans:
+            if start <= offset < end:
+                return word
+        return None
+
+    def x_at(self, offset: int) -> Optional[float]:
+        word = self.word_at(offset)
+        return (word.x0 + word.x1) / 2 if word is not None else None
+
+    def box(self, start: int, end: int) -> Optional[Dict[str, float]]:
+        """Bounding box of the words covering ``text[start:end]``."""
+
+        words = [word for first, last, word in self.spans if first < end and last > start]
+        if not words:
+            return None
+        return {
+            "page": words[0].page,
+            "x0": min(word.x0 for word in words),
+            "y0": min(word.y0 for word in words),
+            "x1": max(word.x1 for word in words),
+            "y1": max(word.y1 for word in words),
+        }
+
+
+@dataclass(slots=True)
+class _Columns:
+    ytd_x: Optional[float] = None
+    current_x: Optional[float] = None
+    seen: bool = False
+
+    def is_ytd(self, x: Optional[float], position: int) -> bool:
+        if not self.seen:
+            return False
+        if x is None or self.ytd_x is None:
+            return position >= 1
+        if self.current_x is None:
+            return x >= self.ytd_x - 0.05
+        return abs(x - self.ytd_x) < abs(x - self.current_x)
+
+
+def _clean(text: str) -> str:
+    return CID_PATTERN.sub(" ", text)
+
+
+def rows_from_words(words: Iterable[PageWord]) -> Iterator[Row]:
+    current: Optional[Row] = None
+    key: Optional[Tuple[int, int]] = None
+    last_x0 = 0.0
+    for word in words:
+        word_key = (word.page, word.line)
+        # Native and OCR words can be concatenated; a jump back to the left margin is a new row.
+        if current is None or word_key != key or word.x0 < last_x0:
+            if current is not None:
+                yield current
+            current = Row(text="", page=word.page)
+            key = word_key
+        token = _clean(word.text)
+        if current.text:
+            current.text += " "
+        start = len(current.text)
+        current.text += token
+        current.spans.append((start, len(current.text), word))
+        last_x0 = word.x0
+    if current is not None:
+        yield current
+
+
+def _rows(text: PdfText) -> Iterator[Row]:
+    if text.words:
+        yield from rows_from_words(text.words)
+        return
+    for line in text.raw_text.splitlines():
+        yield Row(text=_clean(line))
+
+
+def _amounts(row: Row, start: int, end: int) -> List[Tuple[float, Optional[float]]]:
+    found: List[Tuple[float, Optional[float]]] = []
+    for match in AMOUNT_PATTERN.finditer(row.text, start, end):
+        value = float(match.group("number").replace(",", ""))
+        if match.group("sign"):
+            value = -value
+        found.append((round(value, 2), row.x_at(match.start("number"))))
+    return found
+
+
+def _parse_date(token: str) -> Optional[str]:
+    token = re.sub(r"(?<=\d)(st|nd|rd|th)", "", token).replace(",", "")
+    token = token.replace(".", "") if re.search(r"[A-Za-z]", token) else token.replace(".", "/").replace("-", "/")
+    if re.fullmatch(r"\d{4}/\d{2}/\d{2}", token):
+        token = "/".join(reversed(token.split("/")))
+    for fmt in DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(token, fmt).date()
+        except ValueError:
+            continue
+        return parsed.isoformat() if date(1990, 1, 1) <= parsed <= date(2100, 1, 1) else None
+    return None
+
+
+def _dates(segment: str) -> List[str]:
+    results = []
+    for match in DATE_PATTERN.finditer(segment):
+        parsed = _parse_date(match.group(0))
+        if parsed:
+            results.append(parsed)
+    return results
+
+
+def _text_value(segment: str) -> str:
+    return segment.strip(" \t:-–|").strip()
+
+
+def read_value(name: str, snippet: str) -> Any:
+    """Parse a single field value out of ``snippet`` (used for known value regions)."""
+
+    snippet = _clean(snippet)
+    if name in AMOUNT_FIELDS:
+        match = AMOUNT_PATTERN.search(snippet)
+        if match is None:
+            return None
+        value = round(float(match.group("number").replace(",", "")), 2)
+        return abs(value) if name in DEDUCTION_FIELDS or not match.group("sign") else -value
+    value = _text_value(snippet)
+    if name == "tax_code":
+        token = value.split(" ")[0].upper() if value else ""
+        return token if TAX_CODE_PATTERN.match(token) else None
+    if name == "employer_name":
+        return value[:120] if re.search(r"[A-Za-z]", value) else None
+    dates = _dates(snippet)
+    return dates[0] if dates else None
+
+
+class _Collector:
+    def __init__(self) -> None:
+        self.values: Dict[str, Any] = {}
+        self.ytd: Dict[str, float] = {}
+        self.columns: Dict[int, _Columns] = {}
+
+    def amount(self, name: str, value: float, *, ytd: bool) -> None:
+        if name in DEDUCTION_FIELDS:
+            value = abs(value)
+        target = self.ytd if ytd else self.values
+        target.setdefault(name, value)
+
+    def text(self, name: str, segment: str) -> None:
+        if name == "period":
+            dates = _dates(segment)
+            if dates:
+                self.values.setdefault("period_start", dates[0])
+            if len(dates) > 1:
+                self.values.setdefault("period_end", dates[1])
+            return
+        value = read_value(name, segment)
+        if value is not None:
+            self.values.setdefault(name, value)
+
+
+def _scan_row(row: Row, collector: _Collector, pending: List[str]) -> List[str]:
+    """Assign values for every label in ``row``; returns labels whose value may sit on the next row."""
+
+    matches = list(LABEL_PATTERN.finditer(row.text))
+    if not matches:
+        # Label-above-value layouts: feed the first amount of a bare row to the pending label.
+        amounts = _amounts(row, 0, len(row.text))
+        for name, (value, _) in zip(pending, amounts):
+            collector.amount(name, value, ytd=False)
+        return []
+
+    names = [LABEL_GROUPS[match.lastgroup or ""] for match in matches]
+    columns = collector.columns.setdefault(row.page, _Columns())
+    if YTD_HEADER in names and not _amounts(row, 0, len(row.text)):
+        columns.seen = True
+        for match, name in zip(matches, names):
+            centre = row.x_at(match.start())
+            if name == YTD_HEADER:
+                columns.ytd_x = centre
+            elif name == CURRENT_HEADER:
+                columns.current_x = centre
+        return []
+
+    waiting: List[str] = []
+    for index, (match, name) in enumerate(zip(matches, names)):
+        if name in (IGNORED, YTD_HEADER, CURRENT_HEADER):
+            continue
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(row.text)
+        following = names[index + 1] if index + 1 < len(matches) else None
+        if name in AMOUNT_FIELDS:
+            # "Gross YTD 12,800" / "YTD Gross 12,800" / "Gross Pay to date".
+            qualified = following == YTD_HEADER or bool(
+                YTD_QUALIFIER.search(row.text, max(0, match.start() - 12), match.start())
+            )
+            if following == YTD_HEADER:
+                end = matches[index + 2].start() if index + 2 < len(matches) else len(row.text)
+            amounts = _amounts(row, match.end(), end)
+            if not amounts:
+                waiting.append(name)
+                continue
+            for position, (value, x) in enumerate(amounts):
+                ytd = qualified or columns.is_ytd(x, position)
+                collector.amount(name, value, ytd=ytd)
+                if qualified:
+                    break
+        else:
+            collector.text(name, row.text[match.end() : end])
+    return waiting
+
+
+def label_regions(words: Sequence[PageWord], *, padding: float = 0.006) -> List[Tuple[float, float, float, float]]:
+    """Page bands (x0, y0, x1, y1) worth re-reading at full resolution.
+
+    Each labelled row contributes a band from its first label to its last
+    word; rows ending in a bare label also take in the next row, for layouts
+    that put the value under the label. Overlapping bands are merged. Boxes from
+    a low-resolution pass are loose, so bands get ``padding`` vertically and
+    three times that horizontally.
+    """
+
+    rows = list(rows_from_words(words))
+    bands: List[List[float]] = []
+    for index, row in enumerate(rows):
+        matches = [match for match in LABEL_PATTERN.finditer(row.text) if LABEL_GROUPS[match.lastgroup or ""] != IGNORED]
+        box = row.box(0, len(row.text))
+        if not matches or box is None:
+            continue
+        first = row.word_at(matches[0].start())
+        x1, y1 = box["x1"], box["y1"]
+        if not row.text[matches[-1].end() :].strip(" :.-") and index + 1 < len(rows):
+            below = rows[index + 1].box(0, len(rows[index + 1].text))
+            if below is not None and below["page"] == box["page"]:
+                x1, y1 = max(x1, below["x1"]), max(y1, below["y1"])
+        x0 = first.x0 if first is not None else box["x0"]
+        bands.append(
+            [max(0.0, x0 - 3 * padding), max(0.0, box["y0"] - padding), min(1.0, x1 + 3 * padding), min(1.0, y1 + padding)]
+        )
+    merged: List[List[float]] = []
+    for band in sorted(bands, key=lambda band: band[1]):
+        if merged and band[1] <= merged[-1][3]:
+            last = merged[-1]
+            last[0], last[2], last[3] = min(last[0], band[0]), max(last[2], band[2]), max(last[3], band[3])
+            continue
+        merged.append(band)
+    return [(x0, y0, x1, y1) for x0, y0, x1, y1 in merged]
+
+
+class NativeParser:
+    """Incremental ``parse_native``: feed pages in reading order and read the extraction at any point.
+
+    Values are first-come, so feeding pages one by one gives the same result
+    as parsing them joined.
+    """
+
+    def __init__(self) -> None:
+        self._collector = _Collector()
+        self._pending: List[str] = []
+        self._raw: List[str] = []
+
+    def feed(self, text: PdfText) -> NativeExtraction:
+        for row in _rows(text):
+            self._pending = _scan_row(row, self._collector, self._pending)
+        self._raw.append(text.raw_text)
+        return self.result()
+
+    def result(self) -> NativeExtraction:
+        values = self._collector.values
+        raw_text = "\n".join(self._raw)
+        return NativeExtraction(
+            employer_name=values.get("employer_name"),
+            pay_date=values.get("pay_date"),
+            period_start=values.get("period_start"),
+            period_end=values.get("period_end"),
+            currency=guess_currency(raw_text),
+            country=guess_country(raw_text),
+            gross=values.get("gross"),
+            net=values.get("net"),
+            tax_income=values.get("tax_income"),
+            ni_prsi=values.get("ni_prsi"),
+            pension_employee=values.get("pension_employee"),
+            pension_employer=values.get("pension_employer"),
+            student_loan=values.get("student_loan"),
+            other_deductions=values.get("other_deductions"),
+            ytd=dict(self._collector.ytd),
+            tax_code=values.get("tax_code"),
+        )
+
+
+def parse_native(text: PdfText) -> NativeExtraction:
+    """Fill every ``NativeExtraction`` field that the page text states explicitly."""
+
+    return NativeParser().feed(text)
+
+
+__all__ = [
+    "AMOUNT_FIELDS",
+    "AMOUNT_PATTERN",
+    "DATE_PATTERN",
+    "LABELS",
+    "LABEL_GROUPS",
+    "LABEL_PATTERN",
+    "NativeParser",
+    "Row",
+    "label_regions",
+    "parse_native",
+    "read_value",
+    "rows_from_words",
+]
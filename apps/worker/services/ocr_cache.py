@@ -0,0 +1,303 @@
+"""Cache of Tesseract results keyed by the exact pixels that were read.
+
+Retries, re-uploads under a new file id and reprocessing after pipeline
+changes render the same page images again. Every Tesseract call in
+``perform_ocr`` (whole page, ROI crop or scout pass) is looked up by
+(user, pixel digest, image size, languages, psm, engine version) first, so
+only pages whose pixels changed are OCR'd again.
+
+Cached entries contain recognised payslip text, so they are personal data:
+keys are scoped to the owning user, ``purge_ocr_cache`` runs alongside user
+deletion and the retention sweep, and no entry outlives ``CACHE_TTL_SECONDS``
+(shorter than the shortest retention window).
+
+``OCR_CACHE`` picks the store: a ``redis://`` URL for a Redis dedicated to
+the cache (it may run ``allkeys-lru``; the Celery broker in ``REDIS_URL`` is
+rejected because that policy would evict queued tasks), or ``disk`` /
+``disk:/path`` for JSON files on local disk, evicting least recently used
+entries beyond ``OCR_CACHE_MAX_MB``. A disk cache is only purged on the host
+that runs the deletion, so use it on single-host deployments. Empty disables
+the cache.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from apps.common.config import get_settings
+
+from .backends import BACKENDS, load_backend
+
+LOGGER = logging.getLogger(__name__)
+
+KEY_PREFIX = "ocr:v1:"
+INDEX_PREFIX = "ocr:v1:index:"
+# Well inside the shortest retention option (30 days).
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_DISK_DIR = Path(tempfile.gettempdir()) / "payslip-ocr-cache"
+DISK_SWEEP_SECONDS = 3600
+
+OcrData = Dict[str, List[Any]]
+
+
+@lru_cache(maxsize=None)
+def engine_version(engine: str) -> str:
+    """Binding plus Tesseract version, so upgrading Tesseract misses every old entry."""
+
+    module = load_backend(engine) if engine in BACKENDS else None
+    if module is None:
+        return engine
+    try:
+        if engine == "tesserocr":
+            return f"tesserocr/{module.tesseract_version().split()[1]}"
+        if engine == "pytesseract":
+            return f"pytesseract/{module.get_tesseract_version()}"
+    except Exception as exc:  # pragma: no cover - tesseract binary missing
+        LOGGER.debug("Could not read %s version: %s", engine, exc)
+    return engine
+
+
+def cache_key(image: Any, *, scope: str, lang: str, psm: int, engine: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.width}x{image.height}:{lang}:{psm}:{engine_version(engine)}\n".encode())
+    digest.update(image.tobytes())
+    return f"{KEY_PREFIX}{scope}:{digest.hexdigest()}"
+
+
+class OcrCache(ABC):
+    """Shared lookup/metrics logic; subclasses store serialised results."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "purged": 0, "errors": 0}
+
+    def fetch(
+        self, image: Any, *, scope: str, lang: str, psm: int, engine: str, compute: Callable[[], OcrData]
+    ) -> OcrData:
+        """Cached result for ``image`` under ``scope`` (the owning user id), computing and storing it on a miss."""
+
+        key = cache_key(image, scope=scope, lang=lang, psm=psm, engine=engine)
+        try:
+            cached = self._get(key)
+        except Exception as exc:  # pragma: no cover - cache outages must not fail OCR
+            LOGGER.warning("OCR cache read failed: %s", exc)
+            self._count("errors")
+            cached = None
+        if cached is not None:
+            self._count("hits")
+            return json.loads(cached)
+        self._count("misses")
+        data = compute()
+        try:
+            self._put(scope, key, json.dumps(data, separators=(",", ":")).encode("utf-8"))
+            self._count("stores")
+        except Exception as exc:  # pragma: no cover - cache outages must not fail OCR
+            LOGGER.warning("OCR cache write failed: %s", exc)
+            self._count("errors")
+        return data
+
+    def purge(self, scopes: Iterable[str]) -> int:
+        """Drop every entry stored under ``scopes``; returns how many were removed."""
+
+        removed = sum(self._purge(scope) for scope in scopes)
+        self._count("purged", removed)
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[bytes]:
+        """Serialised entry for ``key``, or ``None`` when absent or expired."""
+
+    @abstractmethod
+    def _put(self, scope: str, key: str, value: bytes) -> None:
+        """Store ``value`` under ``key``, recorded against ``scope`` for purging."""
+
+    @abstractmethod
+    def _purge(self, scope: str) -> int:
+        """Remove every entry stored under ``scope``; returns how many were removed."""
+
+
+class RedisOcrCache(OcrCache):
+    """Entries expire after ``ttl``; a per-user key set (expiring with them) lets deletion find them."""
+
+    def __init__(self, client: Any, *, ttl: int = CACHE_TTL_SECONDS) -> None:
+        super().__init__()
+        self._client = client
+        self._ttl = ttl
+
+    def _get(self, key: str) -> Optional[bytes]:
+        return self._client.get(key)
+
+    def _put(self, scope: str, key: str, value: bytes) -> None:
+        index = INDEX_PREFIX + scope
+        self._client.set(key, value, ex=self._ttl)
+        self._client.sadd(index, key)
+        self._client.expire(index, self._ttl)
+
+    def _purge(self, scope: str) -> int:
+        index = INDEX_PREFIX + scope
+        keys = list(self._client.smembers(index))
+        removed = self._client.delete(*keys) if keys else 0
+        self._client.delete(index)
+        return int(removed or 0)
+
+
+class DiskOcrCache(OcrCache):
+    """One directory per user and one file per entry.
+
+    The mtime records when an entry was written and expires it after
+    ``ttl``; reads bump only the atime, and writes evict the least recently
+    read files beyond ``max_bytes``.
+    """
+
+    def __init__(self, root: Path, *, max_bytes: int, ttl: int = CACHE_TTL_SECONDS) -> None:
+        super().__init__()
+        self._root = Path(root)
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._size: Optional[int] = None
+        self._swept = 0.0
+
+    def _scope_dir(self, scope: str) -> Path:
+        return self._root / hashlib.sha256(scope.encode("utf-8")).hexdigest()[:32]
+
+    def _path(self, key: str) -> Path:
+        scope, _, digest = key[len(KEY_PREFIX):].rpartition(":")
+        return self._scope_dir(scope) / f"{digest}.json"
+
+    def _get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            stat = path.stat()
+            if time.time() - stat.st_mtime > self._ttl:
+                path.unlink(missing_ok=True)
+                return None
+            value = path.read_bytes()
+            os.utime(path, (time.time(), stat.st_mtime))
+        except FileNotFoundError:
+            return None
+        return value
+
+    def _put(self, scope: str, key: str, value: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".tmp", delete=False) as handle:
+            handle.write(value)
+        os.replace(handle.name, path)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(entry.stat().st_size for entry in self._root.glob("*/*.json"))
+            else:
+                self._size += len(value)
+            due = self._size > self._max_bytes or time.time() - self._swept > DISK_SWEEP_SECONDS
+        if due:
+            self._evict()
+
+    def _evict(self) -> None:
+        now = time.time()
+        entries: List[Tuple[float, int, Path]] = []
+        expired = 0
+        for entry in self._root.glob("*/*.json"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self._ttl:
+                entry.unlink(missing_ok=True)
+                expired += 1
+                continue
+            entries.append((stat.st_atime, stat.st_size, entry))
+        entries.sort()
+        size = sum(entry[1] for entry in entries)
+        evicted = 0
+        # Trim to 90% so every write past the limit does not rescan the directory.
+        while entries and size > self._max_bytes * 0.9:
+            _, entry_size, entry = entries.pop(0)
+            entry.unlink(missing_ok=True)
+            size -= entry_size
+            evicted += 1
+        with self._lock:
+            self._size = size
+            self._swept = now
+        self._count("evictions", evicted + expired)
+
+    def _purge(self, scope: str) -> int:
+        directory = self._scope_dir(scope)
+        entries = list(directory.glob("*.json"))
+        shutil.rmtree(directory, ignore_errors=True)
+        with self._lock:
+            self._size = None
+        return len(entries)
+
+
+def _same_server(left: str, right: str) -> bool:
+    a, b = urlparse(left), urlparse(right)
+    return (a.hostname, a.port or 6379) == (b.hostname, b.port or 6379)
+
+
+def _build_cache(spec: str) -> Optional[OcrCache]:
+    settings = get_settings()
+    if not spec:
+        return None
+    if spec.startswith(("redis://", "rediss://")):
+        # maxmemory-policy is per server, so another database number on the broker is no safer.
+        if _same_server(spec, settings.redis_url):
+            raise ValueError("OCR_CACHE must point at a dedicated Redis, not the Celery broker in REDIS_URL")
+        redis = load_backend("redis")
+        if redis is None:
+            return None
+        return RedisOcrCache(redis.Redis.from_url(spec))
+    if spec == "disk" or spec.startswith("disk:"):
+        root = Path(spec[len("disk:"):]) if spec.startswith("disk:") else DEFAULT_DISK_DIR
+        return DiskOcrCache(root, max_bytes=settings.ocr_cache_max_mb * 1024 * 1024)
+    raise ValueError(f"Unknown OCR_CACHE setting: {spec!r} (expected a redis:// URL, 'disk' or 'disk:/path')")
+
+
+@lru_cache(maxsize=1)
+def get_ocr_cache() -> Optional[OcrCache]:
+    """Process-wide cache from ``OCR_CACHE``; ``None`` when disabled."""
+
+    cache = _build_cache(get_settings().ocr_cache.strip())
+    if cache is not None:
+        LOGGER.info("OCR result cache enabled (%s)", type(cache).__name__)
+    return cache
+
+
+def purge_ocr_cache(user_ids: Iterable[str]) -> int:
+    """Remove cached OCR results for ``user_ids`` (user deletion and retention); 0 when the cache is off."""
+
+    cache = get_ocr_cache()
+    if cache is None:
+        return 0
+    return cache.purge(user_ids)
+
+
+__all__ = [
+    "CACHE_TTL_SECONDS",
+    "DiskOcrCache",
+    "OcrCache",
+    "RedisOcrCache",
+    "cache_key",
+    "engine_version",
+    "get_ocr_cache",
+    "purge_ocr_cache",
+]
@@ -0,0 +1,209 @@
+"""Tesseract engines behind ``perform_ocr``.
+
+``pytesseract`` forks a ``tesseract`` process per page, and that process
+loads the traineddata again every time. ``tesserocr`` instead keeps one
+``PyTessBaseAPI`` handle per (languages, psm) in each worker process and
+feeds it raw pixel buffers. ``OCR_ENGINE`` lists engines in preference
+order (default ``tesserocr,pytesseract``); the first installed one is used.
+Both return Tesseract's TSV columns in pytesseract's ``Output.DICT`` shape.
+
+Language models are picked per country: a page is read with the smallest
+set first and only escalates to more models when confidence is low.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from apps.common.config import get_settings
+
+from .backends import load_backend
+
+LOGGER = logging.getLogger(__name__)
+
+TSV_COLUMNS = (
+    "level",
+    "page_num",
+    "block_num",
+    "par_num",
+    "line_num",
+    "word_num",
+    "left",
+    "top",
+    "width",
+    "height",
+    "conf",
+    "text",
+)
+
+OcrData = Dict[str, List[Any]]
+
+
+def _tsv_dict(tsv: str) -> OcrData:
+    data: OcrData = {column: [] for column in TSV_COLUMNS}
+    for line in tsv.splitlines():
+        cells = line.split("\t")
+        if len(cells) < len(TSV_COLUMNS) - 1 or not cells[0].isdigit():
+            continue
+        cells += [""] * (len(TSV_COLUMNS) - len(cells))
+        for column, cell in zip(TSV_COLUMNS, cells):
+            if column == "text":
+                data[column].append(cell)
+            elif column == "conf":
+                data[column].append(float(cell))
+            else:
+                data[column].append(int(cell))
+    return data
+
+
+class _TesseractHandles:
+    """One live ``PyTessBaseAPI`` per (pid, languages, psm).
+
+    Keying on the pid means a handle opened in the Celery parent is never
+    shared with forked children; each child opens its own on first use.
+    """
+
+    def __init__(self) -> None:
+        self._handles: Dict[Tuple[int, str, int], Any] = {}
+        self._lock = threading.Lock()
+
+    def run(self, tesserocr: Any, image: Any, *, lang: str, psm: int, dpi: Optional[int] = None) -> str:
+        gray = image.convert("L")
+        with self._lock:
+            api = self._open(tesserocr, lang, psm)
+            api.SetImageBytes(gray.tobytes(), gray.width, gray.height, 1, gray.width)
+            # Raw buffers carry no resolution, and Tesseract would otherwise assume 70 DPI.
+            if dpi:
+                api.SetSourceResolution(dpi)
+            try:
+                return api.GetTSVText(0)
+            finally:
+                api.Clear()
+
+    def _open(self, tesserocr: Any, lang: str, psm: int) -> Any:
+        key = (os.getpid(), lang, psm)
+        api = self._handles.get(key)
+        if api is None:
+            # Handles inherited from a parent process belong to it; drop our references only.
+            self._handles = {held: handle for held, handle in self._handles.items() if held[0] == key[0]}
+            api = tesserocr.PyTessBaseAPI(lang=lang, psm=psm)
+            self._handles[key] = api
+            LOGGER.info("Opened Tesseract handle for %s (psm %d) in process %d", lang, psm, key[0])
+        return api
+
+    def open(self, tesserocr: Any, *, lang: str, psm: int) -> None:
+        with self._lock:
+            self._open(tesserocr, lang, psm)
+
+    def close(self) -> None:
+        with self._lock:
+            pid = os.getpid()
+            for (owner, _, _), api in self._handles.items():
+                if owner == pid:
+                    api.End()
+            self._handles = {}
+
+
+_HANDLES = _TesseractHandles()
+
+
+def _tesserocr_data(image: Any, *, lang: str, psm: int, dpi: Optional[int] = None) -> Optional[OcrData]:
+    tesserocr = load_backend("tesserocr")
+    if tesserocr is None:
+        return None
+    return _tsv_dict(_HANDLES.run(tesserocr, image, lang=lang, psm=psm, dpi=dpi))
+
+
+def _pytesseract_data(image: Any, *, lang: str, psm: int, dpi: Optional[int] = None) -> Optional[OcrData]:
+    pytesseract = load_backend("pytesseract")
+    if pytesseract is None:
+        return None
+    config = f"--psm {psm} --dpi {dpi}" if dpi else f"--psm {psm}"
+    return pytesseract.image_to_data(image, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+
+
+OCR_ENGINES: Dict[str, Callable[..., Optional[OcrData]]] = {
+    "tesserocr": _tesserocr_data,
+    "pytesseract": _pytesseract_data,
+}
+_ENGINE_BACKENDS = {"tesserocr": "tesserocr", "pytesseract": "pytesseract"}
+
+
+def resolve_ocr_engine(spec: Optional[str] = None) -> Optional[str]:
+    """First installed engine in ``spec`` (default ``OCR_ENGINE``); ``None`` when none is."""
+
+    raw = get_settings().ocr_engine if spec is None else spec
+    names = [name.strip().lower() for name in raw.split(",") if name.strip()] or list(OCR_ENGINES)
+    unknown = [name for name in names if name not in OCR_ENGINES]
+    if unknown:
+        raise ValueError(f"Unknown OCR engine(s): {', '.join(unknown)}")
+    return next((name for name in names if load_backend(_ENGINE_BACKENDS[name]) is not None), None)
+
+
+# Cheapest language set first; a page escalates to the next rung while its
+# mean word confidence stays under ESCALATE_CONFIDENCE.
+LANGUAGE_LADDERS: Dict[Optional[str], Tuple[Tuple[str, ...], ...]] = {
+    "UK": (("eng",), ("eng", "enm", "gle")),
+    "IE": (("eng",), ("eng", "gle"), ("eng", "enm", "gle")),
+    None: (("eng",), ("eng", "enm", "gle")),
+}
+ESCALATE_CONFIDENCE = 70.0
+_CURRENCY_COUNTRIES = {"GBP": "UK", "EUR": "IE"}
+
+
+def ocr_country(country: Optional[str], currency: Optional[str]) -> Optional[str]:
+    """Country hint for OCR from whatever the native text already revealed."""
+
+    return country or _CURRENCY_COUNTRIES.get(currency or "")
+
+
+def language_ladder(country: Optional[str]) -> Tuple[Tuple[str, ...], ...]:
+    return LANGUAGE_LADDERS.get(country, LANGUAGE_LADDERS[None])
+
+
+def mean_confidence(data: OcrData) -> Optional[float]:
+    """Mean Tesseract confidence (0-100) over recognised words; ``None`` when nothing was read."""
+
+    scores = [
+        float(conf)
+        for conf, text in zip(data.get("conf") or [], data.get("text") or [])
+        if (text or "").strip() and float(conf) >= 0
+    ]
+    return sum(scores) / len(scores) if scores else None
+
+
+def image_to_data(image: Any, *, lang: str, psm: int, engine: str, dpi: Optional[int] = None) -> OcrData:
+    """Tesseract TSV columns for ``image``; ``dpi`` is the resolution it was rendered at."""
+
+    data = OCR_ENGINES[engine](image, lang=lang, psm=psm, dpi=dpi)
+    return data if data is not None else {}
+
+
+def open_ocr_handle(*, lang: str, psm: int = 6) -> bool:
+    """Open this process's tesserocr handle ahead of the first page; ``False`` if tesserocr is absent."""
+
+    tesserocr = load_backend("tesserocr")
+    if tesserocr is None:
+        return False
+    _HANDLES.open(tesserocr, lang=lang, psm=psm)
+    return True
+
+
+def close_ocr_handles() -> None:
+    _HANDLES.close()
+
+
+__all__ = [
+    "ESCALATE_CONFIDENCE",
+    "LANGUAGE_LADDERS",
+    "OCR_ENGINES",
+    "close_ocr_handles",
+    "image_to_data",
+    "language_ladder",
+    "mean_confidence",
+    "ocr_country",
+    "open_ocr_handle",
+    "resolve_ocr_engine",
+]
@@ -0,0 +1,110 @@
+"""Rank pages by how likely they are to hold the pay figures.
+
+Uploads often carry cover letters, terms pages or blank scanned backs
+around the payslip itself. Before any page is rasterised for OCR, the
+preview or the LLM, every page read so far is scored from cheap signals:
+
+* payslip labels (the ``native.LABELS`` vocabulary) and amounts in its text layer,
+* text density, capped so a long terms page cannot outrank a payslip,
+* for image-only pages, a flat prior plus an ink check on a tiny render, so
+  blank backs are dropped instead of OCR'd.
+
+``rank_pages`` returns page indexes best first, leaving blank pages out.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Sequence
+
+from .backends import load_backend
+from .native import AMOUNT_PATTERN, CURRENT_HEADER, LABEL_GROUPS, LABEL_PATTERN, YTD_HEADER
+from .pdf import IMAGE_PAGE, PageInfo, PdfText
+
+LOGGER = logging.getLogger(__name__)
+
+FIELD_WEIGHT = 3.0
+AMOUNT_WEIGHT = 0.5
+MAX_AMOUNTS = 20
+# Words per point of density score, and the most density can add.
+DENSITY_WORDS = 100
+MAX_DENSITY = 2.0
+# An unread image page may well be the scanned payslip: worth one field hit plus an amount.
+IMAGE_PRIOR = FIELD_WEIGHT + AMOUNT_WEIGHT
+INK_DPI = 36
+INK_LEVEL = 200
+BLANK_INK = 0.001
+_DARK = bytes(range(INK_LEVEL))
+
+
+@dataclass(slots=True)
+class PageScore:
+    index: int
+    score: float
+    fields: int
+    amounts: int
+    blank: bool = False
+
+
+def _page_lines(text: PdfText) -> Dict[int, List[str]]:
+    lines: Dict[int, Dict[int, List[str]]] = {}
+    for word in text.words:
+        lines.setdefault(word.page, {}).setdefault(word.line, []).append(word.text)
+    return {page: [" ".join(tokens) for tokens in rows.values()] for page, rows in lines.items()}
+
+
+def page_ink(data: bytes, indexes: Sequence[int]) -> Dict[int, float]:
+    """Share of non-white pixels on a ``INK_DPI`` grayscale render of each page; empty without PyMuPDF."""
+
+    fitz = load_backend("fitz")
+    if fitz is None or not indexes:
+        return {}
+    ink: Dict[int, float] = {}
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        for index in indexes:
+            if index >= doc.page_count:
+                continue
+            pixmap = doc[index].get_pixmap(dpi=INK_DPI, colorspace=fitz.csGRAY, alpha=False)
+            samples = pixmap.samples
+            dark = len(samples) - len(samples.translate(None, _DARK))
+            ink[index] = dark / max(len(samples), 1)
+    return ink
+
+
+def score_page(info: PageInfo, lines: Sequence[str], ink: Optional[float] = None) -> PageScore:
+    fields = set()
+    amounts = 0
+    for line in lines:
+        for match in LABEL_PATTERN.finditer(line):
+            name = LABEL_GROUPS[match.lastgroup or ""]
+            if name not in (YTD_HEADER, CURRENT_HEADER):
+                fields.add(name)
+        amounts += len(AMOUNT_PATTERN.findall(line))
+    words = sum(len(line.split()) for line in lines)
+    score = FIELD_WEIGHT * len(fields) + AMOUNT_WEIGHT * min(amounts, MAX_AMOUNTS)
+    score += min(words / DENSITY_WORDS, MAX_DENSITY)
+    blank = False
+    if info.kind == IMAGE_PAGE and not fields:
+        blank = ink is not None and ink < BLANK_INK
+        score = 0.0 if blank else score + IMAGE_PRIOR
+    return PageScore(index=info.index, score=round(score, 2), fields=len(fields), amounts=amounts, blank=blank)
+
+
+def score_pages(text: PdfText, *, ink: Optional[Mapping[int, float]] = None) -> List[PageScore]:
+    lines = _page_lines(text)
+    ink = ink or {}
+    return [score_page(info, lines.get(info.index, []), ink.get(info.index)) for info in text.pages]
+
+
+def rank_pages(text: PdfText, *, ink: Optional[Mapping[int, float]] = None) -> List[int]:
+    """Indexes of non-blank pages, most likely payslip first (ties keep document order)."""
+
+    scores = score_pages(text, ink=ink)
+    skipped = [score.index for score in scores if score.blank]
+    if skipped:
+        LOGGER.info("Skipping blank pages %s", skipped)
+    ranked = sorted((score for score in scores if not score.blank), key=lambda score: (-score.score, score.index))
+    return [score.index for score in ranked]
+
+
+__all__ = ["PageScore", "page_ink", "rank_pages", "score_page", "score_pages"]
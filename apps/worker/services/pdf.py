@@ -2,33 +2,90 @@ from __future__ import annotations
 
 import io
 import logging
-from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-from PIL import Image, ImageDraw, ImageFont
+from .backends import load_backend, require_backend
+from .ocr_cache import OcrCache, get_ocr_cache
+from .ocr_engine import ESCALATE_CONFIDENCE, image_to_data, language_ladder, mean_confidence, resolve_ocr_engine
 
-try:
-    import fitz  # PyMuPDF
-except Exception:  # pragma: no cover - optional dependency
-    fitz = None
+LOGGER = logging.getLogger(__name__)
 
-try:
-    import pdfplumber
-except Exception:  # pragma: no cover - optional dependency
-    pdfplumber = None
 
-try:
-    import pytesseract
-except Exception:  # pragma: no cover - optional dependency
-    pytesseract = None
+@dataclass(slots=True)
+class PageWord:
+    """A word with its bounding box normalised to the page (0..1)."""
 
-LOGGER = logging.getLogger(__name__)
+    page: int
+    line: int
+    text: str
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+
+
+# Page region as fractions of the page: (x0, y0, x1, y1).
+Region = Tuple[float, float, float, float]
+ROI_SCOUT_DPI = 100
+
+TEXT_PAGE = "text"
+IMAGE_PAGE = "image"
+MIN_TEXT_WORDS = 3
+
+
+@dataclass(slots=True)
+class PageInfo:
+    """Whether a page carries a usable text layer or only pixels that need OCR."""
+
+    index: int
+    kind: str
+    words: int
+    image_coverage: float = 0.0
 
 
 @dataclass(slots=True)
 class PdfText:
     raw_text: str
     has_text: bool
+    words: List[PageWord] = field(default_factory=list)
+    pages: List[PageInfo] = field(default_factory=list)
+    engine: Optional[str] = None
+    # Pages in the document, including any the reader stopped before.
+    page_count: int = 0
+    # OCR only: language set each page was finally read with, and mean word confidence (0-100).
+    ocr_languages: List[str] = field(default_factory=list)
+    confidence: Optional[float] = None
+    # OCR only: [pixels handed to Tesseract, pixels of the whole pages at the same DPI].
+    ocr_pixels: List[int] = field(default_factory=list)
+    # OCR only: pages read whole at full DPI. Region reads leave the rest of their page unread.
+    whole_pages: List[int] = field(default_factory=list)
+
+
+def join_pages(pages: Sequence[PdfText]) -> PdfText:
+    """Concatenate per-page results in reading order."""
+
+    raw_text = "\n".join(page.raw_text for page in pages)
+    return PdfText(
+        raw_text=raw_text,
+        has_text=any(page.has_text for page in pages),
+        words=[word for page in pages for word in page.words],
+        pages=[info for page in pages for info in page.pages],
+        engine=pages[0].engine if pages else None,
+        page_count=max((page.page_count for page in pages), default=0),
+    )
+
+
+def classify_page(index: int, words: Sequence[str], image_coverage: float = 0.0) -> PageInfo:
+    # Undecodable glyphs come through as "(cid:NN)"; a layer made of them is no better than pixels.
+    readable = [word for word in words if "(cid:" not in word]
+    usable = len(readable) >= MIN_TEXT_WORDS and len(readable) * 2 >= len(words)
+    return PageInfo(
+        index=index,
+        kind=TEXT_PAGE if usable else IMAGE_PAGE,
+        words=len(words),
+        image_coverage=round(min(image_coverage, 1.0), 3),
+    )
 
 
 @dataclass(slots=True)
@@ -37,9 +94,79 @@ class RasterizedPage:
     png_bytes: bytes
 
 
+class PageRenditions:
+    """Render PDF pages only when a consumer reads them, sharing rasters between consumers.
+
+    Every read is appended to ``used`` (consumer, page, dpi and whether the
+    raster was already rendered) so jobs can record which renditions they
+    actually needed.
+    """
+
+    def __init__(self, data: bytes, *, dpi: int = 300, used: Optional[List[Dict[str, Any]]] = None) -> None:
+        self._data = data
+        self.dpi = dpi
+        self.used: List[Dict[str, Any]] = used if used is not None else []
+        self._doc: Any = None
+        self._rasters: Dict[Tuple[int, int], bytes] = {}
+
+    def _document(self) -> Any:
+        if self._doc is None:
+            fitz = load_backend("fitz")
+            self._doc = fitz.open(stream=self._data, filetype="pdf") if fitz is not None else False
+        return self._doc or None
+
+    @property
+    def page_count(self) -> int:
+        doc = self._document()
+        return len(doc) if doc is not None else 0
+
+    def page(self, index: int, *, consumer: str, dpi: Optional[int] = None) -> "LazyPage":
+        return LazyPage(self, index, consumer=consumer, dpi=dpi or self.dpi)
+
+    def render(self, index: int, *, consumer: str, dpi: Optional[int] = None) -> bytes:
+        dpi = dpi or self.dpi
+        key = (index, dpi)
+        cached = key in self._rasters
+        if not cached:
+            doc = self._document()
+            if doc is None:
+                LOGGER.warning("PyMuPDF unavailable; returning placeholder rasterization")
+                self._rasters[key] = _placeholder_image("Preview unavailable")
+            elif index >= len(doc):
+                self._rasters[key] = _placeholder_image("Empty PDF")
+            else:
+                self._rasters[key] = doc[index].get_pixmap(dpi=dpi).tobytes("png")
+        self.used.append({"consumer": consumer, "page": index, "dpi": dpi, "cached": cached})
+        return self._rasters[key]
+
+
+class LazyPage:
+    """Drop-in for ``RasterizedPage`` whose raster is rendered on first ``png_bytes`` access."""
+
+    __slots__ = ("index", "consumer", "dpi", "_renditions", "_png")
+
+    def __init__(self, renditions: PageRenditions, index: int, *, consumer: str, dpi: int) -> None:
+        self.index = index
+        self.consumer = consumer
+        self.dpi = dpi
+        self._renditions = renditions
+        self._png: Optional[bytes] = None
+
+    @property
+    def rendered(self) -> bool:
+        return self._png is not None
+
+    @property
+    def png_bytes(self) -> bytes:
+        if self._png is None:
+            self._png = self._renditions.render(self.index, consumer=self.consumer, dpi=self.dpi)
+        return self._png
+
+
 def decrypt_pdf(data: bytes, password: Optional[str]) -> bytes:
     if not password:
         return data
+    fitz = load_backend("fitz")
     if fitz is None:
         LOGGER.warning("PyMuPDF unavailable; returning encrypted payload as-is.")
         return data
@@ -53,18 +180,152 @@ def decrypt_pdf(data: bytes, password: Optional[str]) -> bytes:
     return buffer.getvalue()
 
 
+def iter_pages(data: bytes) -> Iterator[PdfText]:
+    """Yield one ``PdfText`` per page with pdfplumber, so callers can stop reading early."""
+
+    pdfplumber = require_backend("pdfplumber")
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        page_count = len(pdf.pages)
+        for index, page in enumerate(pdf.pages):
+            text = page.extract_text() or ""
+            words = _plumber_words(page, index)
+            info = classify_page(index, [word.text for word in words], _plumber_image_coverage(page))
+            yield PdfText(
+                raw_text=text,
+                has_text=bool(text.strip()),
+                words=words,
+                pages=[info],
+                engine="pdfplumber",
+                page_count=page_count,
+            )
+
+
 def extract_text(data: bytes) -> PdfText:
-    if pdfplumber is None:
+    if load_backend("pdfplumber") is None:
         LOGGER.warning("pdfplumber unavailable; returning empty text")
         return PdfText(raw_text="", has_text=False)
-    with pdfplumber.open(io.BytesIO(data)) as pdf:
-        texts: List[str] = []
-        for page in pdf.pages:
-            text = page.extract_text() or ""
-            texts.append(text)
-        raw_text = "\n".join(texts)
-        has_text = any(text.strip() for text in texts)
-        return PdfText(raw_text=raw_text, has_text=has_text)
+    return join_pages(list(iter_pages(data)))
+
+
+def _plumber_image_coverage(page: Any) -> float:
+    area = float(page.width) * float(page.height) or 1.0
+    covered = sum(
+        abs(float(image["x1"]) - float(image["x0"])) * abs(float(image["bottom"]) - float(image["top"]))
+        for image in page.images
+    )
+    return covered / area
+
+
+def _plumber_words(page: Any, page_index: int) -> List[PageWord]:
+    width = float(page.width) or 1.0
+    height = float(page.height) or 1.0
+    results: List[PageWord] = []
+    line = -1
+    previous: Optional[Dict[str, Any]] = None
+    for word in page.extract_words():
+        if previous is None or _starts_new_line(previous, word):
+            line += 1
+        results.append(
+            PageWord(
+                page=page_index,
+                line=line,
+                text=word["text"],
+                x0=float(word["x0"]) / width,
+                y0=float(word["top"]) / height,
+                x1=float(word["x1"]) / width,
+                y1=float(word["bottom"]) / height,
+            )
+        )
+        previous = word
+    return results
+
+
+def _starts_new_line(previous: Dict[str, Any], word: Dict[str, Any]) -> bool:
+    if float(word["x0"]) < float(previous["x1"]):
+        return True
+    tolerance = (float(previous["bottom"]) - float(previous["top"])) / 2
+    return abs(float(word["top"]) - float(previous["top"])) > tolerance
+
+
+def _ocr_page(data: Dict[str, List[Any]], page_index: int, width: int, height: int) -> Tuple[str, List[PageWord]]:
+    """Rebuild page text and word boxes from Tesseract's TSV output."""
+
+    lines: Dict[Tuple[int, int, int], List[str]] = {}
+    line_ids: Dict[Tuple[int, int, int], int] = {}
+    words: List[PageWord] = []
+    for i, token in enumerate(data.get("text") or []):
+        token = (token or "").strip()
+        if not token:
+            continue
+        key = (int(data["block_num"][i]), int(data["par_num"][i]), int(data["line_num"][i]))
+        if key not in lines:
+            line_ids[key] = len(lines)
+            lines[key] = []
+        lines[key].append(token)
+        left, top = float(data["left"][i]), float(data["top"][i])
+        words.append(
+            PageWord(
+                page=page_index,
+                line=line_ids[key],
+                text=token,
+                x0=left / width,
+                y0=top / height,
+                x1=(left + float(data["width"][i])) / width,
+                y1=(top + float(data["height"][i])) / height,
+            )
+        )
+    text = "\n".join(" ".join(tokens) for tokens in lines.values())
+    return text, words
+
+
+def _best_reading(
+    image: Any,
+    ladder: Sequence[Sequence[str]],
+    *,
+    psm: int,
+    engine: str,
+    dpi: int,
+    cache: Optional[OcrCache] = None,
+    scope: Optional[str] = None,
+) -> Tuple[float, str, Dict[str, List[Any]], int]:
+    """Climb the language ladder until confidence is high enough; returns (confidence, languages, data, pixels read).
+
+    ``cache`` is only consulted with a ``scope`` (the owning user); cache hits do not count as pixels read.
+    """
+
+    best: Tuple[float, str, Dict[str, List[Any]]] = (-1.0, "+".join(ladder[0]), {})
+    pixels = 0
+    for rung in ladder:
+        lang_spec = "+".join(rung)
+        computed: List[bool] = []
+
+        def compute(lang_spec: str = lang_spec) -> Dict[str, List[Any]]:
+            computed.append(True)
+            return image_to_data(image, lang=lang_spec, psm=psm, engine=engine, dpi=dpi)
+
+        try:
+            if cache is None or scope is None:
+                ocr_data = compute()
+            else:
+                ocr_data = cache.fetch(image, scope=scope, lang=lang_spec, psm=psm, engine=engine, compute=compute)
+        except Exception as exc:  # pragma: no cover - dependency failure path
+            LOGGER.warning("Tesseract OCR failed: %s", exc)
+            break
+        if computed:
+            pixels += image.width * image.height
+        confidence = mean_confidence(ocr_data)
+        if confidence is not None and confidence > best[0]:
+            best = (confidence, lang_spec, ocr_data)
+        if best[0] >= ESCALATE_CONFIDENCE:
+            break
+    return (*best, pixels)
+
+
+def _shift(data: Dict[str, List[Any]], left: int, top: int) -> Dict[str, List[Any]]:
+    shifted = dict(data)
+    shifted["left"] = [int(value) + left for value in data.get("left") or []]
+    shifted["top"] = [int(value) + top for value in data.get("top") or []]
+    return shifted
 
 
 def perform_ocr(
@@ -74,35 +335,107 @@ def perform_ocr(
     languages: Optional[Iterable[str]] = None,
     page_limit: Optional[int] = None,
     psm: int = 6,
+    renditions: Optional[PageRenditions] = None,
+    pages: Optional[Sequence[int]] = None,
+    engine: Optional[str] = None,
+    country: Optional[str] = None,
+    locate_regions: Optional[Callable[[List[PageWord]], List[Region]]] = None,
+    cache: Optional[OcrCache] = None,
+    cache_scope: Optional[str] = None,
 ) -> PdfText:
-    """Run Tesseract OCR against rasterised PDF pages."""
-
-    if fitz is None or pytesseract is None:
+    """Run Tesseract OCR against rasterised PDF pages.
+
+    ``pages`` restricts OCR to specific page indexes (``page_limit`` still
+    applies). Pass ``renditions`` to share page rasters with later consumers
+    such as the redacted preview. ``engine`` picks the Tesseract binding
+    (see ``ocr_engine``; default ``OCR_ENGINE``). Without explicit
+    ``languages``, each page climbs ``country``'s language ladder until its
+    mean confidence reaches ``ESCALATE_CONFIDENCE``.
+
+    With ``locate_regions``, each page is first read at ``ROI_SCOUT_DPI``;
+    the callback turns those words into page regions and only those crops
+    are OCR'd at ``dpi``. Pages where it finds nothing are read whole;
+    only those are listed in ``whole_pages``.
+
+    With ``cache_scope`` (the user id owning the document), every Tesseract
+    call goes through ``cache`` (default: ``OCR_CACHE``), so pixels that user
+    had read before are served without OCR. Unscoped calls never touch the
+    cache, since their entries could not be purged.
+    """
+
+    fitz = load_backend("fitz")
+    engine = resolve_ocr_engine(engine)
+    if fitz is None or engine is None:
         LOGGER.warning("OCR dependencies unavailable; skipping Tesseract fallback")
         return PdfText(raw_text="", has_text=False)
 
-    lang_spec = "+".join(languages or ("eng", "enm", "gle"))
-    doc = fitz.open(stream=data, filetype="pdf")
+    image_module = require_backend("image")
+    if cache_scope is None:
+        cache = None
+    elif cache is None:
+        cache = get_ocr_cache()
+    ladder = (tuple(languages),) if languages else language_ladder(country)
+    renditions = renditions or PageRenditions(data, dpi=dpi)
     texts: List[str] = []
-    for index, page in enumerate(doc):
-        if page_limit is not None and index >= page_limit:
-            break
-        pix = page.get_pixmap(dpi=dpi)
-        image = Image.open(io.BytesIO(pix.tobytes("png")))
-        try:
-            ocr_text = pytesseract.image_to_string(
-                image, lang=lang_spec, config=f"--psm {psm}"
+    words: List[PageWord] = []
+    used: List[str] = []
+    scores: List[float] = []
+    pixels = page_pixels = 0
+    wanted = range(renditions.page_count) if pages is None else pages
+    indexes = [index for index in wanted if index < renditions.page_count]
+    whole_pages: List[int] = []
+    for index in indexes[:page_limit]:
+        regions: List[Region] = []
+        if locate_regions is not None:
+            scout = image_module.open(io.BytesIO(renditions.render(index, consumer="ocr", dpi=ROI_SCOUT_DPI)))
+            _, _, scout_data, scout_pixels = _best_reading(
+                scout, ladder[:1], psm=psm, engine=engine, dpi=ROI_SCOUT_DPI, cache=cache, scope=cache_scope
             )
-        except Exception as exc:  # pragma: no cover - dependency failure path
-            LOGGER.warning("Tesseract OCR failed: %s", exc)
-            ocr_text = ""
-        texts.append(ocr_text)
-    raw_text = "\n".join(texts)
-    return PdfText(raw_text=raw_text, has_text=bool(raw_text.strip()))
+            pixels += scout_pixels
+            scout_words = _ocr_page(scout_data, index, scout.width, scout.height)[1]
+            regions = locate_regions(scout_words)
+        if not regions:
+            whole_pages.append(index)
+        image = image_module.open(io.BytesIO(renditions.render(index, consumer="ocr", dpi=dpi)))
+        page_pixels += image.width * image.height
+        crops = [
+            (int(x0 * image.width), int(y0 * image.height), int(x1 * image.width + 0.5), int(y1 * image.height + 0.5))
+            for x0, y0, x1, y1 in regions
+        ] or [(0, 0, image.width, image.height)]
+        page_languages: List[str] = []
+        line_offset = 0
+        for box in crops:
+            crop = image if box == (0, 0, image.width, image.height) else image.crop(box)
+            confidence, lang_spec, ocr_data, read = _best_reading(
+                crop, ladder, psm=psm, engine=engine, dpi=dpi, cache=cache, scope=cache_scope
+            )
+            pixels += read
+            ocr_text, ocr_words = _ocr_page(_shift(ocr_data, box[0], box[1]), index, image.width, image.height)
+            for word in ocr_words:
+                word.line += line_offset
+            line_offset = max((word.line + 1 for word in ocr_words), default=line_offset)
+            texts.append(ocr_text)
+            words.extend(ocr_words)
+            page_languages.append(lang_spec)
+            if confidence >= 0:
+                scores.append(confidence)
+        used.append(max(page_languages, key=lambda spec: spec.count("+")))
+    raw_text = "\n".join(text for text in texts if text)
+    return PdfText(
+        raw_text=raw_text,
+        has_text=bool(raw_text.strip()),
+        words=words,
+        engine="ocr",
+        ocr_languages=used,
+        confidence=round(sum(scores) / len(scores), 2) if scores else None,
+        ocr_pixels=[pixels, page_pixels],
+        whole_pages=whole_pages,
+    )
 
 
 def rasterize_first_pages(data: bytes, *, dpi: int = 300, pages: int = 2) -> List[RasterizedPage]:
     results: List[RasterizedPage] = []
+    fitz = load_backend("fitz")
     if fitz is None:
         LOGGER.warning("PyMuPDF unavailable; returning placeholder rasterization")
         placeholder = _placeholder_image("Preview unavailable")
@@ -120,12 +453,13 @@ def rasterize_first_pages(data: bytes, *, dpi: int = 300, pages: int = 2) -> Lis
 
 
 def _placeholder_image(text: str) -> bytes:
-    img = Image.new("RGB", (900, 1200), color="white")
-    draw = ImageDraw.Draw(img)
+    image_font = require_backend("image_font")
+    img = require_backend("image").new("RGB", (900, 1200), color="white")
+    draw = require_backend("image_draw").Draw(img)
     try:
-        font = ImageFont.truetype("DejaVuSans.ttf", 24)
+        font = image_font.truetype("DejaVuSans.ttf", 24)
     except Exception:  # pragma: no cover - fallback
-        font = ImageFont.load_default()
+        font = image_font.load_default()
     draw.text((50, 600), text, fill="black", font=font)
     buf = io.BytesIO()
     img.save(buf, format="PNG")
@@ -177,41 +511,23 @@ def parse_amount(token: str) -> Optional[float]:
         return None
 
 
-def extract_kv_pairs(raw_text: str) -> Dict[str, float]:
-    keys = {
-        "gross": ["gross pay", "gross", "total gross"],
-        "net": ["net pay", "take home", "net"],
-        "tax_income": ["tax", "income tax"],
-        "ni_prsi": ["ni", "national insurance", "prsi"],
-        "pension_employee": ["pension", "employee pension"],
-        "student_loan": ["student loan"],
-    }
-    lowered = raw_text.lower()
-    lines = lowered.splitlines()
-    results: Dict[str, float] = {}
-    for key, hints in keys.items():
-        for line in lines:
-            if key in results:
-                break
-            if any(hint in line for hint in hints):
-                parts = line.split()
-                for token in reversed(parts):
-                    amount = parse_amount(token)
-                    if amount is not None:
-                        results[key] = amount
-                        break
-    return results
-
-
 __all__ = [
+    "PageWord",
     "PdfText",
+    "PageInfo",
+    "TEXT_PAGE",
+    "IMAGE_PAGE",
+    "classify_page",
     "RasterizedPage",
+    "PageRenditions",
+    "LazyPage",
     "decrypt_pdf",
     "extract_text",
+    "iter_pages",
+    "join_pages",
     "perform_ocr",
     "rasterize_first_pages",
     "render_redacted_preview",
     "guess_currency",
     "guess_country",
-    "extract_kv_pairs",
 ]
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
+import io
 import logging
 import re
+from bisect import bisect_right
 from dataclasses import dataclass
-from typing import Dict, Iterable, List
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
-from .pdf import render_redacted_preview
+from .backends import require_backend
+from .pdf import LazyPage, PageWord, RasterizedPage, render_redacted_preview
 
 LOGGER = logging.getLogger(__name__)
 
@@ -25,36 +28,166 @@ SENSITIVE_PATTERNS: Dict[str, Iterable[re.Pattern[str]]] = {
     "address": [POSTCODE_REGEX, ADDRESS_REGEX],
 }
 
+REDACTION_CHAR = "█"
+BOX_PADDING = 0.002
+
+
+@dataclass(slots=True)
+class RedactionSpan:
+    label: str
+    start: int
+    end: int
+
 
 @dataclass(slots=True)
 class RedactionResult:
     redacted_text: str
     boxes: List[Dict[str, float]]
-    preview_png: bytes
+    spans: List[RedactionSpan]
+    geometry_pages: List[int]
+
+
+def _compile_scanner(
+    patterns: Dict[str, Iterable[re.Pattern[str]]],
+) -> Tuple[re.Pattern[str], Dict[str, str]]:
+    """Fold every sensitive pattern into a single alternation.
+
+    Each pattern keeps its own flags via a scoped inline group and is wrapped in
+    a named group so the winning alternative maps back to its label. Earlier
+    labels take precedence when two patterns match at the same offset.
+    """
+
+    alternatives: List[str] = []
+    group_labels: Dict[str, str] = {}
+    for label, label_patterns in patterns.items():
+        for index, pattern in enumerate(label_patterns):
+            group = f"{label}_{index}"
+            flags = "i" if pattern.flags & re.IGNORECASE else ""
+            body = f"(?{flags}:{pattern.pattern})" if flags else f"(?:{pattern.pattern})"
+            alternatives.append(f"(?P<{group}>{body})")
+            group_labels[group] = label
+    return re.compile("|".join(alternatives)), group_labels
+
+
+_SCANNER, _GROUP_LABELS = _compile_scanner(SENSITIVE_PATTERNS)
+
+
+def find_sensitive_spans(raw_text: str) -> List[RedactionSpan]:
+    """Return non-overlapping sensitive spans in a single left-to-right pass."""
+
+    return [
+        RedactionSpan(label=_GROUP_LABELS[match.lastgroup or ""], start=match.start(), end=match.end())
+        for match in _SCANNER.finditer(raw_text)
+    ]
+
+
+def apply_spans(raw_text: str, spans: List[RedactionSpan]) -> str:
+    parts: List[str] = []
+    cursor = 0
+    for span in spans:
+        parts.append(raw_text[cursor : span.start])
+        parts.append(REDACTION_CHAR * (span.end - span.start))
+        cursor = span.end
+    parts.append(raw_text[cursor:])
+    return "".join(parts)
 
 
-def redact_text(raw_text: str) -> RedactionResult:
+def locate_boxes(words: Sequence[PageWord]) -> List[Dict[str, float]]:
+    """Map sensitive spans found in the word layer onto page-normalised boxes.
+
+    Words are joined line by line so multi-word matches (postcodes, street
+    addresses) are still detected; a span crossing lines yields one box per line.
+    """
+
+    parts: List[str] = []
+    starts: List[int] = []
+    ends: List[int] = []
+    cursor = 0
+    previous_key = None
+    for word in words:
+        key = (word.page, word.line)
+        if parts:
+            parts.append(" " if key == previous_key else "\n")
+            cursor += 1
+        starts.append(cursor)
+        parts.append(word.text)
+        cursor += len(word.text)
+        ends.append(cursor)
+        previous_key = key
+
     boxes: List[Dict[str, float]] = []
-    redacted_text = raw_text
-    total_hits = 0
-    for label, patterns in SENSITIVE_PATTERNS.items():
-        for pattern in patterns:
-            for match_index, match in enumerate(pattern.finditer(raw_text)):
-                start, end = match.span()
-                token = match.group(0)
-                redacted_text = redacted_text.replace(token, "█" * len(token))
-                boxes.append(
-                    {
-                        "x": 0.05,
-                        "y": min(0.9, 0.05 + 0.08 * total_hits),
-                        "w": 0.9,
-                        "h": 0.06,
-                        "label": label,
-                    }
-                )
-                total_hits += 1
-    preview_png = render_redacted_preview(redacted_text or "Redaction preview unavailable")
-    return RedactionResult(redacted_text=redacted_text, boxes=boxes, preview_png=preview_png)
-
-
-__all__ = ["redact_text", "RedactionResult"]
+    for span in find_sensitive_spans("".join(parts)):
+        rects: Dict[Tuple[int, int], List[float]] = {}
+        index = max(bisect_right(starts, span.start) - 1, 0)
+        while index < len(words) and starts[index] < span.end:
+            if ends[index] > span.start:
+                word = words[index]
+                rect = rects.setdefault((word.page, word.line), [word.x0, word.y0, word.x1, word.y1])
+                rect[0], rect[1] = min(rect[0], word.x0), min(rect[1], word.y0)
+                rect[2], rect[3] = max(rect[2], word.x1), max(rect[3], word.y1)
+            index += 1
+        for (page, _line), (x0, y0, x1, y1) in rects.items():
+            x0, y0 = max(0.0, x0 - BOX_PADDING), max(0.0, y0 - BOX_PADDING)
+            x1, y1 = min(1.0, x1 + BOX_PADDING), min(1.0, y1 + BOX_PADDING)
+            boxes.append({"page": page, "x": x0, "y": y0, "w": x1 - x0, "h": y1 - y0, "label": span.label})
+    return boxes
+
+
+def redact_text(
+    raw_text: str, words: Sequence[PageWord] = (), *, covered_pages: Optional[Iterable[int]] = None
+) -> RedactionResult:
+    """Mask sensitive spans in ``raw_text`` and locate them in ``words``.
+
+    ``covered_pages`` lists the pages whose words account for everything on
+    them (no unread image content); only those are painted in place by
+    ``redacted_preview``. Without it, any page with words counts as covered.
+    """
+
+    spans = find_sensitive_spans(raw_text)
+    redacted_text = apply_spans(raw_text, spans)
+    boxes = locate_boxes(words) if words else []
+    geometry_pages = sorted({word.page for word in words})
+    if covered_pages is not None:
+        covered = set(covered_pages)
+        geometry_pages = [page for page in geometry_pages if page in covered]
+    return RedactionResult(redacted_text=redacted_text, boxes=boxes, spans=spans, geometry_pages=geometry_pages)
+
+
+def paint_redactions(png_bytes: bytes, boxes: Sequence[Dict[str, float]], *, page: int = 0) -> bytes:
+    image = require_backend("image").open(io.BytesIO(png_bytes)).convert("RGB")
+    draw = require_backend("image_draw").Draw(image)
+    width, height = image.size
+    for box in boxes:
+        if box.get("page", 0) != page:
+            continue
+        left, top = box["x"] * width, box["y"] * height
+        draw.rectangle([left, top, left + box["w"] * width, top + box["h"] * height], fill="black")
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def redacted_preview(result: RedactionResult, page: Union[RasterizedPage, LazyPage]) -> bytes:
+    """Paint redaction boxes onto a rasterised page.
+
+    Pages without word geometry covering the whole page (scans where OCR did
+    not run, or text pages carrying embedded images nobody read) cannot be
+    redacted in place, so they fall back to rendering the redacted text; a
+    ``LazyPage`` is never rendered in that case.
+    """
+
+    if page.index in result.geometry_pages:
+        return paint_redactions(page.png_bytes, result.boxes, page=page.index)
+    return render_redacted_preview(result.redacted_text or "Redaction preview unavailable")
+
+
+__all__ = [
+    "redact_text",
+    "find_sensitive_spans",
+    "apply_spans",
+    "locate_boxes",
+    "paint_redactions",
+    "redacted_preview",
+    "RedactionResult",
+    "RedactionSpan",
+]
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Optional, Set
+
+from apps.common.supabase import get_supabase
+from apps.worker.services.reports import TEMPLATE_DIR
+from apps.worker.services.storage import StorageService
+
+LOGGER = logging.getLogger(__name__)
+
+CACHE_TABLE = "report_cache"
+
+
+@dataclass(slots=True)
+class CachedReport:
+    digest: str
+    storage_path: Optional[str]
+    row: Optional[Dict[str, Any]]
+
+    @property
+    def hit(self) -> bool:
+        return bool(self.storage_path)
+
+
+@lru_cache(maxsize=1)
+def template_version() -> str:
+    """Digest of the report templates so any template change misses the cache."""
+
+    digest = hashlib.sha256()
+    for path in sorted(TEMPLATE_DIR.iterdir()):
+        if path.is_file():
+            digest.update(path.name.encode("utf-8"))
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def payload_digest(kind: str, payload: Any) -> str:
+    normalized = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    material = f"{template_version()}\n{kind}\n{normalized}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def cached_artifact_name(filename: str, digest: str) -> str:
+    """Prefix the artifact name with the digest so cached renders never overwrite each other."""
+
+    return f"{digest[:16]}_{filename}"
+
+
+def lookup_report(user_id: str, kind: str, payload: Any) -> CachedReport:
+    digest = payload_digest(kind, payload)
+    supabase = get_supabase()
+    row = supabase.table_select_single(CACHE_TABLE, match={"user_id": user_id, "kind": kind, "digest": digest})
+    if row and not row.get("invalidated_at") and row.get("storage_path"):
+        LOGGER.info("Report cache hit", extra={"user_id": user_id, "kind": kind, "digest": digest})
+        return CachedReport(digest=digest, storage_path=row["storage_path"], row=row)
+    return CachedReport(digest=digest, storage_path=None, row=row)
+
+
+def store_report(user_id: str, kind: str, cached: CachedReport, storage_path: str) -> None:
+    """Record ``storage_path`` for the payload digest.
+
+    Upserting on the (user_id, kind, digest) unique index means two identical
+    jobs that both missed the cache do not fail on the second insert; the
+    later artifact simply wins.
+    """
+
+    get_supabase().upsert_row(
+        CACHE_TABLE,
+        {
+            "user_id": user_id,
+            "kind": kind,
+            "digest": cached.digest,
+            "storage_path": storage_path,
+            "invalidated_at": None,
+        },
+        on_conflict="user_id,kind,digest",
+    )
+
+
+def _referenced_paths(user_id: str, kind: str) -> Set[str]:
+    """Artifact paths that the user's jobs of ``kind`` still hand out as ``meta.download_url``."""
+
+    jobs = get_supabase().iter_rows("jobs", filters={"user_id": user_id, "kind": kind}, columns="id, meta")
+    return {path for path in ((row.get("meta") or {}).get("download_url") for row in jobs) if path}
+
+
+def purge_invalidated_reports(user_id: str, kind: str, storage: StorageService) -> int:
+    """Remove artifacts whose cache rows were invalidated by payslip changes.
+
+    An artifact that an earlier job still hands out as its ``download_url``
+    is kept, along with its ``storage_path``, so a later purge can retry once
+    no job references it.
+    """
+
+    supabase = get_supabase()
+    response = (
+        supabase.client.table(CACHE_TABLE)
+        .select("id, storage_path, invalidated_at")
+        .eq("user_id", user_id)
+        .eq("kind", kind)
+        .execute()
+    )
+    stale = [row for row in response.data or [] if row.get("invalidated_at") and row.get("storage_path")]
+    if not stale:
+        return 0
+    referenced = _referenced_paths(user_id, kind)
+    stale = [row for row in stale if row["storage_path"] not in referenced]
+    if not stale:
+        return 0
+    storage.delete_objects([row.get("storage_path") for row in stale])
+    for row in stale:
+        supabase.update_row(
+            CACHE_TABLE,
+            match={"id": row["id"]},
+            updates={"storage_path": None},
+        )
+    return len(stale)
+
+
+__all__ = [
+    "CachedReport",
+    "cached_artifact_name",
+    "lookup_report",
+    "payload_digest",
+    "purge_invalidated_reports",
+    "store_report",
+    "template_version",
+]
@@ -5,25 +5,25 @@ import csv
 import io
 import json
 import logging
+import tempfile
 import zipfile
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, Dict, List, Optional
-
-from weasyprint import HTML
+from functools import lru_cache
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
 
 from pathlib import Path
 
 from apps.common.supabase import get_supabase
+from apps.worker.services.backends import load_backend, require_backend
+from apps.worker.services.columnar import COLUMNAR_TABLES, resolve_columnar_format, write_columnar_table
 from apps.worker.services.storage import StorageService, get_storage_service
 
-try:
-    import fitz
-except Exception:  # pragma: no cover - optional dependency fallback
-    fitz = None
-
 LOGGER = logging.getLogger(__name__)
 
+TEMPLATE_DIR = Path(__file__).resolve().parent.parent / "templates"
+PREVIEW_URL = "preview://redacted"
+
 
 @dataclass(slots=True)
 class ReportArtifact:
@@ -45,63 +45,107 @@ def generate_dossier_pdf(user_id: str, dossier: Dict[str, Any]) -> ReportArtifac
     return ReportArtifact(filename=f"{user_id}_dossier.pdf", bytes=pdf_bytes, content_type="application/pdf")
 
 
-def generate_hr_pack_pdf(user_id: str, payload: Dict[str, Any]) -> ReportArtifact:
+def generate_hr_pack_pdf(
+    user_id: str,
+    payload: Dict[str, Any],
+    *,
+    preview_image: Optional[bytes] = None,
+) -> ReportArtifact:
     preview = payload.get("redacted_preview") if isinstance(payload, dict) else None
-    rendered_payload = json.loads(json.dumps(payload)) if isinstance(payload, dict) else payload
+    rendered_payload = dict(payload) if isinstance(payload, dict) else payload
+    images: Dict[str, bytes] = {}
     if isinstance(rendered_payload, dict) and preview:
         preview_copy = dict(preview)
-        preview_copy.pop("image_data", None)
+        image_data = preview_copy.pop("image_data", None)
+        if preview_image is None and image_data:
+            preview_image = base64.b64decode(image_data)
         rendered_payload["redacted_preview"] = preview_copy
-    html = _render_html("HR Summary Pack", rendered_payload, preview=preview)
-    pdf_bytes = _write_pdf("HR Summary Pack", html, payload)
+    if preview_image:
+        images[PREVIEW_URL] = preview_image
+    html = _render_html("HR Summary Pack", rendered_payload, preview=preview, has_image=bool(images))
+    pdf_bytes = _write_pdf("HR Summary Pack", html, payload, images=images)
     return ReportArtifact(filename=f"{user_id}_hr_pack.pdf", bytes=pdf_bytes, content_type="application/pdf")
 
 
+@lru_cache(maxsize=1)
+def _template_environment() -> Any:
+    jinja2 = require_backend("jinja2")
+    return jinja2.Environment(
+        loader=jinja2.FileSystemLoader(str(TEMPLATE_DIR)),
+        autoescape=True,
+        auto_reload=False,
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
+
+
+@lru_cache(maxsize=None)
+def _template(name: str) -> Any:
+    return _template_environment().get_template(name)
+
+
+@lru_cache(maxsize=1)
+def _stylesheet() -> Tuple[Any, Any]:
+    """Parse the shared report stylesheet and font configuration once per process."""
+
+    weasyprint = require_backend("weasyprint")
+    from weasyprint.text.fonts import FontConfiguration
+
+    font_config = FontConfiguration()
+    css = weasyprint.CSS(filename=str(TEMPLATE_DIR / "report.css"), font_config=font_config)
+    return css, font_config
+
+
 def _render_html(
     title: str,
     payload: Dict[str, Any],
     *,
     preview: Optional[Dict[str, Any]] = None,
+    has_image: bool = False,
 ) -> str:
-    body = json.dumps(payload, indent=2)
-    preview_section = ""
+    preview_context = None
     if preview and preview.get("url"):
-        link = preview["url"]
-        label = preview.get("label") or "Redacted Preview"
-        image_html = ""
-        image_data = preview.get("image_data")
-        if image_data:
-            image_html = (
-                f"<img src='data:image/png;base64,{image_data}' alt='Redacted preview for {label}' "
-                "style='max-width:480px;border:1px solid #ccc;padding:8px;border-radius:4px;' />"
-            )
-        preview_section = f"""
-        <section>
-            <h2>Redacted Preview</h2>
-            <p><a href="{link}">Download redacted preview</a> for <strong>{label}</strong>.</p>
-            {image_html}
-        </section>
-        """
-    template = f"""
-    <html>
-    <head><meta charset='utf-8'><title>{title}</title></head>
-    <body>
-        <h1>{title}</h1>
-        {preview_section}
-        <pre>{body}</pre>
-    </body>
-    </html>
-    """
-    return template
+        preview_context = {
+            "url": preview["url"],
+            "label": preview.get("label") or "Redacted Preview",
+            "image_url": PREVIEW_URL if has_image else None,
+        }
+    return _template("report.html").render(
+        title=title,
+        preview=preview_context,
+        body=json.dumps(payload, indent=2),
+    )
 
 
-def _write_pdf(title: str, html: str, payload: Dict[str, Any]) -> bytes:
-    try:
-        return HTML(string=html).write_pdf()
-    except TypeError as exc:  # pragma: no cover - compatibility path
-        LOGGER.warning("WeasyPrint compatibility fallback: %s", exc)
-    except Exception as exc:  # pragma: no cover - rendering failure path
-        LOGGER.warning("WeasyPrint rendering failed: %s", exc)
+def _url_fetcher(images: Dict[str, bytes]) -> Callable[..., Dict[str, Any]]:
+    """Serve in-memory preview images to WeasyPrint; nothing else is fetched."""
+
+    def fetch(url: str, *_args: Any, **_kwargs: Any) -> Dict[str, Any]:
+        if url in images:
+            return {"string": images[url], "mime_type": "image/png"}
+        raise ValueError(f"Refusing to fetch external resource {url}")
+
+    return fetch
+
+
+def _write_pdf(
+    title: str,
+    html: str,
+    payload: Dict[str, Any],
+    *,
+    images: Optional[Dict[str, bytes]] = None,
+) -> bytes:
+    weasyprint = load_backend("weasyprint")
+    if weasyprint is not None:
+        try:
+            stylesheet, font_config = _stylesheet()
+            document = weasyprint.HTML(string=html, url_fetcher=_url_fetcher(images or {}))
+            return document.write_pdf(stylesheets=[stylesheet], font_config=font_config)
+        except TypeError as exc:  # pragma: no cover - compatibility path
+            LOGGER.warning("WeasyPrint compatibility fallback: %s", exc)
+        except Exception as exc:  # pragma: no cover - rendering failure path
+            LOGGER.warning("WeasyPrint rendering failed: %s", exc)
+    fitz = load_backend("fitz")
     if fitz is not None:
         doc = fitz.open()
         page = doc.new_page()
@@ -117,48 +161,136 @@ def _write_pdf(title: str, html: str, payload: Dict[str, Any]) -> bytes:
     return html.encode("utf-8")
 
 
-def _dicts_to_csv(rows: List[Dict[str, Any]]) -> str:
-    if not rows:
-        return ""
-    fieldnames = sorted({key for row in rows for key in row.keys()})
-    buffer = io.StringIO()
-    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
-    writer.writeheader()
+# Leading column order per table; _write_table appends any other columns the rows carry.
+EXPORT_SCHEMAS: Dict[str, List[str]] = {
+    "payslips": [
+        "id",
+        "file_id",
+        "employer_name",
+        "pay_date",
+        "period_start",
+        "period_end",
+        "period_type",
+        "country",
+        "currency",
+        "gross",
+        "net",
+        "tax_income",
+        "ni_prsi",
+        "pension_employee",
+        "pension_employer",
+        "student_loan",
+        "other_deductions",
+        "ytd",
+        "tax_code",
+        "confidence_overall",
+        "review_required",
+        "conflict",
+        "explainer_text",
+        "created_at",
+        "updated_at",
+    ],
+    "files": ["id", "file_name", "file_size", "sha256", "s3_key_original", "s3_key_redacted", "created_at"],
+    "anomalies": ["id", "payslip_id", "type", "severity", "message", "muted", "snoozed_until", "created_at"],
+    "settings": ["user_id", "region", "locale", "retention_days", "marketing_opt_in", "created_at", "updated_at"],
+}
+
+# CSV rows are spooled to disk past this size while the JSON Lines copy streams into the archive.
+EXPORT_SPOOL_BYTES = 1024 * 1024
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str, sort_keys=True)
+    return value
+
+
+def _write_table(archive: zipfile.ZipFile, name: str, rows: Iterable[Dict[str, Any]], columns: List[str]) -> int:
+    """Stream ``rows`` into ``{name}.jsonl`` and ``{name}.csv`` in a single pass.
+
+    ``columns`` only fixes the leading column order: keys a row carries beyond
+    them (columns added by later migrations) follow in first-seen order, so the
+    export never drops data the account holds.
+    """
+
+    count = 0
+    header = list(columns)
+    known = set(header)
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES, mode="w+", encoding="utf-8") as spool:
+        with archive.open(f"{name}.jsonl", "w") as raw_jsonl:
+            jsonl = io.TextIOWrapper(raw_jsonl, encoding="utf-8")
+            for row in rows:
+                record = {column: row.get(column) for column in columns}
+                for column, value in row.items():
+                    if column not in known:
+                        known.add(column)
+                        header.append(column)
+                    record.setdefault(column, value)
+                line = json.dumps(record, default=str)
+                jsonl.write(line)
+                jsonl.write("\n")
+                # The CSV header is only complete once every row was seen, so rows wait in the spool.
+                spool.write(line)
+                spool.write("\n")
+                count += 1
+            jsonl.flush()
+            jsonl.detach()
+        spool.seek(0)
+        with archive.open(f"{name}.csv", "w") as raw_csv:
+            csv_out = io.TextIOWrapper(raw_csv, encoding="utf-8", newline="")
+            writer = csv.writer(csv_out)
+            writer.writerow(header)
+            for line in spool:
+                record = json.loads(line)
+                writer.writerow([_csv_value(record.get(column)) for column in header])
+            csv_out.flush()
+            csv_out.detach()
+    return count
+
+
+def _collect_ids(rows: Iterable[Dict[str, Any]], sink: List[str]) -> Iterator[Dict[str, Any]]:
     for row in rows:
-        writer.writerow({field: row.get(field) for field in fieldnames})
-    return buffer.getvalue()
+        if row.get("id"):
+            sink.append(str(row["id"]))
+        yield row
 
 
-def build_export_zip(
+def write_export_archive(
+    target: BinaryIO,
     user_id: str,
     *,
-    payslips: List[Dict[str, Any]],
-    files: List[Dict[str, Any]],
-    anomalies: List[Dict[str, Any]],
-    settings: Dict[str, Any],
+    tables: Mapping[str, Iterable[Dict[str, Any]]],
     storage: Optional[StorageService] = None,
-) -> ReportArtifact:
+    export_format: Optional[str] = None,
+) -> Dict[str, int]:
+    """Write the account export into ``target``; returns row counts per table.
+
+    Rows are consumed lazily (e.g. from ``SupabaseService.iter_rows``) and original
+    PDFs are copied one at a time, so memory stays flat regardless of account size.
+    ``export_format="parquet"`` or ``"arrow"`` writes payslips, anomalies and YTD as
+    typed columnar files instead of JSON Lines/CSV.
+    """
+
     storage_service = storage or get_storage_service()
-    buf = io.BytesIO()
-    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as archive:
-        archive.writestr("payslips.json", json.dumps(payslips, indent=2, default=str))
-        archive.writestr("anomalies.json", json.dumps(anomalies, indent=2, default=str))
-        archive.writestr("settings.json", json.dumps(settings, indent=2, default=str))
-        archive.writestr("payslips.csv", _dicts_to_csv(payslips))
-        archive.writestr("files.csv", _dicts_to_csv(files))
-        archive.writestr("anomalies.csv", _dicts_to_csv(anomalies))
-        archive.writestr("settings.csv", _dicts_to_csv([settings] if settings else []))
-        for file_row in files:
-            file_id = file_row.get("id")
-            if not file_id:
+    columnar = resolve_columnar_format(export_format)
+    counts: Dict[str, int] = {}
+    file_ids: List[str] = []
+    with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, rows in tables.items():
+            if name == "files":
+                rows = _collect_ids(rows, file_ids)
+            if columnar and name in COLUMNAR_TABLES:
+                counts.update(write_columnar_table(archive, name, rows, columnar))
                 continue
+            counts[name] = _write_table(archive, name, rows, EXPORT_SCHEMAS[name])
+        for file_id in file_ids:
             try:
-                pdf_object = storage_service.download_pdf(user_id=user_id, file_id=str(file_id))
+                pdf_object = storage_service.download_pdf(user_id=user_id, file_id=file_id)
             except FileNotFoundError:
                 LOGGER.warning("Original PDF missing for export", extra={"user_id": user_id, "file_id": file_id})
                 continue
             archive.writestr(f"pdfs/{file_id}.pdf", pdf_object.bytes)
-    return ReportArtifact(filename=f"{user_id}_export.zip", bytes=buf.getvalue(), content_type="application/zip")
+    return counts
 
 
 def fetch_dossier_payload(user_id: str, year: int) -> Dict[str, Any]:
@@ -171,6 +303,7 @@ __all__ = [
     "ReportArtifact",
     "generate_dossier_pdf",
     "generate_hr_pack_pdf",
-    "build_export_zip",
+    "EXPORT_SCHEMAS",
+    "write_export_archive",
     "fetch_dossier_payload",
 ]
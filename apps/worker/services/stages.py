@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from apps.common.supabase import SupabaseService
+
+LOGGER = logging.getLogger(__name__)
+
+STAGES_KEY = "stages"
+TIMINGS_KEY = "stageTimingsMs"
+
+
+class StageCheckpoint:
+    """Persist the output of each completed pipeline stage in ``jobs.meta``.
+
+    A redelivered task (worker OOM, visibility timeout) reads the saved
+    outputs back and skips the stages that already ran, so paid or
+    side-effecting work such as the LLM call happens at most once. Wall time
+    per stage is kept under ``stageTimingsMs``.
+    """
+
+    def __init__(self, supabase: SupabaseService, job_id: str, meta: Dict[str, Any]) -> None:
+        self._supabase = supabase
+        self._job_id = job_id
+        self._meta = meta
+        self._stages: Dict[str, Any] = meta.setdefault(STAGES_KEY, {})
+        self._timings: Dict[str, float] = meta.setdefault(TIMINGS_KEY, {})
+        self._mark = time.perf_counter()
+        if self._stages:
+            LOGGER.info("Resuming job %s after stages %s", job_id, ", ".join(self._stages))
+
+    @property
+    def completed(self) -> List[str]:
+        return list(self._stages)
+
+    def get(self, stage: str) -> Optional[Dict[str, Any]]:
+        return self._stages.get(stage)
+
+    def save(self, stage: str, output: Dict[str, Any]) -> Dict[str, Any]:
+        now = time.perf_counter()
+        self._stages[stage] = output
+        self._timings[stage] = round((now - self._mark) * 1000, 1)
+        self._mark = now
+        self._supabase.update_row("jobs", match={"id": self._job_id}, updates={"meta": self._meta})
+        return output
+
+    def clear(self) -> None:
+        """Drop saved outputs once the job is finished; stage timings stay for reporting."""
+
+        self._meta.pop(STAGES_KEY, None)
+
+
+__all__ = ["StageCheckpoint", "STAGES_KEY", "TIMINGS_KEY"]
@@ -3,7 +3,7 @@ from __future__ import annotations
 import io
 import logging
 from dataclasses import dataclass
-from typing import Optional
+from typing import BinaryIO, Optional
 
 import requests
 from storage3.utils import StorageException
@@ -61,15 +61,19 @@ class StorageService:
         return StorageObject(path=path, bytes=data, content_type="application/pdf")
 
     def upload_bytes(self, *, user_id: str, name: str, content_type: str, data: bytes) -> StorageObject:
+        path = self.upload_file(user_id=user_id, name=name, content_type=content_type, file_obj=io.BytesIO(data))
+        return StorageObject(path=path, bytes=data, content_type=content_type)
+
+    def upload_file(self, *, user_id: str, name: str, content_type: str, file_obj: BinaryIO) -> str:
+        """Upload from a file object (e.g. a spooled archive) without holding it in memory twice."""
         path = self._build_path(user_id, name)
         LOGGER.info("Uploading artifact to storage", extra={"path": path, "content_type": content_type})
-        file_obj = io.BytesIO(data)
         self._supabase.storage.from_(self.bucket).upload(
             path,
             file_obj,
             {"upsert": True, "contentType": content_type},
         )
-        return StorageObject(path=path, bytes=data, content_type=content_type)
+        return path
 
     def fetch_signed_object(self, path: str, *, expires_in: int = 300) -> StorageObject:
         LOGGER.info("Fetching signed object from storage", extra={"path": path})
@@ -89,5 +93,11 @@ class StorageService:
             LOGGER.warning("Failed to delete storage objects", extra={"paths": filtered, "error": str(exc)})
 
 
+_storage_service: StorageService | None = None
+
+
 def get_storage_service() -> StorageService:
-    return StorageService()
+    global _storage_service
+    if _storage_service is None:
+        _storage_service = StorageService()
+    return _storage_service
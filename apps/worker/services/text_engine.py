@@ -0,0 +1,171 @@
+"""Pluggable text-layer extraction.
+
+``TEXT_ENGINE`` lists backends in preference order (default
+``pymupdf,pdfplumber``) and the first installed one reads the document.
+Every backend classifies each page as a text page or an image page, so the
+caller can send image pages straight to OCR instead of discovering an empty
+parse first.
+
+Pages are streamed into a running native parse and reading stops as soon as
+the fields are complete, so a payslip on page one of a long bundle costs one
+page of extraction.
+"""
+from __future__ import annotations
+
+import logging
+from contextlib import closing
+from dataclasses import asdict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from apps.common.config import get_settings
+
+from . import pdf
+from .backends import load_backend
+from .merge import NativeExtraction, validate_identity_rule
+from .native import NativeParser
+from .pdf import PageWord, PdfText, classify_page, join_pages
+
+LOGGER = logging.getLogger(__name__)
+
+# PyMuPDF word tuples: (x0, y0, x1, y1, text, block_no, line_no, word_no).
+_Word = Tuple[Any, ...]
+
+
+def _visual_lines(raw_words: Sequence[_Word]) -> List[List[_Word]]:
+    """Group words into reading-order lines by vertical centre, ignoring PDF block structure."""
+
+    lines: List[List[_Word]] = []
+    anchor = tolerance = 0.0
+    for word in sorted(raw_words, key=lambda word: ((word[1] + word[3]) / 2, word[0])):
+        centre = (word[1] + word[3]) / 2
+        if lines and abs(centre - anchor) <= tolerance:
+            lines[-1].append(word)
+            continue
+        lines.append([word])
+        anchor, tolerance = centre, (word[3] - word[1]) / 2
+    return [sorted(line, key=lambda word: word[0]) for line in lines]
+
+
+def _image_coverage(page: Any, area: float) -> float:
+    covered = 0.0
+    for image in page.get_image_info():
+        x0, y0, x1, y1 = image["bbox"]
+        covered += abs(x1 - x0) * abs(y1 - y0)
+    return covered / area
+
+
+def _pymupdf_pages(fitz: Any, data: bytes) -> Iterator[PdfText]:
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        for index, page in enumerate(doc):
+            width = float(page.rect.width) or 1.0
+            height = float(page.rect.height) or 1.0
+            lines = _visual_lines(page.get_text("words"))
+            words = [
+                PageWord(
+                    page=index,
+                    line=line_no,
+                    text=word[4],
+                    x0=word[0] / width,
+                    y0=word[1] / height,
+                    x1=word[2] / width,
+                    y1=word[3] / height,
+                )
+                for line_no, line in enumerate(lines)
+                for word in line
+            ]
+            raw_text = "\n".join(" ".join(word[4] for word in line) for line in lines)
+            info = classify_page(index, [word.text for word in words], _image_coverage(page, width * height))
+            yield PdfText(
+                raw_text=raw_text,
+                has_text=bool(raw_text.strip()),
+                words=words,
+                pages=[info],
+                engine="pymupdf",
+                page_count=doc.page_count,
+            )
+
+
+def _pymupdf_text(data: bytes) -> Optional[Iterator[PdfText]]:
+    fitz = load_backend("fitz")
+    return None if fitz is None else _pymupdf_pages(fitz, data)
+
+
+def _pdfplumber_text(data: bytes) -> Optional[Iterator[PdfText]]:
+    if load_backend("pdfplumber") is None:
+        return None
+    return pdf.iter_pages(data)
+
+
+# Each engine returns a per-page iterator, or ``None`` when its library is not installed.
+ENGINES: Dict[str, Callable[[bytes], Optional[Iterator[PdfText]]]] = {
+    "pymupdf": _pymupdf_text,
+    "pdfplumber": _pdfplumber_text,
+}
+
+
+def engine_order(spec: Optional[str] = None) -> List[str]:
+    """Parse a ``TEXT_ENGINE``-style list; unknown names are a configuration error."""
+
+    raw = get_settings().text_engine if spec is None else spec
+    names = [name.strip().lower() for name in raw.split(",") if name.strip()]
+    unknown = [name for name in names if name not in ENGINES]
+    if unknown:
+        raise ValueError(f"Unknown text engine(s): {', '.join(unknown)}")
+    return names or list(ENGINES)
+
+
+def stream_pages(data: bytes, *, engines: Optional[Sequence[str]] = None) -> Iterator[PdfText]:
+    """Yield pages from the first available engine in ``engines`` (default: ``TEXT_ENGINE``)."""
+
+    for name in engines or engine_order():
+        pages = ENGINES[name](data)
+        if pages is not None:
+            yield from pages
+            return
+        LOGGER.warning("Text engine %s unavailable; trying the next one", name)
+
+
+def fields_complete(native: NativeExtraction) -> bool:
+    """A pay date plus totals that balance: later pages cannot add anything the job needs."""
+
+    return bool(native.pay_date) and validate_identity_rule(asdict(native))
+
+
+def extract_text(
+    data: bytes,
+    *,
+    engines: Optional[Sequence[str]] = None,
+    page_cap: Optional[int] = None,
+    early_exit: bool = True,
+) -> PdfText:
+    """Read pages in order, stopping once the running native parse is complete.
+
+    ``page_cap`` (default ``TEXT_PAGE_CAP``, ``0`` for no cap) bounds how many
+    pages are read when the fields never turn up. The result's ``pages`` lists
+    the pages actually read; ``page_count`` is the document's length.
+    """
+
+    cap = get_settings().text_page_cap if page_cap is None else page_cap
+    parser = NativeParser()
+    read: List[PdfText] = []
+    reason = "end of document"
+    with closing(stream_pages(data, engines=engines)) as pages:
+        for page in pages:
+            read.append(page)
+            if early_exit and fields_complete(parser.feed(page)):
+                reason = "fields complete"
+                break
+            if cap and len(read) >= cap:
+                reason = "page cap"
+                break
+    text = join_pages(read)
+    if len(read) < text.page_count:
+        LOGGER.info("Stopped reading after %d of %d pages (%s)", len(read), text.page_count, reason)
+    return text
+
+
+def image_pages(text: PdfText) -> List[int]:
+    return [page.index for page in text.pages if page.kind == pdf.IMAGE_PAGE]
+
+
+__all__ = ["ENGINES", "engine_order", "extract_text", "fields_complete", "image_pages", "stream_pages"]
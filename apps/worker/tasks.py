@@ -1,19 +1,28 @@
 from __future__ import annotations
 
-import base64
-import json
+import hashlib
 import logging
+import os
+import tempfile
+from dataclasses import asdict, replace
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from celery import shared_task
+from celery import chord, shared_task
 
 from apps.common.config import get_settings
 from apps.common.models import JobKind, JobStatus
 from apps.common.supabase import get_supabase
+from apps.worker.celery_app import celery_app
 from apps.worker.services.anomalies import PayslipSnapshot, detect_anomalies
 from apps.worker.services.antivirus import AntivirusError, scan_bytes
-from apps.worker.services.cleanup import delete_user_data, retention_cleanup
+from apps.worker.services.cleanup import delete_user_data, reset_stale_retention_checkpoints, retention_cleanup
+from apps.worker.services.layout_templates import (
+    LEARN_CONFIDENCE,
+    LayoutTemplateStore,
+    layout_fingerprint,
+    read_template,
+)
 from apps.worker.services.llm import LlmResponse, LlmVisionClient, SpendCapExceeded
 from apps.worker.services.merge import (
     LlmExtraction,
@@ -23,24 +32,27 @@ from apps.worker.services.merge import (
     normalize_date,
     validate_identity_rule,
 )
-from apps.worker.services.pdf import (
-    PdfText,
-    decrypt_pdf,
-    extract_kv_pairs,
-    extract_text,
-    guess_country,
-    guess_currency,
-    perform_ocr,
-    rasterize_first_pages,
+from apps.worker.services.native import label_regions, parse_native
+from apps.worker.services.ocr_cache import get_ocr_cache
+from apps.worker.services.ocr_engine import ocr_country
+from apps.worker.services.page_rank import page_ink, rank_pages
+from apps.worker.services.pdf import TEXT_PAGE, PageRenditions, PageWord, PdfText, decrypt_pdf, perform_ocr
+from apps.worker.services.redaction import RedactionResult, redact_text, redacted_preview
+from apps.worker.services.report_cache import (
+    cached_artifact_name,
+    lookup_report,
+    purge_invalidated_reports,
+    store_report,
 )
-from apps.worker.services.redaction import redact_text
 from apps.worker.services.reports import (
-    build_export_zip,
     fetch_dossier_payload,
     generate_dossier_pdf,
     generate_hr_pack_pdf,
+    write_export_archive,
 )
+from apps.worker.services.stages import StageCheckpoint
 from apps.worker.services.storage import StorageObject, StorageService, get_storage_service
+from apps.worker.services.text_engine import extract_text, image_pages
 from apps.worker.services.validation import (
     calculate_confidence,
     count_native_fields,
@@ -51,33 +63,44 @@ from apps.worker.services.validation import (
 
 LOGGER = logging.getLogger(__name__)
 
+EVENT_BATCH_SIZE = 500
+OCR_PAGE_LIMIT = 2
+
 
 def _update_job(job_id: str, updates: Dict[str, Any]) -> None:
     supabase = get_supabase()
     supabase.update_row("jobs", match={"id": job_id}, updates=updates)
 
 
-def _append_event(user_id: str, event_type: str, payload: Dict[str, Any]) -> None:
+def _append_event(
+    user_id: str,
+    event_type: str,
+    payload: Dict[str, Any],
+    *,
+    idempotency_key: Optional[str] = None,
+) -> None:
     supabase = get_supabase()
-    supabase.insert_row(
-        "events",
-        {
-            "user_id": user_id,
-            "type": event_type,
-            "payload": payload,
-        },
-    )
+    row = {
+        "user_id": user_id,
+        "type": event_type,
+        "payload": payload,
+    }
+    if idempotency_key:
+        supabase.insert_row_once("events", row, idempotency_key=idempotency_key)
+    else:
+        supabase.insert_row("events", row)
 
 
-def _record_redactions(user_id: str, file_id: str, boxes: List[Dict[str, float]]) -> None:
+def _record_redactions(user_id: str, file_id: str, boxes: List[Dict[str, float]], *, idempotency_key: str) -> None:
     supabase = get_supabase()
-    supabase.insert_row(
+    supabase.insert_row_once(
         "redactions",
         {
             "user_id": user_id,
             "file_id": file_id,
             "boxes": boxes,
         },
+        idempotency_key=idempotency_key,
     )
 
 
@@ -86,32 +109,20 @@ def _ensure_storage_service() -> StorageService:
 
 
 def _native_parse(text: PdfText) -> NativeExtraction:
-    kvs = extract_kv_pairs(text.raw_text)
-    native = NativeExtraction(
-        employer_name=None,
-        pay_date=None,
-        period_start=None,
-        period_end=None,
-        currency=guess_currency(text.raw_text),
-        country=guess_country(text.raw_text),
-        gross=kvs.get("gross"),
-        net=kvs.get("net"),
-        tax_income=kvs.get("tax_income"),
-        ni_prsi=kvs.get("ni_prsi"),
-        pension_employee=kvs.get("pension_employee"),
-        pension_employer=None,
-        student_loan=kvs.get("student_loan"),
-        other_deductions=None,
-        ytd={},
-        tax_code=None,
-    )
-    return native
+    return parse_native(text)
 
 
 def _merge_pdf_text(primary: PdfText, secondary: PdfText) -> PdfText:
     parts = [primary.raw_text.strip(), secondary.raw_text.strip()]
     merged = "\n".join(part for part in parts if part)
-    return PdfText(raw_text=merged, has_text=bool(merged.strip()))
+    return PdfText(
+        raw_text=merged,
+        has_text=bool(merged.strip()),
+        words=[*primary.words, *secondary.words],
+        pages=primary.pages,
+        engine=primary.engine,
+        page_count=primary.page_count,
+    )
 
 
 def _augment_native(primary: NativeExtraction, fallback: NativeExtraction) -> NativeExtraction:
@@ -125,12 +136,100 @@ def _augment_native(primary: NativeExtraction, fallback: NativeExtraction) -> Na
     return primary
 
 
+def _combine_with_ocr(native: NativeExtraction, ocr: NativeExtraction) -> NativeExtraction:
+    """Fill gaps in the native reading from OCR, unless only the OCR-first reading balances.
+
+    Text layers on scans can disagree with the page image; when gross minus
+    deductions only matches net with OCR values taking priority, trust OCR.
+    """
+
+    combined = _augment_native(replace(native, ytd=dict(native.ytd or {})), ocr)
+    if validate_identity_rule(asdict(combined)):
+        return combined
+    ocr_first = _augment_native(replace(ocr, ytd=dict(ocr.ytd or {})), native)
+    return ocr_first if validate_identity_rule(asdict(ocr_first)) else combined
+
+
 def _needs_ocr(native: NativeExtraction, text: PdfText) -> bool:
     if not text.has_text:
         return True
     return count_native_fields(native) < 4
 
 
+def _previous_country(supabase: Any, user_id: str) -> Optional[str]:
+    """Country of the user's latest payslip, the OCR language hint when the PDF itself gives none."""
+
+    response = (
+        supabase.client.table("payslips")
+        .select("country")
+        .eq("user_id", user_id)
+        .order("pay_date", desc=True)
+        .limit(1)
+        .execute()
+    )
+    rows = response.data or []
+    return rows[0].get("country") if rows else None
+
+
+def _run_ocr(
+    data: bytes,
+    *,
+    pages: List[int],
+    renditions: PageRenditions,
+    country: Optional[str],
+    user_id: Optional[str] = None,
+) -> PdfText:
+    """OCR only the labelled regions (``OCR_MODE=roi``), re-reading whole pages if the crops miss gross or net.
+
+    ``user_id`` scopes the OCR result cache; without it the cache is skipped.
+    """
+
+    options: Dict[str, Any] = {"pages": pages, "renditions": renditions, "country": country, "cache_scope": user_id}
+    if get_settings().ocr_mode != "roi":
+        return perform_ocr(data, **options)
+    ocr_text = perform_ocr(data, locate_regions=label_regions, **options)
+    found = _native_parse(ocr_text)
+    if found.gross is not None and found.net is not None:
+        return ocr_text
+    LOGGER.info("Region OCR missed gross or net; reading whole pages %s", pages)
+    return perform_ocr(data, **options)
+
+
+def _ocr_pages(native: NativeExtraction, text: PdfText, ranking: Optional[List[int]] = None) -> List[int]:
+    """The best-ranked image pages go to OCR up front; the best-ranked other pages join them when the native
+    parse came up short. Blank pages are never OCR'd.
+    """
+
+    if ranking is None:
+        ranking = rank_pages(text)
+    if not text.pages:
+        ranking = list(range(OCR_PAGE_LIMIT))
+    scanned = set(image_pages(text))
+    wanted = [index for index in ranking if index in scanned][:OCR_PAGE_LIMIT]
+    if _needs_ocr(native, text):
+        wanted += [index for index in ranking if index not in wanted]
+    return sorted(wanted[:OCR_PAGE_LIMIT])
+
+
+def _redaction_geometry(layer: PdfText, ocr_text: Optional[PdfText]) -> Tuple[List[PageWord], List[int]]:
+    """Words to locate redactions with, and the pages they cover in full (the only ones painted in place).
+
+    ``layer`` is the text-layer reading before OCR was merged in. Covered
+    pages are text pages without embedded images plus pages OCR read whole
+    at full DPI. Region reads only saw the labelled bands, and any other
+    page keeps pixels nobody read, so their previews fall back to the
+    rendered redacted text.
+    """
+
+    words = list(layer.words)
+    covered = {page.index for page in layer.pages if page.kind == TEXT_PAGE and not page.image_coverage}
+    if ocr_text is not None:
+        whole = set(ocr_text.whole_pages)
+        words.extend(word for word in ocr_text.words if word.page in whole)
+        covered.update(whole)
+    return words, sorted(covered)
+
+
 def _percentify_boxes(boxes: List[Dict[str, float]]) -> List[Dict[str, float]]:
     percent_boxes: List[Dict[str, float]] = []
     for box in boxes:
@@ -194,43 +293,133 @@ def job_extract(job_id: str) -> None:
         _update_job(job_id, {"status": JobStatus.FAILED.value, "error": "File not found"})
         return
 
-    pdf_password = (job.get("meta") or {}).get("pdfPassword")
-
-    try:
+    job_meta = job.get("meta") or {}
+    stages = StageCheckpoint(supabase, job_id, job_meta)
+    pdf_password = job_meta.get("pdfPassword")
+    renditions: Optional[PageRenditions] = None
+    # Rasters are rendered only when OCR or the painted preview reads them; each read lands here.
+    rendition_log: List[Dict[str, Any]] = job_meta.setdefault("renditions", [])
+    templates = LayoutTemplateStore(supabase)
+    layout_words: List[Any] = []
+
+    def load_pdf() -> bytes:
         storage_object = storage.download_pdf(user_id=job["user_id"], file_id=file_row["id"], password=pdf_password)
         scan_bytes(storage_object.bytes)
-        decrypted_pdf = decrypt_pdf(storage_object.bytes, pdf_password)
-        text = extract_text(decrypted_pdf)
-        native = _native_parse(text)
-        ocr_text = PdfText(raw_text="", has_text=False)
-        used_ocr = False
-        if _needs_ocr(native, text):
-            LOGGER.info("Falling back to OCR for job %s", job_id)
-            ocr_text = perform_ocr(decrypted_pdf, page_limit=2)
-            if ocr_text.has_text:
-                native = _augment_native(native, _native_parse(ocr_text))
-                text = _merge_pdf_text(text, ocr_text)
-                used_ocr = True
-        redaction = redact_text(text.raw_text)
-        percent_boxes = _percentify_boxes(redaction.boxes)
-        rasterized = rasterize_first_pages(decrypted_pdf, pages=2)
-        preview_image = redaction.preview_png or rasterized[0].png_bytes
-        preview_artifact = storage.upload_bytes(
-            user_id=job["user_id"],
-            name=f"{file_row['id']}_redacted.png",
-            content_type="image/png",
-            data=preview_image,
-        )
-        supabase.update_row(
-            "files",
-            match={"id": file_row["id"]},
-            updates={"s3_key_redacted": preview_artifact.path},
-        )
-        _record_redactions(job["user_id"], file_row["id"], percent_boxes)
-        disable_llm = (job.get("meta") or {}).get("disable_llm")
-        llm_response = None
-        if not disable_llm:
-            llm_response = _llm_extract(job["user_id"], job.get("file_id"), [preview_artifact])
+        return decrypt_pdf(storage_object.bytes, pdf_password)
+
+    try:
+        text_stage = stages.get("text")
+        if text_stage is None:
+            decrypted_pdf = load_pdf()
+            renditions = PageRenditions(decrypted_pdf, used=rendition_log)
+            text = layer = extract_text(decrypted_pdf)
+            layout_words = text.words
+            ink = page_ink(decrypted_pdf, image_pages(text))
+            ranking = rank_pages(text, ink=ink)
+            fingerprint = layout_fingerprint(text.words)
+            template = templates.find(fingerprint) if fingerprint else None
+            template_native = read_template(template, text) if template else None
+            native = template_native or _native_parse(text)
+            used_ocr = False
+            ocr_languages: List[str] = []
+            ocr_pixels: List[int] = []
+            ocr_cache_use: Dict[str, int] = {}
+            ocr_text: Optional[PdfText] = None
+            if template_native is not None:
+                LOGGER.info("Layout template %s matched job %s; skipping OCR and LLM", fingerprint[:12], job_id)
+                templates.record_hit(template)
+            elif ocr_pages := _ocr_pages(native, text, ranking):
+                country = ocr_country(native.country, native.currency) or _previous_country(supabase, job["user_id"])
+                LOGGER.info("Running OCR on pages %s for job %s (country hint %s)", ocr_pages, job_id, country)
+                ocr_cache = get_ocr_cache()
+                cache_before = ocr_cache.stats() if ocr_cache else {}
+                ocr_text = _run_ocr(
+                    decrypted_pdf, pages=ocr_pages, renditions=renditions, country=country, user_id=job["user_id"]
+                )
+                ocr_languages, ocr_pixels = ocr_text.ocr_languages, ocr_text.ocr_pixels
+                if ocr_cache:
+                    cache_after = ocr_cache.stats()
+                    ocr_cache_use = {name: cache_after[name] - cache_before[name] for name in ("hits", "misses")}
+                    LOGGER.info("OCR cache for job %s: %s (process totals %s)", job_id, ocr_cache_use, cache_after)
+                if ocr_text.has_text:
+                    native = _combine_with_ocr(native, _native_parse(ocr_text))
+                    text = _merge_pdf_text(text, ocr_text)
+                    used_ocr = True
+                    # OCR'd words now count towards their pages' labels and amounts.
+                    ranking = rank_pages(text, ink=ink)
+            redaction_words, covered_pages = _redaction_geometry(layer, ocr_text)
+            redaction = redact_text(text.raw_text, redaction_words, covered_pages=covered_pages)
+            # Only redacted output is checkpointed; raw text never lands in job meta.
+            text_stage = stages.save(
+                "text",
+                {
+                    "native": asdict(native),
+                    "used_ocr": used_ocr,
+                    "redacted_text": redaction.redacted_text,
+                    "boxes": redaction.boxes,
+                    "geometry_pages": redaction.geometry_pages,
+                    "fingerprint": fingerprint,
+                    "template": template_native is not None,
+                    "engine": text.engine,
+                    "image_pages": image_pages(text),
+                    "pages_read": [len(text.pages), text.page_count],
+                    "ocr_languages": ocr_languages,
+                    "ocr_pixels": ocr_pixels,
+                    "ocr_cache": ocr_cache_use,
+                    "page_ranking": ranking,
+                },
+            )
+        native = NativeExtraction(**text_stage["native"])
+        used_ocr = bool(text_stage["used_ocr"])
+
+        preview_artifact: Optional[StorageObject] = None
+        preview_stage = stages.get("preview")
+        if preview_stage is None:
+            if renditions is None:
+                renditions = PageRenditions(load_pdf(), used=rendition_log)
+            redaction = RedactionResult(
+                redacted_text=text_stage["redacted_text"],
+                boxes=text_stage["boxes"],
+                spans=[],
+                geometry_pages=text_stage["geometry_pages"],
+            )
+            percent_boxes = _percentify_boxes(redaction.boxes)
+            ranking = text_stage.get("page_ranking") or [0]
+            preview_page = renditions.page(ranking[0], consumer="preview")
+            preview_image = redacted_preview(redaction, preview_page)
+            highlights = [box for box in percent_boxes if box.get("page", 0) == preview_page.index]
+            preview_artifact = storage.upload_bytes(
+                user_id=job["user_id"],
+                name=f"{file_row['id']}_redacted.png",
+                content_type="image/png",
+                data=preview_image,
+            )
+            supabase.update_row(
+                "files",
+                match={"id": file_row["id"]},
+                updates={"s3_key_redacted": preview_artifact.path},
+            )
+            _record_redactions(job["user_id"], file_row["id"], percent_boxes, idempotency_key=f"{job_id}:redactions")
+            preview_stage = stages.save(
+                "preview", {"path": preview_artifact.path, "highlights": highlights, "page": preview_page.index}
+            )
+
+        llm_stage = stages.get("llm")
+        if llm_stage is None:
+            llm_response = None
+            if not job_meta.get("disable_llm") and not text_stage.get("template"):
+                if preview_artifact is None:
+                    preview_artifact = storage.fetch_signed_object(preview_stage["path"])
+                rendition_log.append(
+                    {"consumer": "llm", "page": preview_stage.get("page", 0), "artifact": preview_stage["path"]}
+                )
+                llm_response = _llm_extract(job["user_id"], job.get("file_id"), [preview_artifact])
+            llm_stage = stages.save(
+                "llm",
+                {"payload": llm_response.payload, "tokens": llm_response.tokens, "cost": llm_response.cost}
+                if llm_response
+                else {"payload": None},
+            )
     except AntivirusError as exc:
         _update_job(job_id, {"status": JobStatus.FAILED.value, "error": f"Antivirus detected threat: {exc}"})
         return
@@ -242,7 +431,8 @@ def job_extract(job_id: str) -> None:
         _update_job(job_id, {"status": JobStatus.FAILED.value, "error": str(exc)})
         return
 
-    llm_payload = llm_response.payload if llm_response else {
+    llm_present = llm_stage.get("payload") is not None
+    llm_payload = llm_stage["payload"] if llm_present else {
         "country": native.country or "UK",
         "currency": native.currency or "GBP",
         "gross": native.gross or 0.0,
@@ -290,7 +480,7 @@ def job_extract(job_id: str) -> None:
         identity_ok=identity_ok,
         validations=validations,
         used_ocr=used_ocr,
-        llm_present=bool(llm_response),
+        llm_present=llm_present,
     )
     merged["confidence_overall"] = confidence
     review_required = not all(validations.values()) or confidence < 0.9
@@ -320,36 +510,47 @@ def job_extract(job_id: str) -> None:
         "conflict": False,
         "explainer_text": "Automated extraction with native+vision merge.",
     }
-    payslip = supabase.insert_row("payslips", payslip_record)
-
-    job_meta = job.get("meta") or {}
+    payslip = supabase.insert_row_once("payslips", payslip_record, idempotency_key=f"{job_id}:payslip")
+    fingerprint = text_stage.get("fingerprint")
+    # Word boxes are never checkpointed, so only a job that read the PDF in this run can teach a template.
+    learnable = identity_ok and confidence >= LEARN_CONFIDENCE and not text_stage.get("template")
+    if fingerprint and layout_words and learnable:
+        templates.learn(fingerprint, layout_words, merged)
+
+    stages.clear()
     job_meta.update(
         {
             "fields": merged,
             "confidence": confidence,
             "reviewRequired": review_required,
-            "imageUrl": preview_artifact.path,
-            "highlights": percent_boxes,
+            "imageUrl": preview_stage["path"],
+            "highlights": preview_stage["highlights"],
             "validations": validations,
             "ocrFallback": used_ocr,
+            "textEngine": text_stage.get("engine"),
+            "pagesRead": text_stage.get("pages_read"),
+            "ocrLanguages": text_stage.get("ocr_languages") or [],
+            "ocrPixels": text_stage.get("ocr_pixels") or [],
+            "ocrCache": text_stage.get("ocr_cache") or {},
+            "pageRanking": text_stage.get("page_ranking") or [],
         }
     )
-    if llm_response:
-        job_meta["llm"] = {"tokens": llm_response.tokens, "cost": llm_response.cost}
-    if (job.get("meta") or {}).get("disable_llm"):
+    if text_stage.get("template"):
+        job_meta["layoutTemplate"] = fingerprint[:16]
+    if llm_present:
+        job_meta["llm"] = {"tokens": llm_stage["tokens"], "cost": llm_stage["cost"]}
+    if job_meta.get("disable_llm"):
         job_meta["llmDisabled"] = True
 
-    _append_event(job["user_id"], "extract_complete", {"payslip_id": payslip.get("id"), "identity_ok": identity_ok})
-
-    _update_job(
-        job_id,
-        {
-            "status": JobStatus.NEEDS_REVIEW.value if review_required else JobStatus.DONE.value,
-            "meta": job_meta,
-        },
+    _append_event(
+        job["user_id"],
+        "extract_complete",
+        {"payslip_id": payslip.get("id"), "identity_ok": identity_ok},
+        idempotency_key=f"{job_id}:extract_complete",
     )
 
-    follow_up = supabase.insert_row(
+    # Queue the follow-up before the terminal status: a redelivery after that write returns early.
+    follow_up, created = supabase.insert_row_if_absent(
         "jobs",
         {
             "user_id": job["user_id"],
@@ -358,6 +559,18 @@ def job_extract(job_id: str) -> None:
             "status": JobStatus.QUEUED.value,
             "meta": {},
         },
+        idempotency_key=f"{job_id}:detect_anomalies",
+    )
+    # A follow-up still QUEUED on redelivery may never have been sent; job_detect_anomalies tolerates a repeat.
+    if follow_up.get("id") and (created or follow_up.get("status") == JobStatus.QUEUED.value):
+        celery_app.send_task("jobs.detect_anomalies", args=[follow_up["id"]])
+
+    _update_job(
+        job_id,
+        {
+            "status": JobStatus.NEEDS_REVIEW.value if review_required else JobStatus.DONE.value,
+            "meta": job_meta,
+        },
     )
 
 
@@ -367,6 +580,9 @@ def job_detect_anomalies(job_id: str) -> None:
     job = supabase.table_select_single("jobs", match={"id": job_id})
     if not job:
         return
+    # A repeat delivery of a finished run has nothing left to do.
+    if job.get("status") not in {JobStatus.QUEUED.value, JobStatus.RUNNING.value}:
+        return
     _update_job(job_id, {"status": JobStatus.RUNNING.value})
     payslip = supabase.table_select_single("payslips", match={"file_id": job.get("file_id")})
     if not payslip:
@@ -408,7 +624,8 @@ def job_detect_anomalies(job_id: str) -> None:
     )
     anomalies = detect_anomalies(current_snapshot, history_snapshots)
     for anomaly in anomalies:
-        supabase.insert_row(
+        # Each detector reports at most one anomaly, so the type identifies it within the job.
+        supabase.insert_row_once(
             "anomalies",
             {
                 "user_id": job["user_id"],
@@ -417,6 +634,7 @@ def job_detect_anomalies(job_id: str) -> None:
                 "severity": anomaly.severity,
                 "message": anomaly.message,
             },
+            idempotency_key=f"{job_id}:{anomaly.type}",
         )
     _update_job(job_id, {"status": JobStatus.DONE.value, "meta": {"count": len(anomalies)}})
 
@@ -431,9 +649,21 @@ def job_dossier(job_id: str) -> None:
     _update_job(job_id, {"status": JobStatus.RUNNING.value})
     year = (job.get("meta") or {}).get("year") or datetime.now(timezone.utc).year
     payload = fetch_dossier_payload(job["user_id"], int(year))
-    artifact = generate_dossier_pdf(job["user_id"], payload)
-    stored = storage.upload_bytes(user_id=job["user_id"], name=artifact.filename, content_type=artifact.content_type, data=artifact.bytes)
+    cached = lookup_report(job["user_id"], JobKind.DOSSIER.value, payload)
     job_meta = job.get("meta") or {}
+    if cached.hit:
+        job_meta.update({"download_url": cached.storage_path, "cached": True})
+        _update_job(job_id, {"status": JobStatus.DONE.value, "meta": job_meta})
+        return
+    purge_invalidated_reports(job["user_id"], JobKind.DOSSIER.value, storage)
+    artifact = generate_dossier_pdf(job["user_id"], payload)
+    stored = storage.upload_bytes(
+        user_id=job["user_id"],
+        name=cached_artifact_name(artifact.filename, cached.digest),
+        content_type=artifact.content_type,
+        data=artifact.bytes,
+    )
+    store_report(job["user_id"], JobKind.DOSSIER.value, cached, stored.path)
     job_meta["download_url"] = stored.path
     _update_job(job_id, {"status": JobStatus.DONE.value, "meta": job_meta})
 
@@ -447,8 +677,10 @@ def job_hr_pack(job_id: str) -> None:
         return
     _update_job(job_id, {"status": JobStatus.RUNNING.value})
     raw_payload = (job.get("meta") or {}).get("payload") or {}
-    payload = json.loads(json.dumps(raw_payload)) if isinstance(raw_payload, dict) else {}
+    payload = dict(raw_payload) if isinstance(raw_payload, dict) else {}
     preview_context = {}
+    preview_path: Optional[str] = None
+    preview_image: Optional[bytes] = None
     if isinstance(raw_payload, dict):
         preview_context = dict(raw_payload.get("redacted_preview") or {})
     if not preview_context.get("url") or not preview_context.get("image_data"):
@@ -463,24 +695,40 @@ def job_hr_pack(job_id: str) -> None:
         row = (preview_row.data or [None])[0] if preview_row else None
         preview_path = (row or {}).get("s3_key_redacted")
         if preview_path:
-            try:
-                signed_url = storage.create_signed_url(preview_path)
-                preview_object = storage.fetch_signed_object(preview_path)
-                preview_context = {
-                    "url": signed_url,
-                    "label": (row or {}).get("id"),
-                    "image_data": base64.b64encode(preview_object.bytes).decode("ascii"),
-                }
-            except FileNotFoundError:
-                LOGGER.warning(
-                    "Redacted preview missing for HR pack", extra={"user_id": job["user_id"], "path": preview_path}
-                )
+            preview_context = {"label": (row or {}).get("id")}
+    if preview_path:
+        try:
+            preview_image = storage.fetch_signed_object(preview_path).bytes
+        except FileNotFoundError:
+            LOGGER.warning(
+                "Redacted preview missing for HR pack", extra={"user_id": job["user_id"], "path": preview_path}
+            )
+            preview_path = None
+            preview_context = dict(raw_payload.get("redacted_preview") or {}) if isinstance(raw_payload, dict) else {}
+    # Signed URLs change on every call, so the key uses the storage path; re-extraction rewrites the preview
+    # at that same path, so its content digest is part of the key too.
+    preview_digest = hashlib.sha256(preview_image).hexdigest() if preview_image is not None else None
+    cache_key = {**payload, "redacted_preview": {**preview_context, "path": preview_path, "sha256": preview_digest}}
+    cached = lookup_report(job["user_id"], JobKind.HR_PACK.value, cache_key)
+    job_meta = job.get("meta") or {}
+    if cached.hit:
+        job_meta.update({"download_url": cached.storage_path, "cached": True})
+        _update_job(job_id, {"status": JobStatus.DONE.value, "meta": job_meta})
+        return
+    purge_invalidated_reports(job["user_id"], JobKind.HR_PACK.value, storage)
+    if preview_path:
+        preview_context["url"] = storage.create_signed_url(preview_path)
     if preview_context:
         preview_context.setdefault("label", preview_context.get("file_id") or "Redacted Preview")
         payload["redacted_preview"] = preview_context
-    artifact = generate_hr_pack_pdf(job["user_id"], payload)
-    stored = storage.upload_bytes(user_id=job["user_id"], name=artifact.filename, content_type=artifact.content_type, data=artifact.bytes)
-    job_meta = job.get("meta") or {}
+    artifact = generate_hr_pack_pdf(job["user_id"], payload, preview_image=preview_image)
+    stored = storage.upload_bytes(
+        user_id=job["user_id"],
+        name=cached_artifact_name(artifact.filename, cached.digest),
+        content_type=artifact.content_type,
+        data=artifact.bytes,
+    )
+    store_report(job["user_id"], JobKind.HR_PACK.value, cached, stored.path)
     job_meta["download_url"] = stored.path
     _update_job(job_id, {"status": JobStatus.DONE.value, "meta": job_meta})
 
@@ -493,27 +741,28 @@ def job_export_all(job_id: str) -> None:
     if not job:
         return
     _update_job(job_id, {"status": JobStatus.RUNNING.value})
-    payslips = (
-        supabase.client.table("payslips").select("*").eq("user_id", job["user_id"]).execute().data or []
-    )
-    files = supabase.client.table("files").select("*").eq("user_id", job["user_id"]).execute().data or []
-    anomalies = (
-        supabase.client.table("anomalies").select("*").eq("user_id", job["user_id"]).execute().data or []
-    )
-    settings = (
-        supabase.client.table("settings").select("*").eq("user_id", job["user_id"]).execute().data or []
-    )
-    artifact = build_export_zip(
-        job["user_id"],
-        payslips=payslips,
-        files=files,
-        anomalies=anomalies,
-        settings=settings[0] if settings else {},
-        storage=storage,
-    )
-    stored = storage.upload_bytes(user_id=job["user_id"], name=artifact.filename, content_type=artifact.content_type, data=artifact.bytes)
+    user_id = job["user_id"]
+    tables = {
+        "payslips": supabase.iter_rows("payslips", filters={"user_id": user_id}),
+        "files": supabase.iter_rows("files", filters={"user_id": user_id}),
+        "anomalies": supabase.iter_rows("anomalies", filters={"user_id": user_id}),
+        "settings": supabase.iter_rows("settings", filters={"user_id": user_id}, key="user_id"),
+    }
+    export_format = (job.get("meta") or {}).get("export_format")
+    with tempfile.TemporaryFile() as archive_file:
+        counts = write_export_archive(
+            archive_file, user_id, tables=tables, storage=storage, export_format=export_format
+        )
+        archive_file.seek(0)
+        path = storage.upload_file(
+            user_id=user_id,
+            name=f"{user_id}_export.zip",
+            content_type="application/zip",
+            file_obj=archive_file,
+        )
     job_meta = job.get("meta") or {}
-    job_meta["download_url"] = stored.path
+    job_meta["download_url"] = path
+    job_meta["counts"] = counts
     _update_job(job_id, {"status": JobStatus.DONE.value, "meta": job_meta})
 
 
@@ -524,15 +773,48 @@ def job_delete_all(job_id: str, purge_all: bool = False) -> None:
     if not job:
         return
     _update_job(job_id, {"status": JobStatus.RUNNING.value})
-    delete_user_data(job["user_id"], purge_all=purge_all or bool((job.get("meta") or {}).get("purge_all")))
-    _update_job(job_id, {"status": JobStatus.DONE.value, "meta": job.get("meta") or {}})
+    job_meta = job.get("meta") or {}
+    report = delete_user_data(job["user_id"], purge_all=purge_all or bool(job_meta.get("purge_all")))
+    job_meta["deleted"] = report.rows
+    job_meta["storage_objects"] = report.storage_objects
+    _update_job(job_id, {"status": JobStatus.DONE.value, "meta": job_meta})
 
 
 @shared_task(name="cron.retention_cleanup")
 def job_retention_cleanup() -> None:
-    counts = retention_cleanup()
-    for user_id, removed in counts.items():
-        _append_event(user_id, "retention_cleanup", {"removed": removed})
+    shards = max(1, int(os.getenv("RETENTION_SHARDS", "8")))
+    reset_stale_retention_checkpoints(shards)
+    chord(job_retention_shard.s(index, shards) for index in range(shards))(job_retention_finalize.s())
+
+
+@shared_task(name="cron.retention_shard")
+def job_retention_shard(shard: int, shards: int) -> Dict[str, Any]:
+    rate = float(os.getenv("RETENTION_STORAGE_RATE", "0")) or None
+    report = retention_cleanup(shard=shard, shards=shards, max_storage_per_second=rate)
+    return {"shard": shard, "per_user": report.per_user, "summary": report.as_dict()}
+
+
+@shared_task(name="cron.retention_finalize")
+def job_retention_finalize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    removed: Dict[str, int] = {}
+    for result in results:
+        for user_id, count in (result.get("per_user") or {}).items():
+            removed[user_id] = removed.get(user_id, 0) + count
+    events = [
+        {"user_id": user_id, "type": "retention_cleanup", "payload": {"removed": count}}
+        for user_id, count in sorted(removed.items())
+    ]
+    supabase = get_supabase()
+    for start in range(0, len(events), EVENT_BATCH_SIZE):
+        supabase.insert_rows("events", events[start : start + EVENT_BATCH_SIZE])
+    timings = {str(result.get("shard")): (result.get("summary") or {}).get("timings_ms") for result in results}
+    LOGGER.info(
+        "Retention cleanup finished for %d users across %d shards",
+        len(removed),
+        len(results),
+        extra={"timings_ms": timings},
+    )
+    return {"users": len(removed), "shards": len(results), "removed": sum(removed.values())}
 
 
 @shared_task(name="jobs.generic")
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import io
+import logging
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from apps.worker.services.backends import load_backend
+from apps.worker.services.ocr_engine import language_ladder, open_ocr_handle
+
+LOGGER = logging.getLogger(__name__)
+
+# The first rung of the language ladder: what the first OCR attempt on any page loads.
+OCR_LANGUAGES = "+".join(language_ladder(None)[0])
+
+
+def warm_pillow() -> None:
+    for name in ("image", "image_draw", "image_font"):
+        load_backend(name)
+
+
+def warm_pymupdf() -> None:
+    fitz = load_backend("fitz")
+    if fitz is None:
+        return
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "warmup", fontsize=10)
+    page.get_pixmap(dpi=72).tobytes("png")
+    page.get_text("words")
+
+
+def warm_pdfplumber() -> None:
+    load_backend("pdfplumber")
+
+
+def warm_tesseract() -> None:
+    """Touch the OCR language data so it is resident before children fork.
+
+    pytesseract shells out per page, so this primes the page cache for the
+    traineddata files (shared by every child) rather than a live engine.
+    """
+
+    pytesseract = load_backend("pytesseract")
+    image_module = load_backend("image")
+    if pytesseract is None or image_module is None:
+        return
+    image = image_module.new("L", (64, 32), color=255)
+    try:
+        pytesseract.image_to_data(image, lang=OCR_LANGUAGES, config="--psm 6")
+    except Exception as exc:  # pragma: no cover - tesseract binary missing
+        LOGGER.warning("Tesseract warmup failed: %s", exc)
+
+
+def open_tesseract_handle() -> None:
+    """Open this child's tesserocr handle for the first language rung so its first page skips loading traineddata."""
+
+    open_ocr_handle(lang=OCR_LANGUAGES)
+
+
+def warm_weasyprint() -> None:
+    weasyprint = load_backend("weasyprint")
+    if weasyprint is None:
+        return
+    try:
+        weasyprint.HTML(string="<html><body><p>warmup</p></body></html>").write_pdf(io.BytesIO())
+    except Exception as exc:  # pragma: no cover - rendering failure path
+        LOGGER.warning("WeasyPrint warmup failed: %s", exc)
+
+
+OCR_ROUTINES: Tuple[Callable[[], None], ...] = (warm_pillow, warm_pymupdf, warm_pdfplumber, warm_tesseract)
+RENDER_ROUTINES: Tuple[Callable[[], None], ...] = (warm_pymupdf, warm_weasyprint)
+
+# Queue name -> routines run in the Celery parent before the pool forks.
+# The default "celery" queue currently serves extraction and reports alike.
+WARMUP_ROUTINES: Dict[str, Tuple[Callable[[], None], ...]] = {
+    "ocr": OCR_ROUTINES,
+    "extract": OCR_ROUTINES,
+    "reports": RENDER_ROUTINES,
+    "celery": OCR_ROUTINES + RENDER_ROUTINES,
+}
+
+# Queue name -> routines run in every pool child right after it forks, for
+# state that must not be shared across processes (live OCR handles).
+PROCESS_ROUTINES: Dict[str, Tuple[Callable[[], None], ...]] = {
+    "ocr": (open_tesseract_handle,),
+    "extract": (open_tesseract_handle,),
+    "celery": (open_tesseract_handle,),
+}
+
+
+def resolve_warmup_queues(consumed: Iterable[str]) -> List[str]:
+    override = os.getenv("WORKER_WARMUP_QUEUES")
+    if override is not None:
+        return [queue.strip() for queue in override.split(",") if queue.strip()]
+    return list(consumed)
+
+
+def run_warmup(
+    queues: Iterable[str], routines: Optional[Dict[str, Tuple[Callable[[], None], ...]]] = None
+) -> Dict[str, float]:
+    """Run each routine needed by ``queues`` once (default table ``WARMUP_ROUTINES``); returns timings in ms."""
+
+    table = WARMUP_ROUTINES if routines is None else routines
+    timings: Dict[str, float] = {}
+    for queue in queues:
+        for routine in table.get(queue, ()):
+            if routine.__name__ in timings:
+                continue
+            started = time.perf_counter()
+            try:
+                routine()
+            except Exception as exc:  # pragma: no cover - warmup must never block boot
+                LOGGER.warning("Warmup routine %s failed: %s", routine.__name__, exc)
+            timings[routine.__name__] = round((time.perf_counter() - started) * 1000, 2)
+    return timings
+
+
+__all__ = ["PROCESS_ROUTINES", "WARMUP_ROUTINES", "resolve_warmup_queues", "run_warmup"]
@@ -0,0 +1,37 @@
+-- Cache rendered dossier/HR pack artifacts keyed by a digest of (template version, payload)
+create table if not exists public.report_cache (
+    id uuid primary key default gen_random_uuid(),
+    user_id uuid not null,
+    kind text not null,
+    digest text not null,
+    storage_path text,
+    invalidated_at timestamptz,
+    created_at timestamptz not null default now()
+);
+
+create unique index if not exists idx_report_cache_user_kind_digest
+    on public.report_cache(user_id, kind, digest);
+
+alter table public.report_cache enable row level security;
+
+-- Any payslip insert or delete makes every cached report for that user stale;
+-- the worker removes the orphaned storage objects on its next render.
+create or replace function public.invalidate_report_cache()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    update public.report_cache
+    set invalidated_at = now()
+    where user_id = coalesce(new.user_id, old.user_id)
+      and invalidated_at is null;
+    return null;
+end;
+$$;
+
+drop trigger if exists trg_payslips_invalidate_report_cache on public.payslips;
+create trigger trg_payslips_invalidate_report_cache
+    after insert or delete on public.payslips
+    for each row execute function public.invalidate_report_cache();
@@ -0,0 +1,96 @@
+-- Set-based deletion for account deletion and retention cleanup.
+-- The worker purges storage objects in large batches, then clears table rows
+-- for a whole batch of users in one statement per table.
+
+create table if not exists public.maintenance_checkpoints (
+    name text primary key,
+    cursor text,
+    updated_at timestamptz not null default now()
+);
+
+alter table public.maintenance_checkpoints enable row level security;
+
+create or replace function public.rpc_delete_user_data(p_user_ids uuid[], p_purge_settings boolean default false)
+returns jsonb
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    counts jsonb := '{}'::jsonb;
+    removed integer;
+begin
+    delete from public.anomalies where user_id = any(p_user_ids);
+    get diagnostics removed = row_count;
+    counts := counts || jsonb_build_object('anomalies', removed);
+
+    delete from public.payslips where user_id = any(p_user_ids);
+    get diagnostics removed = row_count;
+    counts := counts || jsonb_build_object('payslips', removed);
+
+    delete from public.redactions where user_id = any(p_user_ids);
+    get diagnostics removed = row_count;
+    counts := counts || jsonb_build_object('redactions', removed);
+
+    delete from public.llm_usage where user_id = any(p_user_ids);
+    get diagnostics removed = row_count;
+    counts := counts || jsonb_build_object('llm_usage', removed);
+
+    delete from public.events where user_id = any(p_user_ids);
+    get diagnostics removed = row_count;
+    counts := counts || jsonb_build_object('events', removed);
+
+    delete from public.jobs where user_id = any(p_user_ids);
+    get diagnostics removed = row_count;
+    counts := counts || jsonb_build_object('jobs', removed);
+
+    delete from public.report_cache where user_id = any(p_user_ids);
+    get diagnostics removed = row_count;
+    counts := counts || jsonb_build_object('report_cache', removed);
+
+    delete from public.files where user_id = any(p_user_ids);
+    get diagnostics removed = row_count;
+    counts := counts || jsonb_build_object('files', removed);
+
+    if p_purge_settings then
+        delete from public.settings where user_id = any(p_user_ids);
+        get diagnostics removed = row_count;
+        counts := counts || jsonb_build_object('settings', removed);
+    end if;
+
+    return counts;
+end;
+$$;
+
+-- Retention: each user has its own cutoff, passed as parallel arrays.
+create or replace function public.rpc_retention_delete(p_user_ids uuid[], p_cutoffs timestamptz[])
+returns table(user_id uuid, payslips integer, files integer)
+language sql
+security definer
+set search_path = public
+as $$
+    with targets as (
+        select t.user_id, t.cutoff
+        from unnest(p_user_ids, p_cutoffs) as t(user_id, cutoff)
+    ),
+    removed_payslips as (
+        delete from public.payslips p
+        using targets t
+        where p.user_id = t.user_id and p.created_at < t.cutoff
+        returning p.user_id
+    ),
+    removed_files as (
+        delete from public.files f
+        using targets t
+        where f.user_id = t.user_id and f.created_at < t.cutoff
+        returning f.user_id
+    )
+    select
+        t.user_id,
+        (select count(*) from removed_payslips r where r.user_id = t.user_id)::integer,
+        (select count(*) from removed_files r where r.user_id = t.user_id)::integer
+    from targets t;
+$$;
+
+revoke all on function public.rpc_delete_user_data(uuid[], boolean) from public, anon, authenticated;
+revoke all on function public.rpc_retention_delete(uuid[], timestamptz[]) from public, anon, authenticated;
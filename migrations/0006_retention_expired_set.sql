@@ -0,0 +1,59 @@
+-- Retention sweep driven by (user_id, created_at) indexes. The worker pages
+-- through the expired set with rpc_retention_expired_files, purges storage,
+-- then deletes the page by id. Payslips cascade from their file.
+
+create index if not exists idx_files_user_created_at on public.files(user_id, created_at);
+create index if not exists idx_payslips_user_created_at on public.payslips(user_id, created_at);
+
+create or replace function public.rpc_retention_expired_files(
+    p_as_of timestamptz,
+    p_default_days integer default 90,
+    p_after_user uuid default null,
+    p_after_id uuid default null,
+    p_limit integer default 500
+)
+returns table(id uuid, user_id uuid, s3_key_original text, s3_key_redacted text)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select f.id, f.user_id, f.s3_key_original, f.s3_key_redacted
+    from public.settings s
+    join public.files f
+      on f.user_id = s.user_id
+     and f.created_at < p_as_of - make_interval(days => coalesce(s.retention_days, p_default_days))
+    where p_after_user is null
+       or (f.user_id, f.id) > (p_after_user, p_after_id)
+    order by f.user_id, f.id
+    limit p_limit;
+$$;
+
+create or replace function public.rpc_retention_delete_files(p_file_ids uuid[])
+returns table(user_id uuid, payslips integer, files integer)
+language sql
+security definer
+set search_path = public
+as $$
+    with removed_payslips as (
+        delete from public.payslips p
+        where p.file_id = any(p_file_ids)
+        returning p.user_id
+    ),
+    removed_files as (
+        delete from public.files f
+        where f.id = any(p_file_ids)
+        returning f.user_id
+    )
+    select
+        r.user_id,
+        (select count(*) from removed_payslips p where p.user_id = r.user_id)::integer,
+        count(*)::integer
+    from removed_files r
+    group by r.user_id;
+$$;
+
+drop function if exists public.rpc_retention_delete(uuid[], timestamptz[]);
+
+revoke all on function public.rpc_retention_expired_files(timestamptz, integer, uuid, uuid, integer) from public, anon, authenticated;
+revoke all on function public.rpc_retention_delete_files(uuid[]) from public, anon, authenticated;
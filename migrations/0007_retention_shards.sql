@@ -0,0 +1,31 @@
+-- Bound the expired-file scan to a user id range so retention can run as
+-- parallel shards (see cron.retention_cleanup).
+
+drop function if exists public.rpc_retention_expired_files(timestamptz, integer, uuid, uuid, integer);
+
+create or replace function public.rpc_retention_expired_files(
+    p_as_of timestamptz,
+    p_default_days integer default 90,
+    p_after_user uuid default null,
+    p_after_id uuid default null,
+    p_before_user uuid default null,
+    p_limit integer default 500
+)
+returns table(id uuid, user_id uuid, s3_key_original text, s3_key_redacted text)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select f.id, f.user_id, f.s3_key_original, f.s3_key_redacted
+    from public.settings s
+    join public.files f
+      on f.user_id = s.user_id
+     and f.created_at < p_as_of - make_interval(days => coalesce(s.retention_days, p_default_days))
+    where (p_after_user is null or (s.user_id >= p_after_user and (f.user_id, f.id) > (p_after_user, p_after_id)))
+      and (p_before_user is null or s.user_id < p_before_user)
+    order by f.user_id, f.id
+    limit p_limit;
+$$;
+
+revoke all on function public.rpc_retention_expired_files(timestamptz, integer, uuid, uuid, uuid, integer) from public, anon, authenticated;
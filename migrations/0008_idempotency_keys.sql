@@ -0,0 +1,13 @@
+-- Idempotency keys for rows written by retried worker tasks. The worker
+-- derives keys from the job id (e.g. '<job_id>:payslip') and inserts with
+-- on conflict do nothing, so a redelivered job never duplicates rows.
+
+alter table public.payslips add column if not exists idempotency_key text;
+alter table public.redactions add column if not exists idempotency_key text;
+alter table public.events add column if not exists idempotency_key text;
+alter table public.jobs add column if not exists idempotency_key text;
+
+create unique index if not exists idx_payslips_idempotency_key on public.payslips(idempotency_key);
+create unique index if not exists idx_redactions_idempotency_key on public.redactions(idempotency_key);
+create unique index if not exists idx_events_idempotency_key on public.events(idempotency_key);
+create unique index if not exists idx_jobs_idempotency_key on public.jobs(idempotency_key);
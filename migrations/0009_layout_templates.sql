@@ -0,0 +1,19 @@
+-- Layout templates learned by the worker from confident extractions. A row
+-- maps a fingerprint of a payslip's label layout to the page regions where
+-- each field's value sits; rows carry coordinates only, never values.
+create table if not exists public.layout_templates (
+    id uuid primary key default gen_random_uuid(),
+    fingerprint text not null,
+    version integer not null default 1,
+    regions jsonb not null,
+    hits integer not null default 0,
+    idempotency_key text,
+    created_at timestamptz not null default now(),
+    last_used_at timestamptz
+);
+
+create unique index if not exists idx_layout_templates_fingerprint on public.layout_templates(fingerprint);
+create unique index if not exists idx_layout_templates_idempotency_key on public.layout_templates(idempotency_key);
+
+-- Service role only: templates are shared across users.
+alter table public.layout_templates enable row level security;
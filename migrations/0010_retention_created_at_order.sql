@@ -0,0 +1,47 @@
+-- Page the expired-file set in (user_id, created_at, id) order so the scan
+-- walks one index per user and stops at the retention cutoff. The previous
+-- (user_id, id) order had no matching index and sorted every expired row
+-- before applying the limit. The new index supersedes the (user_id,
+-- created_at) files index; idx_payslips_user_created_at stays, since
+-- job_detect_anomalies reads a user's recent payslips through it.
+
+create index if not exists idx_files_user_created_at_id on public.files(user_id, created_at, id);
+drop index if exists public.idx_files_user_created_at;
+
+drop function if exists public.rpc_retention_expired_files(timestamptz, integer, uuid, uuid, uuid, integer);
+
+create or replace function public.rpc_retention_expired_files(
+    p_as_of timestamptz,
+    p_default_days integer default 90,
+    p_after_user uuid default null,
+    p_after_created_at timestamptz default null,
+    p_after_id uuid default null,
+    p_before_user uuid default null,
+    p_limit integer default 500
+)
+returns table(id uuid, user_id uuid, created_at timestamptz, s3_key_original text, s3_key_redacted text)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select f.id, f.user_id, f.created_at, f.s3_key_original, f.s3_key_redacted
+    from public.settings s
+    join public.files f
+      on f.user_id = s.user_id
+     and f.created_at < p_as_of - make_interval(days => coalesce(s.retention_days, p_default_days))
+    where (
+        p_after_user is null
+        or (
+            s.user_id >= p_after_user
+            and (f.user_id, f.created_at, f.id)
+                > (p_after_user, coalesce(p_after_created_at, '-infinity'::timestamptz), p_after_id)
+        )
+    )
+      and (p_before_user is null or s.user_id < p_before_user)
+    order by f.user_id, f.created_at, f.id
+    limit p_limit;
+$$;
+
+revoke all on function public.rpc_retention_expired_files(timestamptz, integer, uuid, timestamptz, uuid, uuid, integer)
+    from public, anon, authenticated;
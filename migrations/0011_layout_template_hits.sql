@@ -0,0 +1,16 @@
+-- Count template hits in one statement: concurrent extractions of the same
+-- layout each add one instead of overwriting each other's read-modify-write.
+
+create or replace function public.rpc_layout_template_hit(p_id uuid)
+returns integer
+language sql
+security definer
+set search_path = public
+as $$
+    update public.layout_templates
+    set hits = hits + 1, last_used_at = now()
+    where id = p_id
+    returning hits;
+$$;
+
+revoke all on function public.rpc_layout_template_hit(uuid) from public, anon, authenticated;
@@ -0,0 +1,7 @@
+-- jobs.detect_anomalies can be delivered more than once (a redelivered
+-- extract re-sends a follow-up that is still queued). Anomalies are keyed
+-- '<job_id>:<type>' so a repeat run inserts nothing new.
+
+alter table public.anomalies add column if not exists idempotency_key text;
+
+create unique index if not exists idx_anomalies_idempotency_key on public.anomalies(idempotency_key);
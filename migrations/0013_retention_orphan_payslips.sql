@@ -0,0 +1,62 @@
+-- Payslips without a file (file_id is null) cannot expire through their
+-- file, so retention pages them separately on their own created_at, with
+-- the same (user_id, created_at, id) keyset and shard bounds as files.
+
+create index if not exists idx_payslips_orphans_user_created_at_id
+    on public.payslips(user_id, created_at, id)
+    where file_id is null;
+
+create or replace function public.rpc_retention_expired_payslips(
+    p_as_of timestamptz,
+    p_default_days integer default 90,
+    p_after_user uuid default null,
+    p_after_created_at timestamptz default null,
+    p_after_id uuid default null,
+    p_before_user uuid default null,
+    p_limit integer default 500
+)
+returns table(id uuid, user_id uuid, created_at timestamptz)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select p.id, p.user_id, p.created_at
+    from public.settings s
+    join public.payslips p
+      on p.user_id = s.user_id
+     and p.file_id is null
+     and p.created_at < p_as_of - make_interval(days => coalesce(s.retention_days, p_default_days))
+    where (
+        p_after_user is null
+        or (
+            s.user_id >= p_after_user
+            and (p.user_id, p.created_at, p.id)
+                > (p_after_user, coalesce(p_after_created_at, '-infinity'::timestamptz), p_after_id)
+        )
+    )
+      and (p_before_user is null or s.user_id < p_before_user)
+    order by p.user_id, p.created_at, p.id
+    limit p_limit;
+$$;
+
+create or replace function public.rpc_retention_delete_payslips(p_payslip_ids uuid[])
+returns table(user_id uuid, payslips integer)
+language sql
+security definer
+set search_path = public
+as $$
+    with removed as (
+        delete from public.payslips p
+        where p.id = any(p_payslip_ids)
+          and p.file_id is null
+        returning p.user_id
+    )
+    select r.user_id, count(*)::integer
+    from removed r
+    group by r.user_id;
+$$;
+
+revoke all on function public.rpc_retention_expired_payslips(timestamptz, integer, uuid, timestamptz, uuid, uuid, integer)
+    from public, anon, authenticated;
+revoke all on function public.rpc_retention_delete_payslips(uuid[]) from public, anon, authenticated;
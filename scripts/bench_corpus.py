@@ -0,0 +1,173 @@
+"""Generate a reproducible corpus of synthetic UK/IE payslip PDFs for benchmarking.
+
+Usage: python scripts/bench_corpus.py [--output bench_corpus] [--per-kind 5] [--seed 7]
+
+Writes one PDF per document plus ``manifest.json`` with the ground-truth
+fields that ``scripts/bench_extract.py`` scores extraction against.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+KINDS = ("text", "scan", "password", "multi_page")
+COUNTRIES = ("UK", "IE")
+EMPLOYERS = ("ACME Payroll", "Emerald Services", "Northwind Logistics", "Harbour Foods", "Cobalt Analytics")
+NAMES = ("Jane Doe", "Sean Murphy", "Priya Shah", "Aoife Byrne", "Tom Clarke")
+SCAN_DPI = 150
+PASSWORD = "bench123"
+
+
+@dataclass
+class CorpusDocument:
+    name: str
+    kind: str
+    country: str
+    currency: str
+    password: Optional[str]
+    pages: int
+    fields: Dict[str, float] = field(default_factory=dict)
+
+
+def _fields(rng: random.Random, country: str) -> Dict[str, float]:
+    gross = round(rng.uniform(1800, 6500), 2)
+    tax_income = round(gross * rng.uniform(0.12, 0.24), 2)
+    ni_prsi = round(gross * (rng.uniform(0.06, 0.09) if country == "UK" else 0.04), 2)
+    pension_employee = round(gross * rng.choice((0.03, 0.05, 0.06)), 2)
+    student_loan = round(gross * 0.03, 2) if country == "UK" and rng.random() < 0.4 else 0.0
+    net = round(gross - tax_income - ni_prsi - pension_employee - student_loan, 2)
+    values = {
+        "gross": gross,
+        "tax_income": tax_income,
+        "ni_prsi": ni_prsi,
+        "pension_employee": pension_employee,
+        "net": net,
+    }
+    if student_loan:
+        values["student_loan"] = student_loan
+    return values
+
+
+def _lines(rng: random.Random, country: str, values: Dict[str, float]) -> List[str]:
+    symbol = "£" if country == "UK" else "EUR "
+    employer = rng.choice(EMPLOYERS)
+    lines = [employer, f"Employee: {rng.choice(NAMES)}", f"Pay Date: 2024-{rng.randint(1, 12):02d}-28"]
+    if country == "UK":
+        lines += [
+            f"HMRC PAYE ref: {rng.randint(100, 999)}/AB{rng.randint(1000, 9999)}",
+            f"NI Number: QQ{rng.randint(100000, 999999)}C",
+            "Tax Code: 1257L",
+        ]
+    else:
+        lines += [f"PPS No: {rng.randint(1000000, 9999999)}T", "Tax Credits: S1"]
+    labels = {
+        "gross": "Gross Pay",
+        "tax_income": "Income Tax" if country == "UK" else "PAYE Income Tax",
+        "ni_prsi": "National Insurance" if country == "UK" else "PRSI",
+        "pension_employee": "Employee Pension",
+        "student_loan": "Student Loan",
+        "net": "Net Pay",
+    }
+    for key, label in labels.items():
+        if key in values:
+            lines.append(f"{label}: {symbol}{values[key]:,.2f}")
+    return lines
+
+
+def _text_pdf(pages: List[List[str]]) -> bytes:
+    import fitz
+
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((56, 72), "\n".join(lines), fontname="helv", fontsize=11, lineheight=1.6)
+    return doc.tobytes()
+
+
+def _scanned_pdf(text_pdf: bytes) -> bytes:
+    """Rasterise every page and rebuild the PDF from images only (no text layer)."""
+
+    import fitz
+
+    source = fitz.open(stream=text_pdf, filetype="pdf")
+    doc = fitz.open()
+    for page in source:
+        pix = page.get_pixmap(dpi=SCAN_DPI, colorspace=fitz.csGRAY)
+        target = doc.new_page(width=page.rect.width, height=page.rect.height)
+        target.insert_image(target.rect, stream=pix.tobytes("png"))
+    return doc.tobytes(deflate=True)
+
+
+def _encrypted_pdf(text_pdf: bytes, password: str) -> bytes:
+    import fitz
+
+    doc = fitz.open(stream=text_pdf, filetype="pdf")
+    return doc.tobytes(encryption=fitz.PDF_ENCRYPT_AES_256, user_pw=password, owner_pw=password)
+
+
+def build_document(index: int, kind: str, country: str, rng: random.Random) -> tuple[CorpusDocument, bytes]:
+    values = _fields(rng, country)
+    lines = _lines(rng, country, values)
+    pages = [lines]
+    if kind == "multi_page":
+        split = len(lines) // 2
+        pages = [lines[:split] + ["Continued overleaf"], ["Totals"] + lines[split:]]
+    data = _text_pdf(pages)
+    password = None
+    if kind == "scan":
+        data = _scanned_pdf(data)
+    elif kind == "password":
+        password = PASSWORD
+        data = _encrypted_pdf(data, password)
+    document = CorpusDocument(
+        name=f"{index:04d}_{country.lower()}_{kind}.pdf",
+        kind=kind,
+        country=country,
+        currency="GBP" if country == "UK" else "EUR",
+        password=password,
+        pages=len(pages),
+        fields=values,
+    )
+    return document, data
+
+
+def generate_corpus(output: Path, *, per_kind: int = 5, seed: int = 7) -> List[CorpusDocument]:
+    """Write ``per_kind`` documents of every kind for each country; the same seed yields the same content."""
+
+    rng = random.Random(seed)
+    output.mkdir(parents=True, exist_ok=True)
+    documents: List[CorpusDocument] = []
+    index = 0
+    for kind in KINDS:
+        for country in COUNTRIES:
+            for _ in range(per_kind):
+                document, data = build_document(index, kind, country, rng)
+                (output / document.name).write_bytes(data)
+                documents.append(document)
+                index += 1
+    manifest = {"seed": seed, "documents": [asdict(document) for document in documents]}
+    (output / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    return documents
+
+
+def load_manifest(corpus: Path) -> List[CorpusDocument]:
+    payload = json.loads((corpus / "manifest.json").read_text())
+    return [CorpusDocument(**item) for item in payload["documents"]]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--output", type=Path, default=Path("bench_corpus"))
+    parser.add_argument("--per-kind", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    documents = generate_corpus(args.output, per_kind=args.per_kind, seed=args.seed)
+    print(f"Wrote {len(documents)} documents to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
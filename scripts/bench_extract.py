@@ -0,0 +1,299 @@
+"""Benchmark the extraction pipeline stage by stage against a synthetic corpus.
+
+Usage: python scripts/bench_extract.py [--corpus bench_corpus] [--repeat 3] [--output bench.json]
+                                      [--text-engine pymupdf,pdfplumber] [--ocr-languages]
+
+The corpus is generated with ``scripts/bench_corpus.py`` when missing. The
+JSON report has per-stage throughput, latency percentiles and peak traced
+memory, plus field-level accuracy against the manifest. Diff reports between
+releases to catch regressions, or run once per ``--text-engine`` to compare
+text backends on the same corpus. ``--ocr-languages`` adds an
+``ocr_languages`` section that OCRs every scanned document with each fixed
+Tesseract language set and with the country-driven ladder, reporting speed
+and field accuracy per set.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import resource
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from scripts.bench_corpus import CorpusDocument, generate_corpus, load_manifest  # noqa: E402
+
+SCORED_FIELDS = ("gross", "net", "tax_income", "ni_prsi", "pension_employee", "student_loan")
+PERCENTILES = (50, 90, 95, 99)
+# "auto" is the production path: a country hint from the text layer picks the language ladder.
+OCR_LANGUAGE_SETS = ("eng", "eng+gle", "eng+enm+gle", "auto")
+
+
+class StageTimer:
+    """Record wall time and peak traced allocations for each pipeline stage.
+
+    ``tracemalloc`` only sees Python allocations; memory held inside
+    PyMuPDF/Tesseract shows up in the process-wide ``max_rss_kib`` instead.
+    """
+
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = {}
+        self.peaks: Dict[str, int] = {}
+
+    def run(self, stage: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = (time.perf_counter() - started) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+        self.samples.setdefault(stage, []).append(elapsed)
+        self.peaks[stage] = max(self.peaks.get(stage, 0), peak - baseline)
+        return result
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        report: Dict[str, Dict[str, float]] = {}
+        for stage, samples in self.samples.items():
+            total_ms = sum(samples)
+            stats = {
+                "count": len(samples),
+                "total_ms": round(total_ms, 2),
+                "mean_ms": round(total_ms / len(samples), 3),
+                "throughput_per_s": round(len(samples) / (total_ms / 1000), 2) if total_ms else None,
+                "peak_kib": round(self.peaks[stage] / 1024, 1),
+            }
+            for percentile in PERCENTILES:
+                stats[f"p{percentile}_ms"] = round(_percentile(samples, percentile), 3)
+            report[stage] = stats
+        return report
+
+
+def _percentile(samples: List[float], percentile: int) -> float:
+    ordered = sorted(samples)
+    rank = max(0, math.ceil(percentile / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def _process(
+    document: CorpusDocument, data: bytes, timer: StageTimer, engines: Optional[Sequence[str]] = None
+) -> Dict[str, Any]:
+    from apps.worker.services.merge import (
+        LlmExtraction,
+        infer_period_type,
+        merge_native_with_llm,
+        validate_identity_rule,
+    )
+    from apps.worker.services.pdf import PageRenditions, decrypt_pdf
+    from apps.worker.services.redaction import redact_text, redacted_preview
+    from apps.worker.services.validation import calculate_confidence, validate_tax_code_format
+    from apps.worker.services.text_engine import extract_text, image_pages
+    from apps.worker.services.page_rank import page_ink, rank_pages
+    from apps.worker.services.ocr_engine import ocr_country
+    from apps.worker.tasks import (
+        _combine_with_ocr,
+        _merge_pdf_text,
+        _native_parse,
+        _ocr_pages,
+        _redaction_geometry,
+        _run_ocr,
+    )
+
+    pdf = timer.run("decrypt", decrypt_pdf, data, document.password)
+    renditions = PageRenditions(pdf)
+    text = layer = timer.run("extract_text", extract_text, pdf, engines=engines)
+    native = _native_parse(text)
+    used_ocr = False
+    ocr_pixels: List[int] = []
+    ocr_text = None
+    ink = timer.run("rank_pages", page_ink, pdf, image_pages(text))
+    ranking = rank_pages(text, ink=ink)
+    ocr_pages = _ocr_pages(native, text, ranking)
+    if ocr_pages:
+        country = ocr_country(native.country, native.currency)
+        ocr_text = timer.run("ocr", _run_ocr, pdf, pages=ocr_pages, renditions=renditions, country=country)
+        ocr_pixels = ocr_text.ocr_pixels
+        if ocr_text.has_text:
+            native = _combine_with_ocr(native, _native_parse(ocr_text))
+            text = _merge_pdf_text(text, ocr_text)
+            used_ocr = True
+            ranking = rank_pages(text, ink=ink)
+    words, covered = _redaction_geometry(layer, ocr_text)
+    redaction = timer.run("redact", redact_text, text.raw_text, words, covered_pages=covered)
+    timer.run("preview", redacted_preview, redaction, renditions.page((ranking or [0])[0], consumer="preview"))
+
+    def merge_and_validate() -> Dict[str, Any]:
+        merged = merge_native_with_llm(native, LlmExtraction(payload={}))
+        merged["period_type"] = infer_period_type(merged.get("period_start"), merged.get("period_end"))
+        identity_ok = validate_identity_rule(merged)
+        validations = {"identity": identity_ok, "tax": validate_tax_code_format(merged.get("tax_code"), merged.get("country"))}
+        calculate_confidence(
+            native, merged, identity_ok=identity_ok, validations=validations, used_ocr=used_ocr, llm_present=False
+        )
+        return merged
+
+    timer.run("merge_validate", merge_and_validate)
+    return {
+        "native": native,
+        "used_ocr": used_ocr,
+        "rasters": sum(not use["cached"] for use in renditions.used),
+        "engine": text.engine,
+        "image_pages": sum(page.kind == "image" for page in text.pages),
+        "pages_read": [len(text.pages), text.page_count],
+        "ocr_pixels": ocr_pixels,
+        "ocr_pages": ocr_pages,
+    }
+
+
+def _score(document: CorpusDocument, native: Any) -> Dict[str, bool]:
+    scores: Dict[str, bool] = {}
+    for field in SCORED_FIELDS:
+        expected = document.fields.get(field)
+        observed = getattr(native, field)
+        if expected is None:
+            scores[field] = observed in (None, 0.0)
+        else:
+            scores[field] = observed is not None and abs(float(observed) - expected) < 0.005
+    scores["country"] = native.country == document.country
+    scores["currency"] = native.currency == document.currency
+    return scores
+
+
+def _accuracy(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    fields: Dict[str, List[bool]] = {}
+    kinds: Dict[str, List[bool]] = {}
+    for result in results:
+        for field, ok in result["scores"].items():
+            fields.setdefault(field, []).append(ok)
+            kinds.setdefault(result["kind"], []).append(ok)
+    everything = [ok for values in fields.values() for ok in values]
+    ratio = lambda values: round(sum(values) / len(values), 4) if values else None  # noqa: E731
+    return {
+        "overall": ratio(everything),
+        "fields": {field: ratio(values) for field, values in sorted(fields.items())},
+        "by_kind": {kind: ratio(values) for kind, values in sorted(kinds.items())},
+        "ocr_used": sum(result["used_ocr"] for result in results),
+    }
+
+
+def language_sweep(corpus: Path, documents: List[CorpusDocument]) -> Dict[str, Any]:
+    from apps.worker.services.ocr_engine import ocr_country
+    from apps.worker.services.pdf import decrypt_pdf, perform_ocr
+    from apps.worker.services.text_engine import extract_text, image_pages
+    from apps.worker.services.page_rank import page_ink, rank_pages
+    from apps.worker.tasks import _native_parse
+
+    scans = [document for document in documents if document.kind == "scan"]
+    pdfs = {document.name: decrypt_pdf((corpus / document.name).read_bytes(), document.password) for document in scans}
+    report: Dict[str, Any] = {}
+    for spec in OCR_LANGUAGE_SETS:
+        samples: List[float] = []
+        scores: List[bool] = []
+        confidences: List[float] = []
+        chosen: Dict[str, int] = {}
+        for document in scans:
+            pdf = pdfs[document.name]
+            if spec == "auto":
+                native = _native_parse(extract_text(pdf))
+                options: Dict[str, Any] = {"country": ocr_country(native.country, native.currency)}
+            else:
+                options = {"languages": spec.split("+")}
+            started = time.perf_counter()
+            ocr_text = perform_ocr(pdf, page_limit=2, **options)
+            samples.append((time.perf_counter() - started) * 1000)
+            scores.extend(_score(document, _native_parse(ocr_text)).values())
+            if ocr_text.confidence is not None:
+                confidences.append(ocr_text.confidence)
+            for languages in ocr_text.ocr_languages:
+                chosen[languages] = chosen.get(languages, 0) + 1
+        report[spec] = {
+            "documents": len(scans),
+            "mean_ms": round(sum(samples) / len(samples), 2) if samples else None,
+            "p95_ms": round(_percentile(samples, 95), 2) if samples else None,
+            "accuracy": round(sum(scores) / len(scores), 4) if scores else None,
+            "mean_confidence": round(sum(confidences) / len(confidences), 2) if confidences else None,
+            "pages_by_languages": chosen,
+        }
+    return report
+
+
+def run_benchmark(
+    corpus: Path,
+    *,
+    repeat: int = 1,
+    engines: Optional[Sequence[str]] = None,
+    ocr_languages: bool = False,
+) -> Dict[str, Any]:
+    documents = load_manifest(corpus)
+    timer = StageTimer()
+    results: List[Dict[str, Any]] = []
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        for iteration in range(repeat):
+            for document in documents:
+                data = (corpus / document.name).read_bytes()
+                outcome = _process(document, data, timer, engines)
+                if iteration == 0:
+                    results.append(
+                        {
+                            "name": document.name,
+                            "kind": document.kind,
+                            "used_ocr": outcome["used_ocr"],
+                            "rasters": outcome["rasters"],
+                            "engine": outcome["engine"],
+                            "image_pages": outcome["image_pages"],
+                            "pages_read": outcome["pages_read"],
+                            "ocr_pixels": outcome["ocr_pixels"],
+                            "ocr_pages": outcome["ocr_pages"],
+                            "scores": _score(document, outcome["native"]),
+                        }
+                    )
+    finally:
+        tracemalloc.stop()
+    wall_s = time.perf_counter() - started
+    stages = timer.summary()
+    processed = len(documents) * repeat
+    report = {
+        "corpus": {"path": str(corpus), "documents": len(documents), "repeat": repeat},
+        "text_engine": list(engines) if engines else None,
+        "wall_s": round(wall_s, 3),
+        "documents_per_s": round(processed / wall_s, 2) if wall_s else None,
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "stages": stages,
+        "accuracy": _accuracy(results),
+        "documents": results,
+    }
+    if ocr_languages:
+        report["ocr_languages"] = language_sweep(corpus, documents)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", type=Path, default=ROOT / "bench_corpus")
+    parser.add_argument("--per-kind", type=int, default=5, help="documents per kind/country when generating")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--text-engine", help="comma-separated engines in preference order (default: TEXT_ENGINE)")
+    parser.add_argument("--ocr-languages", action="store_true", help="compare Tesseract language sets on scans")
+    args = parser.parse_args()
+    from apps.worker.services.text_engine import engine_order
+
+    engines = engine_order(args.text_engine) if args.text_engine else None
+    if not (args.corpus / "manifest.json").exists():
+        generate_corpus(args.corpus, per_kind=args.per_kind, seed=args.seed)
+    report = json.dumps(run_benchmark(args.corpus, repeat=args.repeat, engines=engines, ocr_languages=args.ocr_languages), indent=2, sort_keys=True)
+    if args.output:
+        args.output.write_text(report)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
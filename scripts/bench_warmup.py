@@ -0,0 +1,107 @@
+"""Compare first-job latency of a freshly forked worker child with and without preloading.
+
+Usage: python scripts/bench_warmup.py [--trials 5] [--queue celery] [--output bench.json]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+FIXTURES = ROOT / "scripts" / "fixtures"
+
+
+def _first_job() -> None:
+    from apps.worker.services.pdf import extract_text, perform_ocr, rasterize_first_pages
+    from apps.worker.services.reports import generate_dossier_pdf
+
+    data = (FIXTURES / "uk_scan.pdf").read_bytes()
+    extract_text(data)
+    perform_ocr(data, page_limit=1)
+    rasterize_first_pages(data, pages=1)
+    generate_dossier_pdf("bench", {"year": 2024, "totals": {"gross": 1.0, "net": 1.0}})
+
+
+def _trial(preload: bool, queue: str) -> Dict[str, float]:
+    """Mimic the prefork pool: optional warmup in the parent, then time the child's first job."""
+
+    warmup_ms = 0.0
+    if preload:
+        from apps.worker.warmup import run_warmup
+
+        warmup_ms = sum(run_warmup([queue]).values())
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # child
+        os.close(read_fd)
+        started = time.perf_counter()
+        try:
+            _first_job()
+            result = {"first_job_ms": (time.perf_counter() - started) * 1000}
+        except Exception as exc:  # pragma: no cover - surfaced to the parent
+            result = {"error": repr(exc)}
+        os.write(write_fd, json.dumps(result).encode())
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as pipe:
+        payload = json.loads(pipe.read() or "{}")
+    os.waitpid(pid, 0)
+    if "error" in payload:
+        raise RuntimeError(f"first job failed in child: {payload['error']}")
+    payload["warmup_ms"] = warmup_ms
+    return payload
+
+
+def _summarise(samples: List[Dict[str, float]]) -> Dict[str, float]:
+    latencies = [sample["first_job_ms"] for sample in samples]
+    return {
+        "trials": len(samples),
+        "first_job_ms_median": round(statistics.median(latencies), 2),
+        "first_job_ms_min": round(min(latencies), 2),
+        "first_job_ms_max": round(max(latencies), 2),
+        "warmup_ms_median": round(statistics.median(sample["warmup_ms"] for sample in samples), 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--queue", default="celery")
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--trial", choices=["cold", "warm"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.trial:
+        print(json.dumps(_trial(args.trial == "warm", args.queue)))
+        return
+
+    results: Dict[str, Dict[str, float]] = {}
+    for mode in ("cold", "warm"):
+        samples = []
+        for _ in range(args.trials):
+            # Each trial runs in a fresh interpreter so nothing stays cached between runs.
+            completed = subprocess.run(
+                [sys.executable, __file__, "--trial", mode, "--queue", args.queue],
+                capture_output=True,
+                text=True,
+                check=True,
+                cwd=ROOT,
+                env={**os.environ, "PYTHONPATH": str(ROOT)},
+            )
+            samples.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        results[mode] = _summarise(samples)
+    report = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        args.output.write_text(report)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Push extract/detect_anomalies/dossier jobs through the real Celery tasks against the local backend.
+
+Usage: python scripts/load_generate.py [--extract 1000] [--dossier 100] [--concurrency 8]
+       [--latency-ms 5] [--jitter-ms 5] [--failure-rate 0.0] [--broker memory://] [--output load.json]
+
+Supabase and storage are replaced by ``apps.worker.local_backend`` (with the
+requested latency/failure injection), and an in-process Celery worker
+consumes from the chosen broker (the in-memory transport by default, or a
+local Redis URL). Extract jobs enqueue their detect_anomalies follow-ups
+through Celery exactly as in production. The JSON report has jobs/sec,
+queue wait and run time per task, extraction stage timings and final job
+statuses.
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("WORKER_WARMUP", "0")
+
+from celery.contrib.testing.worker import start_worker  # noqa: E402
+from celery.signals import before_task_publish, task_postrun, task_prerun  # noqa: E402
+
+from apps.common.models import JobKind, JobStatus  # noqa: E402
+from apps.worker.local_backend import (  # noqa: E402
+    FaultInjector,
+    LocalStorageService,
+    LocalSupabaseService,
+    install_local_backend,
+)
+
+FIXTURES = ROOT / "scripts" / "fixtures"
+TERMINAL = {JobStatus.DONE.value, JobStatus.NEEDS_REVIEW.value, JobStatus.FAILED.value}
+PASSWORDS = {"password": "test123"}
+
+
+class TaskClock:
+    """Collect publish/start/finish timestamps for every task from Celery signals."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.published: Dict[str, float] = {}
+        self.started: Dict[str, float] = {}
+        self.finished: Dict[str, float] = {}
+        self.names: Dict[str, str] = {}
+
+    def connect(self) -> None:
+        before_task_publish.connect(self._on_publish, weak=False)
+        task_prerun.connect(self._on_prerun, weak=False)
+        task_postrun.connect(self._on_postrun, weak=False)
+
+    def _on_publish(self, sender: Any = None, headers: Any = None, **_: Any) -> None:
+        with self.lock:
+            self.published[headers["id"]] = time.perf_counter()
+            self.names[headers["id"]] = sender
+
+    def _on_prerun(self, task_id: str = "", **_: Any) -> None:
+        with self.lock:
+            self.started[task_id] = time.perf_counter()
+
+    def _on_postrun(self, task_id: str = "", **_: Any) -> None:
+        with self.lock:
+            self.finished[task_id] = time.perf_counter()
+
+    def idle(self) -> bool:
+        with self.lock:
+            return bool(self.names) and len(self.finished) == len(self.names)
+
+    def per_task(self) -> Dict[str, Dict[str, Any]]:
+        waits: Dict[str, List[float]] = {}
+        runs: Dict[str, List[float]] = {}
+        with self.lock:
+            for task_id, name in self.names.items():
+                if task_id in self.started:
+                    waits.setdefault(name, []).append((self.started[task_id] - self.published[task_id]) * 1000)
+                if task_id in self.finished:
+                    runs.setdefault(name, []).append((self.finished[task_id] - self.started[task_id]) * 1000)
+        return {
+            name: {
+                "published": sum(1 for value in self.names.values() if value == name),
+                "completed": len(runs.get(name, [])),
+                "queue_wait_ms": _distribution(waits.get(name, [])),
+                "run_ms": _distribution(runs.get(name, [])),
+            }
+            for name in sorted(set(self.names.values()))
+        }
+
+
+def _distribution(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def percentile(value: int) -> float:
+        return round(ordered[max(0, math.ceil(value / 100 * len(ordered)) - 1)], 2)
+
+    return {
+        "mean": round(sum(ordered) / len(ordered), 2),
+        "p50": percentile(50),
+        "p95": percentile(95),
+        "p99": percentile(99),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def _seed_jobs(
+    supabase: LocalSupabaseService, storage: LocalStorageService, args: argparse.Namespace
+) -> List[Dict[str, Any]]:
+    fixtures = sorted(path.stem for path in args.fixtures.glob("*.pdf"))
+    users = [f"load-user-{index:04d}" for index in range(args.users)]
+    pdfs = itertools.cycle(fixtures)
+    jobs: List[Dict[str, Any]] = []
+    for index in range(args.extract):
+        user_id = users[index % len(users)]
+        fixture = next(pdfs)
+        file_row = supabase.insert_row("files", {"user_id": user_id, "s3_key_original": f"{user_id}/{fixture}.pdf"})
+        # Storage resolves PDFs by <file_id>.pdf, so point the new file id at the fixture bytes.
+        storage.uploads[f"{user_id}/{file_row['id']}.pdf"] = (args.fixtures / f"{fixture}.pdf").read_bytes()
+        meta: Dict[str, Any] = {"disable_llm": True}
+        if fixture in PASSWORDS:
+            meta["pdfPassword"] = PASSWORDS[fixture]
+        jobs.append(
+            supabase.insert_row(
+                "jobs",
+                {
+                    "user_id": user_id,
+                    "file_id": file_row["id"],
+                    "kind": JobKind.EXTRACT.value,
+                    "status": JobStatus.QUEUED.value,
+                    "meta": meta,
+                },
+            )
+        )
+    for index in range(args.dossier):
+        jobs.append(
+            supabase.insert_row(
+                "jobs",
+                {
+                    "user_id": users[index % len(users)],
+                    "kind": JobKind.DOSSIER.value,
+                    "status": JobStatus.QUEUED.value,
+                    "meta": {"year": 2024},
+                },
+            )
+        )
+    return jobs
+
+
+def _stage_timings(supabase: LocalSupabaseService) -> Dict[str, Dict[str, float]]:
+    samples: Dict[str, List[float]] = {}
+    for row in supabase.tables["jobs"]:
+        for stage, elapsed in ((row.get("meta") or {}).get("stageTimingsMs") or {}).items():
+            samples.setdefault(stage, []).append(elapsed)
+    return {stage: _distribution(values) for stage, values in sorted(samples.items())}
+
+
+@contextmanager
+def faults_paused(faults: FaultInjector) -> Iterator[None]:
+    """Disable injected latency/failures while seeding fixtures."""
+
+    saved = (faults.latency_ms, faults.jitter_ms, faults.failure_rate)
+    faults.latency_ms = faults.jitter_ms = faults.failure_rate = 0.0
+    try:
+        yield
+    finally:
+        faults.latency_ms, faults.jitter_ms, faults.failure_rate = saved
+        faults.calls = faults.failures = 0
+
+
+def run_load(args: argparse.Namespace) -> Dict[str, Any]:
+    from apps.worker import tasks
+    from apps.worker.celery_app import celery_app
+
+    faults = FaultInjector(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, failure_rate=args.failure_rate, seed=args.seed
+    )
+    supabase = LocalSupabaseService(faults=faults)
+    storage = LocalStorageService(args.fixtures, faults=faults)
+    install_local_backend(supabase, storage)
+    # No ClamAV daemon locally; scanning is not what this harness measures.
+    tasks.scan_bytes = lambda *_args, **_kwargs: None
+    celery_app.conf.update(broker_url=args.broker, result_backend=None, task_ignore_result=True)
+
+    clock = TaskClock()
+    clock.connect()
+    with faults_paused(faults):
+        jobs = _seed_jobs(supabase, storage, args)
+    started = time.perf_counter()
+    with start_worker(celery_app, concurrency=args.concurrency, pool="threads", perform_ping_check=False):
+        for job in jobs:
+            task = "jobs.extract" if job["kind"] == JobKind.EXTRACT.value else "jobs.dossier"
+            celery_app.send_task(task, args=[job["id"]])
+        deadline = started + args.timeout
+        while time.perf_counter() < deadline:
+            with supabase.lock:
+                pending = [row for row in supabase.tables["jobs"] if row.get("status") not in TERMINAL]
+            # Tasks that crashed on an injected failure leave their job non-terminal.
+            if not pending or clock.idle():
+                break
+            time.sleep(0.2)
+    wall_s = time.perf_counter() - started
+
+    statuses: Dict[str, Dict[str, int]] = {}
+    for row in supabase.tables["jobs"]:
+        by_kind = statuses.setdefault(row["kind"], {})
+        by_kind[row.get("status")] = by_kind.get(row.get("status"), 0) + 1
+    finished = sum(count for kinds in statuses.values() for status, count in kinds.items() if status in TERMINAL)
+    return {
+        "config": {
+            "extract": args.extract,
+            "dossier": args.dossier,
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "broker": args.broker,
+        },
+        "backend": faults.stats(),
+        "wall_s": round(wall_s, 3),
+        "jobs_finished": finished,
+        "jobs_unfinished": len(supabase.tables["jobs"]) - finished,
+        "jobs_per_s": round(finished / wall_s, 2) if wall_s else None,
+        "statuses": statuses,
+        "tasks": clock.per_task(),
+        "extract_stages_ms": _stage_timings(supabase),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--extract", type=int, default=1000)
+    parser.add_argument("--dossier", type=int, default=100)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--broker", default="memory://")
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+    report = json.dumps(run_load(args), indent=2, sort_keys=True)
+    if args.output:
+        args.output.write_text(report)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
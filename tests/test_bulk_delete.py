@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+from apps.worker.services import bulk_delete
+from apps.worker.services.bulk_delete import StoragePurger, delete_users, retention_sweep, shard_bounds
+
+
+class RecordingStorage:
+    def __init__(self):
+        self.calls = []
+
+    def delete_objects(self, paths):
+        self.calls.append(list(paths))
+
+
+def _patch(monkeypatch, fake_supabase, storage):
+    monkeypatch.setattr(bulk_delete, "get_supabase", lambda: fake_supabase)
+    monkeypatch.setattr(bulk_delete, "get_storage_service", lambda: storage)
+    rpc_calls = []
+
+    def fake_rpc(function, params):
+        rpc_calls.append((function, params))
+        if function == "rpc_delete_user_data":
+            users = set(params["p_user_ids"])
+            counts = {}
+            for table in ("payslips", "files", "report_cache"):
+                before = fake_supabase.tables[table]
+                fake_supabase.tables[table] = [row for row in before if row.get("user_id") not in users]
+                counts[table] = len(before) - len(fake_supabase.tables[table])
+            return counts
+        if function in ("rpc_retention_expired_files", "rpc_retention_expired_payslips"):
+            as_of = datetime.fromisoformat(params["p_as_of"])
+            retention = {row["user_id"]: row.get("retention_days") for row in fake_supabase.tables["settings"]}
+            after = (params["p_after_user"], params["p_after_created_at"] or "", params["p_after_id"])
+            files = function == "rpc_retention_expired_files"
+            expired = [
+                row
+                for row in fake_supabase.tables["files" if files else "payslips"]
+                if row["user_id"] in retention
+                and (files or row.get("file_id") is None)
+                and row["created_at"]
+                < (as_of - timedelta(days=retention[row["user_id"]] or params["p_default_days"])).isoformat()
+                and (after[0] is None or (row["user_id"], row["created_at"], row["id"]) > after)
+                and (params["p_before_user"] is None or row["user_id"] < params["p_before_user"])
+            ]
+            expired.sort(key=lambda row: (row["user_id"], row["created_at"], row["id"]))
+            return expired[: params["p_limit"]]
+        if function == "rpc_retention_delete_files":
+            ids = set(params["p_file_ids"])
+            removed = {}
+            for row in fake_supabase.tables["payslips"]:
+                if row.get("file_id") in ids:
+                    removed.setdefault(row["user_id"], {"payslips": 0, "files": 0})["payslips"] += 1
+            for row in fake_supabase.tables["files"]:
+                if row["id"] in ids:
+                    removed.setdefault(row["user_id"], {"payslips": 0, "files": 0})["files"] += 1
+            fake_supabase.tables["payslips"] = [r for r in fake_supabase.tables["payslips"] if r.get("file_id") not in ids]
+            fake_supabase.tables["files"] = [r for r in fake_supabase.tables["files"] if r["id"] not in ids]
+            return [{"user_id": user_id, **counts} for user_id, counts in removed.items()]
+        if function == "rpc_retention_delete_payslips":
+            ids = set(params["p_payslip_ids"])
+            removed = {}
+            for row in fake_supabase.tables["payslips"]:
+                if row["id"] in ids and row.get("file_id") is None:
+                    removed[row["user_id"]] = removed.get(row["user_id"], 0) + 1
+            fake_supabase.tables["payslips"] = [r for r in fake_supabase.tables["payslips"] if r["id"] not in ids]
+            return [{"user_id": user_id, "payslips": count} for user_id, count in removed.items()]
+        return {}
+
+    monkeypatch.setattr(fake_supabase, "rpc", fake_rpc)
+    return rpc_calls
+
+
+def test_storage_purger_batches_paths():
+    storage = RecordingStorage()
+    purger = StoragePurger(storage, batch_size=3)
+    purger.add(["a", None, "b"])
+    purger.add(["c", "d"])
+    purger.flush()
+    assert storage.calls == [["a", "b", "c"], ["d"]]
+    assert purger.removed == 4
+
+
+def test_delete_users_uses_one_rpc_per_batch(monkeypatch, fake_supabase):
+    storage = RecordingStorage()
+    rpc_calls = _patch(monkeypatch, fake_supabase, storage)
+    for index in range(5):
+        user_id = f"user-{index}"
+        fake_supabase.insert_row("files", {"id": f"f{index}", "user_id": user_id})
+        fake_supabase.insert_row("payslips", {"user_id": user_id, "file_id": f"f{index}"})
+    fake_supabase.insert_row("report_cache", {"user_id": "user-0", "storage_path": "user-0/abc_dossier.pdf"})
+
+    report = delete_users([f"user-{index}" for index in range(5)], batch_size=2)
+
+    assert [name for name, _ in rpc_calls] == ["rpc_delete_user_data"] * 3
+    assert report.users == 5 and report.batches == 3
+    assert report.rows["payslips"] == 5 and report.rows["files"] == 5
+    assert report.storage_objects == 11
+    assert "user-0/abc_dossier.pdf" in storage.calls[0]
+    assert not fake_supabase.tables["files"]
+
+
+def test_delete_users_resumes_after_checkpoint(monkeypatch, fake_supabase):
+    rpc_calls = _patch(monkeypatch, fake_supabase, RecordingStorage())
+    fake_supabase.insert_row("maintenance_checkpoints", {"name": "purge", "cursor": "user-1"})
+
+    report = delete_users(["user-0", "user-1", "user-2"], checkpoint="purge")
+
+    assert report.resumed_from == "user-1"
+    assert rpc_calls[0][1]["p_user_ids"] == ["user-2"]
+    assert bulk_delete.load_checkpoint("purge") is None
+
+
+def test_retention_sweep_pages_through_expired_set(monkeypatch, fake_supabase):
+    storage = RecordingStorage()
+    rpc_calls = _patch(monkeypatch, fake_supabase, storage)
+    now = datetime.now(timezone.utc)
+    fake_supabase.insert_row("settings", {"user_id": "user-a", "retention_days": 30})
+    fake_supabase.insert_row("settings", {"user_id": "user-b", "retention_days": None})
+    fake_supabase.insert_row("settings", {"user_id": "user-c", "retention_days": 30})
+    for user_id in ("user-a", "user-b", "user-c"):
+        created_at = (now - timedelta(days=60)).isoformat()
+        fake_supabase.insert_row("files", {"id": f"{user_id}-old", "user_id": user_id, "created_at": created_at})
+        fake_supabase.insert_row(
+            "payslips", {"user_id": user_id, "file_id": f"{user_id}-old", "created_at": created_at}
+        )
+    fake_supabase.insert_row(
+        "files", {"id": "user-a-new", "user_id": "user-a", "created_at": (now - timedelta(days=1)).isoformat()}
+    )
+
+    report = retention_sweep(page_size=1)
+
+    assert report.per_user == {"user-a": 1, "user-c": 1}
+    assert report.users == 2 and report.rows == {"payslips": 2, "files": 2}
+    scans = [params for name, params in rpc_calls if name == "rpc_retention_expired_files"]
+    assert [scan["p_after_user"] for scan in scans] == [None, "user-a", "user-c"]
+    assert sorted(path for call in storage.calls for path in call) == [
+        "user-a/user-a-old.pdf",
+        "user-a/user-a-old_redacted.png",
+        "user-c/user-c-old.pdf",
+        "user-c/user-c-old_redacted.png",
+    ]
+    assert sorted(row["id"] for row in fake_supabase.tables["files"]) == ["user-a-new", "user-b-old"]
+    assert bulk_delete.load_checkpoint("retention_cleanup") is None
+
+
+def test_shard_bounds_cover_uuid_space():
+    bounds = [shard_bounds(index, 4) for index in range(4)]
+    assert bounds[0] == (None, "40000000-0000-0000-0000-000000000000")
+    assert bounds[3] == ("c0000000-0000-0000-0000-000000000000", None)
+    assert all(bounds[index][1] == bounds[index + 1][0] for index in range(3))
+    assert shard_bounds(0, 1) == (None, None)
+
+
+def test_retention_sweep_stays_inside_shard(monkeypatch, fake_supabase):
+    _patch(monkeypatch, fake_supabase, RecordingStorage())
+    created_at = (datetime.now(timezone.utc) - timedelta(days=200)).isoformat()
+    for user_id in ("10000000-0000-0000-0000-000000000001", "90000000-0000-0000-0000-000000000001"):
+        fake_supabase.insert_row("settings", {"user_id": user_id, "retention_days": 30})
+        fake_supabase.insert_row("files", {"id": f"file-{user_id[0]}", "user_id": user_id, "created_at": created_at})
+
+    report = retention_sweep(user_range=shard_bounds(1, 2), checkpoint="retention_cleanup:1/2")
+
+    assert list(report.per_user) == ["90000000-0000-0000-0000-000000000001"]
+    assert [row["id"] for row in fake_supabase.tables["files"]] == ["file-1"]
+
+
+def test_retention_sweep_resumes_in_created_at_order(monkeypatch, fake_supabase):
+    rpc_calls = _patch(monkeypatch, fake_supabase, RecordingStorage())
+    now = datetime.now(timezone.utc)
+    fake_supabase.insert_row("settings", {"user_id": "user-a", "retention_days": 30})
+    older, newer = (now - timedelta(days=90)).isoformat(), (now - timedelta(days=60)).isoformat()
+    fake_supabase.insert_row("files", {"id": "z-older", "user_id": "user-a", "created_at": older})
+    fake_supabase.insert_row("files", {"id": "a-newer", "user_id": "user-a", "created_at": newer})
+    # Same created_at as z-older: the file id breaks the tie.
+    fake_supabase.insert_row("files", {"id": "m-older", "user_id": "user-a", "created_at": older})
+    # A crash after the first page left this cursor behind.
+    fake_supabase.insert_row(
+        "maintenance_checkpoints", {"name": "retention_cleanup", "cursor": f"user-a:{older}:m-older"}
+    )
+
+    retention_sweep(page_size=1)
+
+    scans = [params for name, params in rpc_calls if name == "rpc_retention_expired_files"]
+    assert [(scan["p_after_created_at"], scan["p_after_id"]) for scan in scans] == [
+        (older, "m-older"),
+        (older, "z-older"),
+        (newer, "a-newer"),
+    ]
+    assert [row["id"] for row in fake_supabase.tables["files"]] == ["m-older"]
+    assert bulk_delete._split_cursor("user-a:f1") == ("user-a", None, "f1")
+
+
+def test_retention_sweep_expires_payslips_without_a_file(monkeypatch, fake_supabase):
+    rpc_calls = _patch(monkeypatch, fake_supabase, RecordingStorage())
+    now = datetime.now(timezone.utc)
+    old, recent = (now - timedelta(days=60)).isoformat(), (now - timedelta(days=1)).isoformat()
+    fake_supabase.insert_row("settings", {"user_id": "user-a", "retention_days": 30})
+    fake_supabase.insert_row("files", {"id": "f-old", "user_id": "user-a", "created_at": old})
+    fake_supabase.insert_row("payslips", {"id": "p-file", "user_id": "user-a", "file_id": "f-old", "created_at": old})
+    fake_supabase.insert_row("payslips", {"id": "p-orphan", "user_id": "user-a", "file_id": None, "created_at": old})
+    fake_supabase.insert_row("payslips", {"id": "p-new", "user_id": "user-a", "file_id": None, "created_at": recent})
+
+    report = retention_sweep(page_size=1, checkpoint="retention_cleanup:0/1")
+
+    assert [row["id"] for row in fake_supabase.tables["payslips"]] == ["p-new"]
+    assert report.per_user == {"user-a": 2}
+    assert report.rows == {"payslips": 2, "files": 1}
+    orphan_scans = [params for name, params in rpc_calls if name == "rpc_retention_expired_payslips"]
+    assert [scan["p_after_id"] for scan in orphan_scans] == [None, "p-orphan"]
+    assert bulk_delete.load_checkpoint("retention_cleanup:0/1:payslips") is None
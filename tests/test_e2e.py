@@ -79,6 +79,7 @@ def test_end_to_end_pipeline(monkeypatch, fake_supabase, fake_storage, fixture_s
     monkeypatch.setattr("apps.worker.tasks._ensure_storage_service", lambda: fake_storage)
     monkeypatch.setattr("apps.worker.tasks.scan_bytes", lambda *args, **kwargs: None)
     monkeypatch.setattr("apps.worker.services.reports.get_supabase", lambda: fake_supabase)
+    monkeypatch.setattr("apps.worker.services.report_cache.get_supabase", lambda: fake_supabase)
 
     send_calls = []
     monkeypatch.setattr(
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import zipfile
+from datetime import date
+
+import pytest
+
+from apps.common.supabase import iter_table_rows
+from apps.worker.services.reports import EXPORT_SCHEMAS, write_export_archive
+
+
+def test_iter_table_rows_uses_keyset_pages(fake_supabase):
+    for index in range(7):
+        fake_supabase.insert_row("payslips", {"id": f"p{index:02d}", "user_id": "u1", "net": index})
+    fake_supabase.insert_row("payslips", {"id": "other", "user_id": "u2"})
+    rows = list(iter_table_rows(fake_supabase.client, "payslips", filters={"user_id": "u1"}, page_size=3))
+    assert [row["id"] for row in rows] == [f"p{index:02d}" for index in range(7)]
+
+
+def test_export_archive_streams_every_column(fake_supabase, fake_storage):
+    fake_supabase.insert_row("files", {"id": "uk_text", "user_id": "u1", "file_name": "a.pdf"})
+    fake_supabase.insert_row("payslips", {"id": "p1", "user_id": "u1", "ytd": {"gross": 1.0}})
+    fake_supabase.insert_row("payslips", {"id": "p2", "user_id": "u1", "idempotency_key": "job-1:payslip"})
+    tables = {
+        name: fake_supabase.iter_rows(name, filters={"user_id": "u1"}, key="user_id" if name == "settings" else "id")
+        for name in ("payslips", "files", "anomalies", "settings")
+    }
+    buffer = io.BytesIO()
+    counts = write_export_archive(buffer, "u1", tables=tables, storage=fake_storage)
+    assert counts == {"payslips": 2, "files": 1, "anomalies": 0, "settings": 0}
+    with zipfile.ZipFile(buffer) as archive:
+        first, second = (json.loads(line) for line in archive.read("payslips.jsonl").decode().splitlines())
+        assert list(first) == EXPORT_SCHEMAS["payslips"] + ["user_id"]
+        assert second["idempotency_key"] == "job-1:payslip"
+        reader = csv.reader(io.StringIO(archive.read("payslips.csv").decode()))
+        header, row, later = next(reader), next(reader), next(reader)
+        # Columns outside the listed order (a later migration's) are appended, not dropped.
+        assert header == EXPORT_SCHEMAS["payslips"] + ["user_id", "idempotency_key"]
+        assert json.loads(row[header.index("ytd")]) == {"gross": 1.0}
+        assert (row[-1], later[-1]) == ("", "job-1:payslip")
+        assert next(csv.reader(io.StringIO(archive.read("anomalies.csv").decode()))) == EXPORT_SCHEMAS["anomalies"]
+        assert archive.read("pdfs/uk_text.pdf")
+
+
+def test_columnar_export_writes_typed_tables(fake_supabase, fake_storage):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    fake_supabase.insert_row(
+        "payslips",
+        {"id": "p1", "user_id": "u1", "pay_date": "2024-03-31", "currency": "GBP", "gross": 3200.005, "ytd": {"gross": 9600}},
+    )
+    fake_supabase.insert_row(
+        "anomalies",
+        {"id": "a1", "user_id": "u1", "payslip_id": "p1", "type": "NET_DROP", "snoozed_until": "2024-04-30"},
+    )
+    for fmt in ("parquet", "arrow"):
+        tables = {name: fake_supabase.iter_rows(name, filters={"user_id": "u1"}) for name in ("payslips", "anomalies")}
+        buffer = io.BytesIO()
+        counts = write_export_archive(buffer, "u1", tables=tables, storage=fake_storage, export_format=fmt)
+        assert counts == {"payslips": 1, "ytd": 1, "anomalies": 1}
+        with zipfile.ZipFile(buffer) as archive:
+            assert "payslips.jsonl" not in archive.namelist()
+            raw = archive.read(f"payslips.{fmt}")
+            ytd_raw = archive.read(f"ytd.{fmt}")
+            anomalies_raw = archive.read(f"anomalies.{fmt}")
+        if fmt == "parquet":
+            payslips = pq.read_table(io.BytesIO(raw))
+            ytd = pq.read_table(io.BytesIO(ytd_raw))
+            anomalies = pq.read_table(io.BytesIO(anomalies_raw))
+        else:
+            payslips = pa.ipc.open_file(pa.BufferReader(raw)).read_all()
+            ytd = pa.ipc.open_file(pa.BufferReader(ytd_raw)).read_all()
+            anomalies = pa.ipc.open_file(pa.BufferReader(anomalies_raw)).read_all()
+        assert payslips.schema.field("pay_date").type == pa.date32()
+        assert payslips.schema.field("gross").type == pa.decimal128(12, 2)
+        assert str(payslips.column("gross")[0].as_py()) == "3200.00"
+        assert ytd.column("field").to_pylist() == ["gross"]
+        # snoozed_until is a Postgres date, not a timestamp.
+        assert anomalies.schema.field("snoozed_until").type == pa.date32()
+        assert anomalies.column("snoozed_until").to_pylist() == [date(2024, 4, 30)]
+
+
+def test_columnar_export_keeps_undeclared_columns_and_survives_bad_amounts(fake_supabase, fake_storage):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    fake_supabase.insert_row("payslips", {"id": "p1", "user_id": "u1", "gross": 1e13, "explainer_text": "Tax rose"})
+    fake_supabase.insert_row("payslips", {"id": "p2", "user_id": "u1", "net": "NaN", "updated_at": "2024-04-01"})
+    tables = {"payslips": fake_supabase.iter_rows("payslips", filters={"user_id": "u1"})}
+    buffer = io.BytesIO()
+    counts = write_export_archive(buffer, "u1", tables=tables, storage=fake_storage, export_format="parquet")
+    assert counts == {"payslips": 2, "ytd": 0}
+    with zipfile.ZipFile(buffer) as archive:
+        payslips = pq.read_table(io.BytesIO(archive.read("payslips.parquet")))
+    names = payslips.schema.names
+    assert names[-3:] == ["user_id", "explainer_text", "updated_at"]
+    assert payslips.schema.field("explainer_text").type == pa.string()
+    assert payslips.column("explainer_text").to_pylist() == ["Tax rose", None]
+    assert payslips.column("gross").to_pylist() == [None, None]
+    assert payslips.column("net").to_pylist() == [None, None]
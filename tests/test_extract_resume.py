@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import pytest
+
+from apps.common.models import JobKind, JobStatus
+from apps.worker import tasks
+from apps.worker.services.llm import LlmResponse
+
+
+TERMINAL = {JobStatus.DONE.value, JobStatus.NEEDS_REVIEW.value}
+
+
+class WorkerLost(BaseException):
+    """Stands in for a worker OOM: not caught by the task's failure handling."""
+
+
+def test_redelivered_extract_resumes_after_completed_stages(monkeypatch, fake_supabase, fake_storage):
+    calls = {"llm": 0, "extract_text": 0}
+    real_extract_text = tasks.extract_text
+
+    def counting_extract_text(pdf_bytes):
+        calls["extract_text"] += 1
+        return real_extract_text(pdf_bytes)
+
+    def fake_llm(user, file, previews):
+        calls["llm"] += 1
+        assert previews[0].path.endswith("_redacted.png")
+        return LlmResponse(payload={"gross": 3200.0, "net": 2165.0, "confidence_overall": 0.95}, tokens=12, cost=0.01)
+
+    monkeypatch.setattr(tasks, "get_supabase", lambda: fake_supabase)
+    monkeypatch.setattr(tasks, "_ensure_storage_service", lambda: fake_storage)
+    monkeypatch.setattr(tasks, "scan_bytes", lambda *args, **kwargs: None)
+    monkeypatch.setattr(tasks, "extract_text", counting_extract_text)
+    monkeypatch.setattr(tasks, "_llm_extract", fake_llm)
+    sent = []
+    monkeypatch.setattr(tasks.celery_app, "send_task", lambda name, args=None, kwargs=None: sent.append((name, args)))
+
+    fake_supabase.insert_row("files", {"id": "uk_text", "user_id": "user-1"})
+    fake_supabase.insert_row(
+        "jobs",
+        {
+            "id": "job-1",
+            "user_id": "user-1",
+            "file_id": "uk_text",
+            "kind": JobKind.EXTRACT.value,
+            "status": JobStatus.QUEUED.value,
+            "meta": {},
+        },
+    )
+
+    real_insert_once = fake_supabase.insert_row_once
+
+    def crash_on_payslip(table, row, *, idempotency_key):
+        if table == "payslips":
+            raise WorkerLost()
+        return real_insert_once(table, row, idempotency_key=idempotency_key)
+
+    monkeypatch.setattr(fake_supabase, "insert_row_once", crash_on_payslip)
+    with pytest.raises(WorkerLost):
+        tasks.job_extract("job-1")
+    job = fake_supabase.table_select_single("jobs", match={"id": "job-1"})
+    assert job["status"] == JobStatus.RUNNING.value
+    assert list(job["meta"]["stages"]) == ["text", "preview", "llm"]
+    preview, llm = job["meta"]["renditions"][-2:]
+    assert (preview["consumer"], llm["consumer"]) == ("preview", "llm")
+    # When OCR ran it rasterised page 0 already; the preview reuses that render.
+    assert preview["cached"] == (job["meta"]["renditions"][0]["consumer"] == "ocr")
+    assert "raw_text" not in job["meta"]["stages"]["text"]
+
+    monkeypatch.setattr(fake_supabase, "insert_row_once", real_insert_once)
+    tasks.job_extract("job-1")
+
+    assert calls == {"llm": 1, "extract_text": 1}
+    assert len(fake_supabase.tables["redactions"]) == 1
+    assert len(fake_supabase.tables["payslips"]) == 1
+    follow_ups = [row for row in fake_supabase.tables["jobs"] if row["kind"] == JobKind.DETECT_ANOMALIES.value]
+    assert sent == [("jobs.detect_anomalies", [follow_ups[0]["id"]])]
+    job = fake_supabase.table_select_single("jobs", match={"id": "job-1"})
+    assert "stages" not in job["meta"]
+    assert job["meta"]["llm"] == {"tokens": 12, "cost": 0.01}
+
+
+def test_insert_row_once_returns_existing_row(fake_supabase):
+    first = fake_supabase.insert_row_once("events", {"user_id": "u", "type": "t"}, idempotency_key="job-1:event")
+    second = fake_supabase.insert_row_once("events", {"user_id": "u", "type": "t"}, idempotency_key="job-1:event")
+    assert first["id"] == second["id"]
+    assert len(fake_supabase.tables["events"]) == 1
+    assert fake_supabase.insert_row_if_absent("events", {"user_id": "u"}, idempotency_key="job-1:event")[1] is False
+    assert fake_supabase.insert_row_if_absent("events", {"user_id": "u"}, idempotency_key="job-2:event")[1] is True
+
+
+@pytest.mark.parametrize("crash_at", ["dispatch", "terminal_status"])
+def test_redelivered_extract_always_runs_the_follow_up_once(monkeypatch, fake_supabase, fake_storage, crash_at):
+    def fake_llm(user, file, previews):
+        return LlmResponse(payload={"gross": 3200.0, "net": 2165.0, "confidence_overall": 0.95}, tokens=12, cost=0.01)
+
+    monkeypatch.setattr(tasks, "get_supabase", lambda: fake_supabase)
+    monkeypatch.setattr(tasks, "_ensure_storage_service", lambda: fake_storage)
+    monkeypatch.setattr(tasks, "scan_bytes", lambda *args, **kwargs: None)
+    monkeypatch.setattr(tasks, "_llm_extract", fake_llm)
+    crashed = []
+    sent = []
+
+    def send_task(name, args=None, kwargs=None):
+        if crash_at == "dispatch" and not crashed:
+            crashed.append(name)
+            raise WorkerLost()
+        sent.append((name, args))
+
+    real_update_job = tasks._update_job
+
+    def update_job(job_id, updates):
+        if crash_at == "terminal_status" and not crashed and updates.get("status") in TERMINAL:
+            crashed.append(job_id)
+            raise WorkerLost()
+        real_update_job(job_id, updates)
+
+    monkeypatch.setattr(tasks.celery_app, "send_task", send_task)
+    monkeypatch.setattr(tasks, "_update_job", update_job)
+
+    # An earlier, much larger payslip makes the follow-up record a NET_DROP anomaly.
+    fake_supabase.insert_row(
+        "payslips",
+        {"id": "p-jan", "user_id": "user-1", "file_id": "f-jan", "net": 9000.0, "created_at": "2024-01-31T00:00:00"},
+    )
+    fake_supabase.insert_row("files", {"id": "uk_text", "user_id": "user-1"})
+    fake_supabase.insert_row(
+        "jobs",
+        {
+            "id": "job-1",
+            "user_id": "user-1",
+            "file_id": "uk_text",
+            "kind": JobKind.EXTRACT.value,
+            "status": JobStatus.QUEUED.value,
+            "meta": {},
+        },
+    )
+    with pytest.raises(WorkerLost):
+        tasks.job_extract("job-1")
+    # The broker redelivers the unacknowledged task.
+    tasks.job_extract("job-1")
+    assert fake_supabase.table_select_single("jobs", match={"id": "job-1"})["status"] in TERMINAL
+
+    (follow_up,) = [row for row in fake_supabase.tables["jobs"] if row["kind"] == JobKind.DETECT_ANOMALIES.value]
+    # The first dispatch may or may not have reached the broker, so a still-queued follow-up is sent again.
+    expected = 1 if crash_at == "dispatch" else 2
+    assert sent == [("jobs.detect_anomalies", [follow_up["id"]])] * expected
+    for _, args in sent:
+        tasks.job_detect_anomalies(*args)
+    assert fake_supabase.table_select_single("jobs", match={"id": follow_up["id"]})["status"] == JobStatus.DONE.value
+    assert [row["type"] for row in fake_supabase.tables["anomalies"]] == ["NET_DROP"]
+
+    # Once the follow-up has run, nothing re-sends it.
+    tasks.job_extract("job-1")
+    assert len(sent) == expected
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+from apps.worker.services.backends import BACKENDS
+
+IMPORT_BUDGET_SECONDS = float(os.environ.get("WORKER_IMPORT_BUDGET_SECONDS", "3.0"))
+
+_PROBE = textwrap.dedent(
+    """
+    import json
+    import sys
+    import time
+    import types
+
+    try:
+        from supabase import create_client  # noqa: F401
+    except Exception:  # pragma: no cover - testing shim mirrors test_e2e
+        stub = types.ModuleType("supabase")
+        stub.Client = object
+        stub.create_client = lambda *args, **kwargs: None
+        sys.modules["supabase"] = stub
+
+    started = time.perf_counter()
+    import apps.worker.tasks  # noqa: F401
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"elapsed": elapsed, "modules": sorted(sys.modules)}))
+    """
+)
+
+
+def test_worker_tasks_import_skips_heavy_backends():
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.getcwd(),
+        env={**os.environ, "PYTHONPATH": os.getcwd()},
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    loaded = sorted(name for name in BACKENDS.values() if name in report["modules"])
+    assert not loaded, f"heavy backends imported eagerly: {loaded}"
+    assert report["elapsed"] <= IMPORT_BUDGET_SECONDS, (
+        f"apps.worker.tasks import took {report['elapsed']:.2f}s (budget {IMPORT_BUDGET_SECONDS:.2f}s)"
+    )
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import fitz
+
+from apps.common.models import JobKind, JobStatus
+from apps.worker import tasks
+from apps.worker.services.layout_templates import LayoutTemplateStore, layout_fingerprint, read_template
+from apps.worker.services.pdf import extract_text
+
+
+def _payslip(gross: float, tax: float, ni: float, pension: float, employer: str = "ACME Ltd", top: int = 90) -> bytes:
+    net = round(gross - tax - ni - pension, 2)
+    rows = [
+        ("Employer:", employer),
+        ("Pay Date:", "28/03/2024"),
+        ("Tax Code:", "1257L"),
+        ("Gross Pay", f"£{gross:,.2f}"),
+        ("Income Tax", f"£{tax:,.2f}"),
+        ("National Insurance", f"£{ni:,.2f}"),
+        ("Employee Pension", f"£{pension:,.2f}"),
+        ("Net Pay", f"£{net:,.2f}"),
+    ]
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    for index, (label, value) in enumerate(rows):
+        page.insert_text((56, top + index * 22), label, fontname="helv", fontsize=11)
+        page.insert_text((360, top + index * 22), value, fontname="helv", fontsize=11)
+    return doc.tobytes()
+
+
+def test_fingerprint_follows_layout_not_values():
+    first = extract_text(_payslip(3200.0, 520.0, 280.0, 160.0))
+    second = extract_text(_payslip(12450.5, 3100.0, 610.25, 498.0, employer="Harbour Foods"))
+    assert layout_fingerprint(first.words) == layout_fingerprint(second.words)
+    moved = extract_text(_payslip(3200.0, 520.0, 280.0, 160.0, top=200))
+    assert layout_fingerprint(moved.words) != layout_fingerprint(first.words)
+
+
+def test_learned_template_reads_fields_from_regions(fake_supabase):
+    store = LayoutTemplateStore(fake_supabase)
+    first = extract_text(_payslip(3200.0, 520.0, 280.0, 160.0))
+    fingerprint = layout_fingerprint(first.words)
+    values = {"gross": 3200.0, "net": 2240.0, "tax_income": 520.0, "ni_prsi": 280.0, "pension_employee": 160.0}
+    learned = store.learn(fingerprint, first.words, {**values, "pay_date": "2024-03-28", "tax_code": "1257L"})
+    assert set(learned.regions) == {*values, "pay_date", "tax_code"}
+    assert "3200" not in str(fake_supabase.tables["layout_templates"][0])
+
+    later = extract_text(_payslip(12450.5, 3100.0, 610.25, 498.0))
+    native = read_template(store.find(fingerprint), later)
+    assert (native.gross, native.net, native.tax_income, native.ni_prsi) == (12450.5, 8242.25, 3100.0, 610.25)
+    assert (native.pension_employee, native.tax_code, native.pay_date) == (498.0, "1257L", "2024-03-28")
+
+
+def test_concurrent_hits_are_all_counted(fake_supabase):
+    store = LayoutTemplateStore(fake_supabase)
+    first = extract_text(_payslip(3200.0, 520.0, 280.0, 160.0))
+    fingerprint = layout_fingerprint(first.words)
+    values = {"gross": 3200.0, "net": 2240.0, "tax_income": 520.0, "ni_prsi": 280.0, "pension_employee": 160.0}
+    store.learn(fingerprint, first.words, values)
+    # Two workers read the template before either records its hit.
+    seen = [store.find(fingerprint), store.find(fingerprint)]
+    for template in seen:
+        store.record_hit(template)
+    assert fake_supabase.tables["layout_templates"][0]["hits"] == 2
+    assert [template.hits for template in seen] == [1, 2]
+
+
+def test_template_hit_skips_ocr_and_llm(monkeypatch, fake_supabase, fake_storage):
+    calls = {"llm": 0, "ocr": 0}
+
+    def fake_llm(*args):
+        calls["llm"] += 1
+        return None
+
+    def fake_ocr(*args, **kwargs):
+        calls["ocr"] += 1
+        raise AssertionError("OCR should not run")
+
+    monkeypatch.setattr(tasks, "get_supabase", lambda: fake_supabase)
+    monkeypatch.setattr(tasks, "_ensure_storage_service", lambda: fake_storage)
+    monkeypatch.setattr(tasks, "scan_bytes", lambda *args, **kwargs: None)
+    monkeypatch.setattr(tasks, "_llm_extract", fake_llm)
+    monkeypatch.setattr(tasks, "perform_ocr", fake_ocr)
+    monkeypatch.setattr(tasks.celery_app, "send_task", lambda *args, **kwargs: None)
+
+    payslips = {"march": _payslip(3200.0, 520.0, 280.0, 160.0), "april": _payslip(3350.0, 550.0, 295.0, 167.5)}
+    for name, data in payslips.items():
+        fake_storage.uploads[f"user-1/{name}.pdf"] = data
+        fake_supabase.insert_row("files", {"id": name, "user_id": "user-1"})
+        fake_supabase.insert_row(
+            "jobs",
+            {
+                "id": f"job-{name}",
+                "user_id": "user-1",
+                "file_id": name,
+                "kind": JobKind.EXTRACT.value,
+                "status": JobStatus.QUEUED.value,
+                "meta": {"disable_llm": name == "march"},
+            },
+        )
+
+    tasks.job_extract("job-march")
+    assert len(fake_supabase.tables["layout_templates"]) == 1
+
+    tasks.job_extract("job-april")
+    job = fake_supabase.table_select_single("jobs", match={"id": "job-april"})
+    assert job["status"] == JobStatus.DONE.value
+    assert job["meta"]["layoutTemplate"]
+    assert calls == {"llm": 0, "ocr": 0}
+    assert job["meta"]["fields"]["net"] == 2337.5
+    assert fake_supabase.tables["layout_templates"][0]["hits"] == 1
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import pytest
+
+from apps.common.supabase import get_supabase
+from apps.worker.local_backend import (
+    BackendUnavailable,
+    FaultInjector,
+    LocalStorageService,
+    LocalSupabaseService,
+    install_local_backend,
+)
+from apps.worker.services.storage import get_storage_service
+
+
+def test_fault_injector_fails_at_configured_rate():
+    faults = FaultInjector(failure_rate=0.5, seed=3)
+    supabase = LocalSupabaseService(faults=faults)
+    outcomes = []
+    for _ in range(200):
+        try:
+            supabase.insert_row("events", {"type": "probe"})
+            outcomes.append(True)
+        except BackendUnavailable:
+            outcomes.append(False)
+    assert faults.calls == 200
+    assert faults.failures == outcomes.count(False)
+    assert 60 < faults.failures < 140
+    assert len(supabase.tables["events"]) == outcomes.count(True)
+
+
+def test_fault_injector_adds_latency(monkeypatch):
+    delays = []
+    monkeypatch.setattr("apps.worker.local_backend.time.sleep", delays.append)
+    storage = LocalStorageService(faults=FaultInjector(latency_ms=20))
+    storage.upload_bytes(user_id="u", name="a.png", content_type="image/png", data=b"x")
+    with pytest.raises(FileNotFoundError):
+        storage.download_pdf(user_id="u", file_id="missing")
+    assert delays == [0.02, 0.02]
+
+
+def test_install_local_backend_routes_service_getters(monkeypatch):
+    from apps.common import supabase as supabase_module
+    from apps.worker.services import storage as storage_module
+
+    monkeypatch.setattr(supabase_module, "_supabase_service", None)
+    monkeypatch.setattr(storage_module, "_storage_service", None)
+    supabase = LocalSupabaseService()
+    storage = LocalStorageService()
+    install_local_backend(supabase, storage)
+    assert get_supabase() is supabase
+    assert get_storage_service() is storage
+
+
+def _seed_payslips(supabase, count, users=100):
+    supabase.insert_rows(
+        "payslips",
+        [
+            {
+                "id": f"p{index:06d}",
+                "user_id": f"user-{index % users:03d}",
+                "file_id": f"f{index:06d}",
+                "pay_date": None if index % 50 == 0 else f"2024-{index % 12 + 1:02d}-28",
+                "net": float(index),
+            }
+            for index in range(count)
+        ],
+    )
+
+
+def test_query_filters_follow_postgrest_semantics():
+    supabase = LocalSupabaseService()
+    _seed_payslips(supabase, 200, users=4)
+    table = supabase.client.table
+
+    rows = table("payslips").select("*").eq("user_id", "user-001").gte("net", 50).lt("net", 90).order("net").execute().data
+    assert [row["net"] for row in rows] == [53.0, 57.0, 61.0, 65.0, 69.0, 73.0, 77.0, 81.0, 85.0, 89.0]
+
+    # NULLs never satisfy range filters, and sort first on ascending order.
+    dated = table("payslips").select("*").gte("pay_date", "2024-01-01").order("pay_date").execute().data
+    assert len(dated) == 196 and dated[0]["pay_date"] == "2024-01-28"
+    assert table("payslips").select("*").order("pay_date").limit(1).execute().data[0]["pay_date"] is None
+
+    latest = table("payslips").select("*").order("net", desc=True).limit(3).execute().data
+    assert [row["net"] for row in latest] == [199.0, 198.0, 197.0]
+    assert len(table("payslips").select("*").in_("file_id", ["f000001", "f000002", "nope"]).execute().data) == 2
+
+    removed = table("payslips").delete().eq("user_id", "user-002").lt("net", 100).execute().data
+    assert len(removed) == 25
+    assert len(supabase.tables["payslips"]) == 175
+    assert not table("payslips").select("*").eq("id", removed[0]["id"]).execute().data
+
+
+def test_indexes_track_updates_and_reassigned_tables():
+    supabase = LocalSupabaseService()
+    _seed_payslips(supabase, 10)
+    supabase.update_row("payslips", match={"id": "p000003"}, updates={"user_id": "moved", "net": -1.0})
+    assert supabase.table_select_single("payslips", match={"user_id": "moved"})["id"] == "p000003"
+    assert not supabase.table_select_single("payslips", match={"user_id": "user-003"})
+    assert supabase.client.table("payslips").select("*").order("net").limit(1).execute().data[0]["id"] == "p000003"
+
+    supabase.tables["payslips"] = [row for row in supabase.tables["payslips"] if row["user_id"] != "moved"]
+    assert not supabase.table_select_single("payslips", match={"id": "p000003"})
+    assert supabase.table_select_single("payslips", match={"id": "p000004"})["net"] == 4.0
+
+
+def test_indexed_lookups_scale_to_large_tables(monkeypatch):
+    from apps.worker.local_backend import LocalQuery
+
+    supabase = LocalSupabaseService()
+    _seed_payslips(supabase, 20_000, users=200)
+    real_candidates = LocalQuery._candidates
+    touched = []
+
+    def counting_candidates(self, table):
+        rows, rest, ordered = real_candidates(self, table)
+        rows = list(rows)
+        touched.append(len(rows))
+        return rows, rest, ordered
+
+    monkeypatch.setattr(LocalQuery, "_candidates", counting_candidates)
+    for index in range(0, 20_000, 500):
+        assert supabase.table_select_single("payslips", match={"id": f"p{index:06d}"})
+        rows = list(supabase.iter_rows("payslips", filters={"user_id": f"user-{index % 200:03d}"}, page_size=50))
+        assert len(rows) == 100
+    # Every query is served from an index: it touches its own rows, never the 20k-row table.
+    assert touched and max(touched) <= 100
\ No newline at end of file
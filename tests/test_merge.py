@@ -95,3 +95,50 @@ def test_infer_period_type():
     assert infer_period_type("2024-04-01", "2024-04-14") == "fortnightly"
     assert infer_period_type("2024-04-01", "2024-04-07") == "weekly"
     assert infer_period_type(None, None) is None
+
+
+def test_extract_without_llm_keeps_native_other_deductions(monkeypatch, fake_supabase, fake_storage):
+    import fitz
+
+    from apps.common.models import JobKind, JobStatus
+    from apps.worker import tasks
+
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    rows = [
+        ("Employer:", "ACME Ltd"),
+        ("Pay Date:", "28/03/2024"),
+        ("Gross Pay", "£3,000.00"),
+        ("Income Tax", "£400.00"),
+        ("Other Deductions", "£100.00"),
+        ("Net Pay", "£2,500.00"),
+    ]
+    for line, (label, value) in enumerate(rows):
+        page.insert_text((56, 90 + line * 22), label, fontname="helv", fontsize=11)
+        page.insert_text((360, 90 + line * 22), value, fontname="helv", fontsize=11)
+    fake_storage.uploads["user-1/other.pdf"] = doc.tobytes()
+
+    monkeypatch.setattr(tasks, "get_supabase", lambda: fake_supabase)
+    monkeypatch.setattr(tasks, "_ensure_storage_service", lambda: fake_storage)
+    monkeypatch.setattr(tasks, "scan_bytes", lambda *args, **kwargs: None)
+    monkeypatch.setattr(tasks, "_llm_extract", lambda *args: None)
+    monkeypatch.setattr(tasks.celery_app, "send_task", lambda *args, **kwargs: None)
+    fake_supabase.insert_row("files", {"id": "other", "user_id": "user-1"})
+    fake_supabase.insert_row(
+        "jobs",
+        {
+            "id": "job-1",
+            "user_id": "user-1",
+            "file_id": "other",
+            "kind": JobKind.EXTRACT.value,
+            "status": JobStatus.QUEUED.value,
+            "meta": {},
+        },
+    )
+
+    tasks.job_extract("job-1")
+
+    job = fake_supabase.table_select_single("jobs", match={"id": "job-1"})
+    assert job["meta"]["validations"]["identity"]
+    (payslip,) = fake_supabase.tables["payslips"]
+    assert payslip["other_deductions"] == 100.0
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from apps.worker.services.native import parse_native
+from apps.worker.services.pdf import PageWord, PdfText
+
+
+def _text(raw: str) -> PdfText:
+    return PdfText(raw_text=raw, has_text=True)
+
+
+def _words(rows):
+    words = []
+    for line, cells in enumerate(rows):
+        for text, x0 in cells:
+            words.append(PageWord(page=0, line=line, text=text, x0=x0, y0=line * 0.05, x1=x0 + 0.04, y1=line * 0.05 + 0.02))
+    return words
+
+
+def test_parse_native_fills_every_field_from_labelled_rows():
+    native = parse_native(
+        _text(
+            "ACME Payroll\n"
+            "Employer: ACME Ltd   Pay Date: 28/03/2024\n"
+            "Pay Period: 01/03/2024 - 31/03/2024\n"
+            "NI Number: QQ123456C   Tax Code: 1257L   HMRC PAYE ref: 123/AB1234\n"
+            "Gross Pay: £3,200.00\n"
+            "Income Tax: £520.00   National Insurance: £280.00\n"
+            "Pension (Employee) 5%: £160.00   Employer Pension: £96.00\n"
+            "Student Loan: £75.00   Other Deductions: (£10.00)\n"
+            "Net Pay: £2,155.00   Net Pay YTD: £25,860.00\n"
+        )
+    )
+    assert native.employer_name == "ACME Ltd"
+    assert (native.pay_date, native.period_start, native.period_end) == ("2024-03-28", "2024-03-01", "2024-03-31")
+    assert (native.country, native.currency, native.tax_code) == ("UK", "GBP", "1257L")
+    assert (native.gross, native.net, native.tax_income, native.ni_prsi) == (3200.0, 2155.0, 520.0, 280.0)
+    assert (native.pension_employee, native.pension_employer, native.student_loan) == (160.0, 96.0, 75.0)
+    assert native.other_deductions == 10.0
+    assert native.ytd == {"net": 25860.0}
+
+
+def test_short_labels_only_match_whole_words():
+    native = parse_native(
+        _text(
+            "Internet allowance 45.00\n"
+            "Nightshift premium 120.00\n"
+            "Taxable Pay 2,800.00\n"
+            "Tax Credits: S1\n"
+            "PPS No: 1234567T\n"
+            "Netflix Ltd 9.99\n"
+            "PRSI: €112.00\n"
+        )
+    )
+    assert native.net is None
+    assert native.tax_income is None
+    assert native.tax_code is None
+    assert native.ni_prsi == 112.0
+    assert native.country == "IE"
+
+
+def test_garbled_currency_glyphs_do_not_hide_amounts():
+    native = parse_native(_text("Gross Pay: (cid:226)(cid:130)‹3,000.00\nNet Pay: ´£2,280.00"))
+    assert (native.gross, native.net) == (3000.0, 2280.0)
+
+
+def test_year_to_date_column_is_kept_apart_from_current_period():
+    words = _words(
+        [
+            [("This", 0.5), ("Period", 0.56), ("Year", 0.75), ("to", 0.8), ("Date", 0.84)],
+            [("Gross", 0.05), ("Pay", 0.12), ("3,200.00", 0.52), ("38,400.00", 0.78)],
+            [("Income", 0.05), ("Tax", 0.12), ("6,240.00", 0.78)],
+            [("Net", 0.05), ("Pay", 0.12), ("2,165.00", 0.52)],
+        ]
+    )
+    native = parse_native(PdfText(raw_text="", has_text=True, words=words))
+    assert (native.gross, native.net, native.tax_income) == (3200.0, 2165.0, None)
+    assert native.ytd == {"gross": 38400.0, "tax_income": 6240.0}
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import os
+
+import fitz
+import pytest
+from PIL import Image
+
+from apps.worker.services import bulk_delete, ocr_cache, pdf
+from apps.worker.services.ocr_cache import DiskOcrCache, RedisOcrCache
+from apps.worker.services.pdf import perform_ocr
+
+
+def _document(second_page_marker: bool = False) -> bytes:
+    doc = fitz.open()
+    for index in range(2):
+        page = doc.new_page(width=200, height=100)
+        page.draw_rect(fitz.Rect(10 + index * 20, 10, 60 + index * 20, 40), color=(0, 0, 0), fill=(0, 0, 0))
+        if index == 1 and second_page_marker:
+            page.draw_rect(fitz.Rect(150, 60, 190, 90), color=(0, 0, 0), fill=(0, 0, 0))
+    return doc.tobytes()
+
+
+def _counting_tesseract(monkeypatch):
+    calls = []
+
+    def fake_image_to_data(image, *, lang, psm, engine, dpi=None):
+        calls.append(image.getbbox())
+        box = image.getbbox() or (0, 0, 0, 0)
+        return {"text": [f"page{box[0]}"], "conf": [95.0], "block_num": [1], "par_num": [1], "line_num": [1],
+                "left": [box[0]], "top": [box[1]], "width": [20], "height": [10]}
+
+    monkeypatch.setattr(pdf, "resolve_ocr_engine", lambda engine: "fake")
+    monkeypatch.setattr(pdf, "image_to_data", fake_image_to_data)
+    return calls
+
+
+def test_only_changed_pages_are_ocred_again(monkeypatch, tmp_path):
+    calls = _counting_tesseract(monkeypatch)
+    cache = DiskOcrCache(tmp_path, max_bytes=1 << 20)
+
+    # Unscoped calls could never be purged, so they bypass the cache.
+    perform_ocr(_document(), dpi=72, cache=cache)
+    assert len(calls) == 2 and cache.stats()["misses"] == 0
+    calls.clear()
+
+    first = perform_ocr(_document(), dpi=72, cache=cache, cache_scope="user-1")
+    assert len(calls) == 2 and cache.stats()["misses"] == 2
+
+    # A re-upload renders identical pixels: nothing reaches Tesseract and nothing counts as read.
+    again = perform_ocr(_document(), dpi=72, cache=cache, cache_scope="user-1")
+    assert len(calls) == 2
+    assert again.raw_text == first.raw_text and again.ocr_pixels[0] == 0
+    assert cache.stats()["hits"] == 2
+
+    perform_ocr(_document(second_page_marker=True), dpi=72, cache=cache, cache_scope="user-1")
+    assert len(calls) == 3
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (3, 3)
+
+    # Another user's identical pages are not shared.
+    perform_ocr(_document(), dpi=72, cache=cache, cache_scope="user-2")
+    assert len(calls) == 5
+
+
+def test_disk_cache_evicts_least_recently_used_entries(tmp_path):
+    cache = DiskOcrCache(tmp_path, max_bytes=400)
+    images = [Image.new("L", (8, 8), color=shade) for shade in (0, 60, 120, 180)]
+    payload = {"text": ["x" * 100]}
+    for image in images[:3]:
+        cache.fetch(image, scope="u", lang="eng", psm=6, engine="fake", compute=lambda: payload)
+    entries = sorted(tmp_path.glob("*/*.json"), key=lambda path: path.stat().st_mtime)
+    for age, entry in enumerate(entries):
+        os.utime(entry, (1_000 + age, entry.stat().st_mtime))
+    # Reading the oldest entry makes it the most recently used.
+    cache.fetch(images[0], scope="u", lang="eng", psm=6, engine="fake", compute=lambda: {"text": ["miss"]})
+    cache.fetch(images[3], scope="u", lang="eng", psm=6, engine="fake", compute=lambda: payload)
+
+    stats = cache.stats()
+    assert stats["evictions"] >= 1
+    assert sum(path.stat().st_size for path in tmp_path.glob("*/*.json")) <= 400
+    miss = {"text": ["miss"]}
+    assert cache.fetch(images[0], scope="u", lang="eng", psm=6, engine="fake", compute=lambda: miss) == payload
+    assert cache.fetch(images[1], scope="u", lang="eng", psm=6, engine="fake", compute=lambda: miss) == miss
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values, self.ttls, self.sets = {}, {}, {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key], self.ttls[key] = value, ex
+
+    def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(member)
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    def delete(self, *keys):
+        removed = sum(self.values.pop(key, None) is not None for key in keys)
+        return removed + sum(self.sets.pop(key, None) is not None for key in keys)
+
+
+def test_redis_cache_scopes_keys_by_user_and_purges_them():
+    client = FakeRedis()
+    cache = RedisOcrCache(client)
+    image = Image.new("L", (8, 8), color=255)
+    for scope, lang, text in (("u1", "eng", "a"), ("u1", "eng+gle", "b"), ("u2", "eng", "c")):
+        cache.fetch(image, scope=scope, lang=lang, psm=6, engine="fake", compute=lambda text=text: {"text": [text]})
+    assert cache.fetch(image, scope="u1", lang="eng", psm=6, engine="fake", compute=lambda: {}) == {"text": ["a"]}
+    assert len(client.values) == 3 and all(key.startswith("ocr:v1:u") for key in client.values)
+    # Nothing outlives the shortest (30-day) retention window.
+    assert set(client.ttls.values()) == {ocr_cache.CACHE_TTL_SECONDS} and ocr_cache.CACHE_TTL_SECONDS < 30 * 86400
+
+    assert cache.purge(["u1"]) == 2
+    assert [key.split(":")[2] for key in client.values] == ["u2"]
+    assert cache.fetch(image, scope="u1", lang="eng", psm=6, engine="fake", compute=lambda: {"text": ["new"]}) == {
+        "text": ["new"]
+    }
+
+
+def test_disk_cache_expires_and_purges_per_user(tmp_path):
+    cache = DiskOcrCache(tmp_path, max_bytes=1 << 20, ttl=60)
+    image = Image.new("L", (8, 8), color=0)
+    cache.fetch(image, scope="u1", lang="eng", psm=6, engine="fake", compute=lambda: {"text": ["a"]})
+    cache.fetch(image, scope="u2", lang="eng", psm=6, engine="fake", compute=lambda: {"text": ["b"]})
+    (entry,) = [path for path in tmp_path.glob("*/*.json") if path.read_bytes() == b'{"text":["a"]}']
+    os.utime(entry, (1_000, 1_000))
+    assert cache.fetch(image, scope="u1", lang="eng", psm=6, engine="fake", compute=lambda: {"text": ["x"]}) == {
+        "text": ["x"]
+    }
+
+    assert cache.purge(["u1"]) == 1
+    assert [path.read_bytes() for path in tmp_path.glob("*/*.json")] == [b'{"text":["b"]}']
+
+
+def test_user_deletion_purges_cached_ocr(monkeypatch, fake_supabase, fake_storage, tmp_path):
+    cache = DiskOcrCache(tmp_path, max_bytes=1 << 20)
+    cache.fetch(Image.new("L", (8, 8)), scope="user-1", lang="eng", psm=6, engine="fake", compute=lambda: {})
+    monkeypatch.setattr(ocr_cache, "get_ocr_cache", lambda: cache)
+    monkeypatch.setattr(bulk_delete, "get_supabase", lambda: fake_supabase)
+    monkeypatch.setattr(bulk_delete, "get_storage_service", lambda: fake_storage)
+
+    report = bulk_delete.delete_users(["user-1"])
+    assert report.rows["ocr_cache"] == 1
+    assert not list(tmp_path.glob("*/*.json"))
+
+
+def test_redis_cache_refuses_the_celery_broker(monkeypatch):
+    from apps.common.config import get_settings
+
+    monkeypatch.setenv("REDIS_URL", "rediss://broker.internal:6380/0")
+    get_settings.cache_clear()
+    try:
+        with pytest.raises(ValueError):
+            ocr_cache._build_cache("rediss://broker.internal:6380/5")
+        with pytest.raises(ValueError):
+            ocr_cache._build_cache("redis")
+    finally:
+        get_settings.cache_clear()
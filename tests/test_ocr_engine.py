@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import io
+import types
+
+import fitz
+import pytest
+from PIL import Image
+
+from apps.worker.services import ocr_engine, pdf
+from apps.worker.services.pdf import _ocr_page, perform_ocr
+
+TSV = (
+    "1\t1\t0\t0\t0\t0\t0\t0\t200\t100\t-1\t\n"
+    "5\t1\t1\t1\t1\t1\t10\t10\t40\t12\t96.1\tGross\n"
+    "5\t1\t1\t1\t1\t2\t60\t10\t30\t12\t95.0\tPay\n"
+    "5\t1\t1\t1\t1\t3\t120\t10\t70\t12\t91.4\t3,200.00\n"
+    "5\t1\t1\t1\t2\t1\t10\t40\t30\t12\t93.2\tNet\n"
+)
+
+
+def _fake_tesserocr(opened, images, resolutions):
+    class PyTessBaseAPI:
+        def __init__(self, lang, psm):
+            opened.append((lang, psm))
+
+        def SetImageBytes(self, data, width, height, bytes_per_pixel, bytes_per_line):
+            images.append((len(data), width, height, bytes_per_pixel, bytes_per_line))
+
+        def SetSourceResolution(self, ppi):
+            resolutions.append(ppi)
+
+        def GetTSVText(self, page):
+            return TSV
+
+        def Clear(self):
+            pass
+
+        def End(self):
+            pass
+
+    return types.SimpleNamespace(PyTessBaseAPI=PyTessBaseAPI)
+
+
+@pytest.fixture
+def fake_tesserocr(monkeypatch):
+    opened, images, resolutions = [], [], []
+    module = _fake_tesserocr(opened, images, resolutions)
+    monkeypatch.setattr(ocr_engine, "load_backend", lambda name: module if name == "tesserocr" else None)
+    monkeypatch.setattr(ocr_engine, "_HANDLES", ocr_engine._TesseractHandles())
+    return opened, images, resolutions
+
+
+def test_tesserocr_handle_is_opened_once_per_process(monkeypatch, fake_tesserocr):
+    opened, images, resolutions = fake_tesserocr
+    assert ocr_engine.resolve_ocr_engine("tesserocr,pytesseract") == "tesserocr"
+    image = Image.new("RGB", (200, 100), "white")
+    for dpi in (300, 100, 300):
+        data = ocr_engine.image_to_data(image, lang="eng+gle", psm=6, engine="tesserocr", dpi=dpi)
+    assert opened == [("eng+gle", 6)]
+    # Grayscale pixels go straight into the handle, with no PNG round trip or subprocess.
+    assert images[-1] == (200 * 100, 200, 100, 1, 200)
+    # Raw buffers carry no resolution; every page tells the shared handle its render DPI.
+    assert resolutions == [300, 100, 300]
+
+    text, words = _ocr_page(data, 0, 200, 100)
+    assert text.splitlines() == ["Gross Pay 3,200.00", "Net"]
+    assert words[2].text == "3,200.00" and words[2].x0 == pytest.approx(0.6)
+
+    monkeypatch.setattr(ocr_engine.os, "getpid", lambda: -1)
+    ocr_engine.image_to_data(image, lang="eng+gle", psm=6, engine="tesserocr")
+    assert len(opened) == 2
+
+
+def test_unknown_or_missing_engines(monkeypatch):
+    monkeypatch.setattr(ocr_engine, "load_backend", lambda name: None)
+    assert ocr_engine.resolve_ocr_engine("tesserocr,pytesseract") is None
+    with pytest.raises(ValueError):
+        ocr_engine.resolve_ocr_engine("easyocr")
+
+
+def _confidence_by_language(monkeypatch, scores):
+    calls = []
+
+    def fake_image_to_data(image, *, lang, psm, engine, dpi=None):
+        calls.append(lang)
+        row = {"block_num": 1, "par_num": 1, "line_num": 1, "top": 10, "height": 12, "conf": scores[lang]}
+        words = [{**row, "text": "Gross", "left": 10, "width": 40}, {**row, "text": "3,200.00", "left": 120, "width": 70}]
+        return {key: [word[key] for word in words] for key in words[0]}
+
+    monkeypatch.setattr(pdf, "resolve_ocr_engine", lambda engine: "fake")
+    monkeypatch.setattr(pdf, "image_to_data", fake_image_to_data)
+    return calls
+
+
+def _scan() -> bytes:
+    doc = fitz.open()
+    doc.new_page(width=200, height=100)
+    return doc.tobytes()
+
+
+def test_ocr_starts_with_minimal_languages_and_escalates_on_low_confidence(monkeypatch):
+    calls = _confidence_by_language(monkeypatch, {"eng": 91.0, "eng+gle": 88.0, "eng+enm+gle": 80.0})
+    text = perform_ocr(_scan(), dpi=72, country="UK")
+    assert calls == ["eng"]
+    assert (text.ocr_languages, text.confidence) == (["eng"], 91.0)
+
+    calls = _confidence_by_language(monkeypatch, {"eng": 52.0, "eng+gle": 84.0, "eng+enm+gle": 90.0})
+    text = perform_ocr(_scan(), dpi=72, country=ocr_engine.ocr_country(None, "EUR"))
+    assert calls == ["eng", "eng+gle"]
+    assert text.ocr_languages == ["eng+gle"] and text.raw_text == "Gross 3,200.00"
+
+    # Nothing reaches the threshold: keep the most confident reading rather than the last one.
+    calls = _confidence_by_language(monkeypatch, {"eng": 65.0, "eng+gle": 40.0, "eng+enm+gle": 30.0})
+    text = perform_ocr(_scan(), dpi=72, country=None)
+    assert calls == ["eng", "eng+enm+gle"]
+    assert (text.ocr_languages, text.confidence) == (["eng"], 65.0)
+
+    calls = _confidence_by_language(monkeypatch, {"eng+enm+gle": 20.0})
+    assert perform_ocr(_scan(), dpi=72, languages=["eng", "enm", "gle"]).ocr_languages == ["eng+enm+gle"]
+    assert calls == ["eng+enm+gle"]
+
+
+# Words on an A4 page rendered at 300 DPI (2479 x 3508 px): (text, left, top, width).
+PAGE_WORDS = [
+    ("Employer:", 200, 300, 180), ("ACME", 400, 300, 110), ("Ltd", 530, 300, 60),
+    ("Gross", 200, 800, 110), ("Pay", 330, 800, 70), ("3,200.00", 1700, 800, 170),
+    ("Income", 200, 880, 130), ("Tax", 350, 880, 70), ("520.00", 1740, 880, 130),
+    ("Net", 200, 960, 70), ("Pay", 290, 960, 70), ("2,680.00", 1700, 960, 170),
+    ("Thank", 200, 2600, 120), ("you", 340, 2600, 70), ("for", 430, 2600, 60), ("your", 510, 2600, 90),
+]
+
+
+def _fake_page_ocr(monkeypatch, page_words, scout_misreads=None):
+    """Serve ``page_words`` from Tesseract for whichever part of the page (scout, crop) is read.
+
+    ``scout_misreads`` maps words to what a low-DPI whole-page read sees instead.
+    """
+
+    crops = []
+    real_crop = Image.Image.crop
+
+    def tracking_crop(self, box=None):
+        cropped = real_crop(self, box)
+        cropped.info["box"] = box
+        crops.append(box)
+        return cropped
+
+    def fake_image_to_data(image, *, lang, psm, engine, dpi=None):
+        scale = image.width / 2479 if "box" not in image.info else 1.0
+        left, top = image.info.get("box", (0, 0))[:2]
+        rows = [
+            (text, (x * scale) - left, (y * scale) - top, w * scale)
+            for text, x, y, w in page_words
+            if 0 <= x * scale - left and x * scale - left + w * scale <= image.width
+            and 0 <= y * scale - top and y * scale - top + 40 * scale <= image.height
+        ]
+        if scale < 0.5 and scout_misreads:
+            rows = [(scout_misreads.get(row[0], row[0]), *row[1:]) for row in rows]
+        return {
+            "text": [row[0] for row in rows],
+            "conf": [92.0] * len(rows),
+            "block_num": [1] * len(rows),
+            "par_num": [1] * len(rows),
+            "line_num": [int(row[2] + top) for row in rows],
+            "left": [int(row[1]) for row in rows],
+            "top": [int(row[2]) for row in rows],
+            "width": [int(row[3]) for row in rows],
+            "height": [int(40 * scale)] * len(rows),
+        }
+
+    monkeypatch.setattr(Image.Image, "crop", tracking_crop)
+    monkeypatch.setattr(pdf, "resolve_ocr_engine", lambda engine: "fake")
+    monkeypatch.setattr(pdf, "image_to_data", fake_image_to_data)
+    return crops
+
+
+def _a4_scan() -> bytes:
+    doc = fitz.open()
+    doc.new_page(width=595, height=842)
+    return doc.tobytes()
+
+
+def test_region_ocr_reads_only_labelled_bands(monkeypatch):
+    from apps.worker.services.native import label_regions, parse_native
+
+    crops = _fake_page_ocr(monkeypatch, PAGE_WORDS)
+    text = perform_ocr(_a4_scan(), country="UK", locate_regions=label_regions)
+    native = parse_native(text)
+    assert (native.employer_name, native.gross, native.tax_income, native.net) == ("ACME Ltd", 3200.0, 520.0, 2680.0)
+    assert "Thank" not in text.raw_text
+    assert len(crops) == 2
+    read, whole = text.ocr_pixels
+    assert read * 5 < whole
+    gross = next(word for word in text.words if word.text == "3,200.00")
+    assert gross.x0 == pytest.approx(1700 / 2479, abs=0.002) and gross.y0 == pytest.approx(800 / 3508, abs=0.002)
+
+
+def test_region_read_pages_are_never_painted_in_place(monkeypatch):
+    from apps.worker.services.native import label_regions
+    from apps.worker.services.redaction import redact_text, redacted_preview
+    from apps.worker.tasks import _redaction_geometry
+
+    personal = [("NI", 200, 1200, 50), ("Number", 270, 1200, 150), ("AB123456C", 1500, 1200, 260)]
+    # At scout DPI the NI number comes back mangled, so no identifier pattern would catch it.
+    _fake_page_ocr(monkeypatch, PAGE_WORDS + personal, scout_misreads={"AB123456C": "A8l2345GC"})
+    data = _a4_scan()
+    renditions = pdf.PageRenditions(data)
+    ocr_text = perform_ocr(data, country="UK", locate_regions=label_regions, renditions=renditions)
+    assert "AB123456C" not in ocr_text.raw_text and ocr_text.whole_pages == []
+
+    layer = pdf.PdfText(raw_text="", has_text=False, pages=[pdf.classify_page(0, [], 1.0)], page_count=1)
+    words, covered = _redaction_geometry(layer, ocr_text)
+    result = redact_text(ocr_text.raw_text, words, covered_pages=covered)
+    assert result.geometry_pages == []
+
+    # The 300 DPI raster never reaches the preview (or the LLM): the redacted text is rendered instead.
+    preview = renditions.page(0, consumer="preview")
+    assert Image.open(io.BytesIO(redacted_preview(result, preview))).size == (900, 1200)
+    assert not preview.rendered
\ No newline at end of file
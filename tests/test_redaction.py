@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import io
+from pathlib import Path
+
+from PIL import Image
+
+from apps.worker.services.pdf import PageRenditions, PageWord, RasterizedPage
+from apps.worker.services.redaction import (
+    BOX_PADDING,
+    REDACTION_CHAR,
+    find_sensitive_spans,
+    redact_text,
+    redacted_preview,
+)
+
+
+def test_spans_report_real_offsets():
+    raw = "Employee NI: AB123456C\nDOB 01/02/1990\nAddress: 12 High Street, SW1A 1AA"
+    spans = find_sensitive_spans(raw)
+    labels = [span.label for span in spans]
+    assert labels == ["ni", "dob", "address", "address"]
+    assert raw[spans[0].start : spans[0].end] == "AB123456C"
+    assert raw[spans[1].start : spans[1].end] == "01/02/1990"
+    assert raw[spans[2].start : spans[2].end] == "12 High Street"
+    assert raw[spans[3].start : spans[3].end] == "SW1A 1AA"
+
+
+def test_redaction_preserves_length_and_masks_only_spans():
+    raw = "PPS 1234567A paid to IE29AIBK93115212345678 on 31/03/2024"
+    result = redact_text(raw)
+    assert len(result.redacted_text) == len(raw)
+    for span in result.spans:
+        assert result.redacted_text[span.start : span.end] == REDACTION_CHAR * (span.end - span.start)
+    assert result.redacted_text.startswith("PPS ")
+    assert "paid to" in result.redacted_text
+    assert [span.label for span in result.spans] == ["pps", "iban", "dob"]
+
+
+def test_repeated_tokens_are_each_reported():
+    raw = "AB123456C " * 50
+    result = redact_text(raw)
+    assert len(result.spans) == 50
+    assert result.redacted_text.strip(REDACTION_CHAR + " ") == ""
+
+
+def _words(*rows):
+    words = []
+    for line, row in enumerate(rows):
+        x = 0.1
+        for token in row.split():
+            words.append(PageWord(page=0, line=line, text=token, x0=x, y0=0.1 * (line + 1), x1=x + 0.05, y1=0.1 * (line + 1) + 0.02))
+            x += 0.06
+    return words
+
+
+def test_boxes_follow_word_geometry():
+    words = _words("Employee NI AB123456C", "Address 12 High Street")
+    result = redact_text("Employee NI AB123456C\nAddress 12 High Street", words)
+    assert result.geometry_pages == [0]
+    ni_box, address_box = result.boxes
+    assert ni_box["label"] == "ni"
+    assert abs(ni_box["x"] - (0.22 - BOX_PADDING)) < 1e-9
+    assert abs(ni_box["y"] - (0.1 - BOX_PADDING)) < 1e-9
+    assert address_box["label"] == "address"
+    assert abs(address_box["w"] - (0.17 + 2 * BOX_PADDING)) < 1e-9
+
+
+def test_preview_paints_boxes_on_page_raster():
+    image = Image.new("RGB", (200, 100), color="white")
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    page = RasterizedPage(index=0, png_bytes=buf.getvalue())
+    result = redact_text("AB123456C", [PageWord(page=0, line=0, text="AB123456C", x0=0.25, y0=0.25, x1=0.75, y1=0.75)])
+    painted = Image.open(io.BytesIO(redacted_preview(result, page)))
+    assert painted.size == (200, 100)
+    assert painted.getpixel((100, 50)) == (0, 0, 0)
+    assert painted.getpixel((5, 5)) == (255, 255, 255)
+
+
+def test_preview_without_geometry_renders_redacted_text():
+    page = RasterizedPage(index=0, png_bytes=b"")
+    result = redact_text("NI AB123456C")
+    assert result.boxes == []
+    preview = Image.open(io.BytesIO(redacted_preview(result, page)))
+    assert preview.size == (900, 1200)
+
+
+def test_lazy_preview_skips_raster_without_geometry():
+    renditions = PageRenditions(Path("scripts/fixtures/uk_scan.pdf").read_bytes())
+    page = renditions.page(0, consumer="preview")
+    redacted_preview(redact_text("NI AB123456C"), page)
+    assert not page.rendered
+    assert renditions.used == []
+
+
+def test_renditions_share_rasters_between_consumers():
+    renditions = PageRenditions(Path("scripts/fixtures/uk_text.pdf").read_bytes(), dpi=72)
+    ocr_png = renditions.render(0, consumer="ocr")
+    result = redact_text("AB123456C", [PageWord(page=0, line=0, text="AB123456C", x0=0.2, y0=0.2, x1=0.4, y1=0.3)])
+    page = renditions.page(0, consumer="preview")
+    painted = redacted_preview(result, page)
+    assert page.png_bytes is ocr_png
+    assert Image.open(io.BytesIO(painted)).size == Image.open(io.BytesIO(ocr_png)).size
+    assert renditions.used == [
+        {"consumer": "ocr", "page": 0, "dpi": 72, "cached": False},
+        {"consumer": "preview", "page": 0, "dpi": 72, "cached": True},
+    ]
+
+
+def test_pages_with_unread_images_are_not_painted_in_place():
+    import fitz
+
+    from apps.worker.services.text_engine import extract_text
+    from apps.worker.tasks import _redaction_geometry
+
+    doc = fitz.open()
+    for scanned_block in (False, True):
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((56, 90), "Employee NI AB123456C Gross Pay 3,200.00", fontname="helv", fontsize=11)
+        if scanned_block:
+            pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 40, 10), False)
+            pixmap.clear_with(40)
+            page.insert_image(fitz.Rect(56, 400, 356, 475), pixmap=pixmap)
+    data = doc.tobytes()
+    text = extract_text(data, early_exit=False)
+    assert [page.kind for page in text.pages] == ["text", "text"]
+
+    words, covered = _redaction_geometry(text, None)
+    result = redact_text(text.raw_text, words, covered_pages=covered)
+    assert result.geometry_pages == [0]
+    renditions = PageRenditions(data, dpi=72)
+    painted = Image.open(io.BytesIO(redacted_preview(result, renditions.page(0, consumer="preview"))))
+    assert painted.size == (595, 842)
+    # The image block on page 1 was never read, so its raster must not be uploaded.
+    scanned = renditions.page(1, consumer="preview")
+    assert Image.open(io.BytesIO(redacted_preview(result, scanned))).size == (900, 1200)
+    assert not scanned.rendered
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+from apps.common.models import JobKind, JobStatus
+from apps.worker.services.report_cache import lookup_report, payload_digest, purge_invalidated_reports, store_report
+from apps.worker.tasks import job_dossier, job_hr_pack
+
+
+def _patch(monkeypatch, fake_supabase, fake_storage):
+    monkeypatch.setattr("apps.worker.tasks.get_supabase", lambda: fake_supabase)
+    monkeypatch.setattr("apps.worker.tasks._ensure_storage_service", lambda: fake_storage)
+    monkeypatch.setattr("apps.worker.services.reports.get_supabase", lambda: fake_supabase)
+    monkeypatch.setattr("apps.worker.services.report_cache.get_supabase", lambda: fake_supabase)
+
+
+def _queue(fake_supabase, kind, meta):
+    return fake_supabase.insert_row(
+        "jobs",
+        {"user_id": "user-1", "kind": kind, "status": JobStatus.QUEUED.value, "meta": meta},
+    )["id"]
+
+
+def test_payload_digest_ignores_key_order():
+    assert payload_digest("dossier", {"a": 1, "b": [1, 2]}) == payload_digest("dossier", {"b": [1, 2], "a": 1})
+    assert payload_digest("dossier", {"a": 1}) != payload_digest("hr_pack", {"a": 1})
+
+
+def test_repeat_dossier_reuses_cached_artifact(monkeypatch, fake_supabase, fake_storage):
+    _patch(monkeypatch, fake_supabase, fake_storage)
+    first = _queue(fake_supabase, JobKind.DOSSIER.value, {"year": 2024})
+    job_dossier(first)
+    uploads = dict(fake_storage.uploads)
+    first_meta = fake_supabase.table_select_single("jobs", match={"id": first})["meta"]
+
+    second = _queue(fake_supabase, JobKind.DOSSIER.value, {"year": 2024})
+    job_dossier(second)
+    second_row = fake_supabase.table_select_single("jobs", match={"id": second})
+    assert second_row["status"] == JobStatus.DONE.value
+    assert second_row["meta"]["download_url"] == first_meta["download_url"]
+    assert second_row["meta"]["cached"] is True
+    assert fake_storage.uploads == uploads
+
+    # Payslip inserts invalidate the cache (via trigger in Postgres).
+    for row in fake_supabase.tables["report_cache"]:
+        row["invalidated_at"] = "2024-06-01T00:00:00Z"
+    third = _queue(fake_supabase, JobKind.DOSSIER.value, {"year": 2024})
+    job_dossier(third)
+    third_meta = fake_supabase.table_select_single("jobs", match={"id": third})["meta"]
+    assert "cached" not in third_meta
+    assert len(fake_supabase.tables["report_cache"]) == 1
+    assert fake_supabase.tables["report_cache"][0]["invalidated_at"] is None
+
+
+def test_hr_pack_cache_key_ignores_signed_url(monkeypatch, fake_supabase, fake_storage):
+    _patch(monkeypatch, fake_supabase, fake_storage)
+    fake_supabase.insert_row("files", {"id": "f1", "user_id": "user-1", "s3_key_redacted": "user-1/f1_redacted.png"})
+    fake_storage.uploads["user-1/f1_redacted.png"] = b""
+    calls = iter(range(100))
+    monkeypatch.setattr(fake_storage, "create_signed_url", lambda path, expires_in=300: f"https://s/{path}?t={next(calls)}")
+
+    first = _queue(fake_supabase, JobKind.HR_PACK.value, {"payload": {"summary": "ok"}})
+    job_hr_pack(first)
+    second = _queue(fake_supabase, JobKind.HR_PACK.value, {"payload": {"summary": "ok"}})
+    job_hr_pack(second)
+    second_meta = fake_supabase.table_select_single("jobs", match={"id": second})["meta"]
+    assert second_meta["cached"] is True
+    assert second_meta["download_url"].endswith("hr_pack.pdf")
+
+
+def test_hr_pack_misses_when_the_preview_is_re_extracted(monkeypatch, fake_supabase, fake_storage):
+    _patch(monkeypatch, fake_supabase, fake_storage)
+    fake_supabase.insert_row("files", {"id": "f1", "user_id": "user-1", "s3_key_redacted": "user-1/f1_redacted.png"})
+    fake_storage.uploads["user-1/f1_redacted.png"] = b"first preview"
+    first = _queue(fake_supabase, JobKind.HR_PACK.value, {"payload": {"summary": "ok"}})
+    job_hr_pack(first)
+
+    # Re-extraction writes the new preview to the same path.
+    fake_storage.uploads["user-1/f1_redacted.png"] = b"second preview"
+    second = _queue(fake_supabase, JobKind.HR_PACK.value, {"payload": {"summary": "ok"}})
+    job_hr_pack(second)
+    first_meta, second_meta = (
+        fake_supabase.table_select_single("jobs", match={"id": job})["meta"] for job in (first, second)
+    )
+    assert "cached" not in second_meta
+    assert second_meta["download_url"] != first_meta["download_url"]
+
+
+def test_purge_keeps_artifacts_that_jobs_still_hand_out(monkeypatch, fake_supabase):
+    monkeypatch.setattr("apps.worker.services.report_cache.get_supabase", lambda: fake_supabase)
+    deleted = []
+    storage = type("Storage", (), {"delete_objects": lambda self, paths: deleted.extend(paths)})()
+    for digest in ("a", "b"):
+        fake_supabase.insert_row(
+            "report_cache",
+            {
+                "user_id": "user-1",
+                "kind": "dossier",
+                "digest": digest,
+                "storage_path": f"user-1/{digest}_dossier.pdf",
+                "invalidated_at": "2024-06-01T00:00:00Z",
+            },
+        )
+    fake_supabase.insert_row(
+        "jobs",
+        {"user_id": "user-1", "kind": "dossier", "status": "done", "meta": {"download_url": "user-1/a_dossier.pdf"}},
+    )
+
+    assert purge_invalidated_reports("user-1", "dossier", storage) == 1
+    assert deleted == ["user-1/b_dossier.pdf"]
+    assert [row["storage_path"] for row in fake_supabase.tables["report_cache"]] == ["user-1/a_dossier.pdf", None]
+
+
+def test_concurrent_misses_for_the_same_payload_share_one_row(monkeypatch, fake_supabase, fake_storage):
+    _patch(monkeypatch, fake_supabase, fake_storage)
+    # Both jobs look up before either has stored, as two workers racing on identical requests would.
+    first = lookup_report("user-1", "dossier", {"year": 2024})
+    second = lookup_report("user-1", "dossier", {"year": 2024})
+    assert first.storage_path is None and second.storage_path is None
+
+    store_report("user-1", "dossier", first, "user-1/a_dossier.pdf")
+    store_report("user-1", "dossier", second, "user-1/b_dossier.pdf")
+
+    (row,) = fake_supabase.tables["report_cache"]
+    assert row["storage_path"] == "user-1/b_dossier.pdf"
+    assert lookup_report("user-1", "dossier", {"year": 2024}).storage_path == "user-1/b_dossier.pdf"
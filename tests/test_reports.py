@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import base64
+
+import pytest
+
+from apps.worker.services import reports
+from apps.worker.services.reports import PREVIEW_URL, _render_html, _url_fetcher
+
+
+def test_report_template_escapes_payload_and_references_preview_by_url():
+    html = _render_html(
+        "HR Summary Pack",
+        {"summary": "<script>alert(1)</script>"},
+        preview={"url": "https://storage.local/a_redacted.png", "label": "a"},
+        has_image=True,
+    )
+    assert "<script>" not in html
+    assert f'src="{PREVIEW_URL}"' in html
+    assert "base64" not in html
+
+
+def test_report_template_omits_image_without_bytes():
+    html = _render_html("HR Summary Pack", {}, preview={"url": "https://storage.local/a.png"}, has_image=False)
+    assert "Download redacted preview" in html
+    assert "<img" not in html
+
+
+def test_url_fetcher_serves_only_in_memory_images():
+    fetch = _url_fetcher({PREVIEW_URL: b"png-bytes"})
+    assert fetch(PREVIEW_URL) == {"string": b"png-bytes", "mime_type": "image/png"}
+    with pytest.raises(ValueError):
+        fetch("https://example.com/tracker.png")
+
+
+def test_hr_pack_decodes_inline_preview_once(monkeypatch):
+    captured = {}
+
+    def fake_write_pdf(title, html, payload, *, images=None):
+        captured["html"] = html
+        captured["images"] = images
+        return b"%PDF"
+
+    monkeypatch.setattr(reports, "_write_pdf", fake_write_pdf)
+    payload = {"redacted_preview": {"url": "https://x", "image_data": base64.b64encode(b"img").decode()}}
+    reports.generate_hr_pack_pdf("user-1", payload)
+    assert captured["images"] == {PREVIEW_URL: b"img"}
+    assert "image_data" not in captured["html"]
+    assert payload["redacted_preview"]["image_data"]
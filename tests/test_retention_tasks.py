@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from apps.worker import tasks
+from apps.worker.services import bulk_delete, cleanup
+from apps.worker.services.bulk_delete import DeletionReport
+
+
+def test_retention_cleanup_fans_out_to_shards(monkeypatch, fake_supabase):
+    captured = {}
+    monkeypatch.setattr(cleanup, "get_supabase", lambda: fake_supabase)
+    monkeypatch.setattr(bulk_delete, "get_supabase", lambda: fake_supabase)
+
+    def fake_chord(header):
+        captured["header"] = list(header)
+        return lambda callback: captured.setdefault("callback", callback)
+
+    monkeypatch.setenv("RETENTION_SHARDS", "3")
+    monkeypatch.setattr(tasks, "chord", fake_chord)
+    tasks.job_retention_cleanup()
+
+    assert [signature.args for signature in captured["header"]] == [(0, 3), (1, 3), (2, 3)]
+    assert captured["callback"].task == "cron.retention_finalize"
+
+
+def test_changing_the_shard_count_clears_old_cursors(monkeypatch, fake_supabase):
+    monkeypatch.setattr(cleanup, "get_supabase", lambda: fake_supabase)
+    monkeypatch.setattr(bulk_delete, "get_supabase", lambda: fake_supabase)
+    monkeypatch.setattr(tasks, "chord", lambda header: lambda callback: None)
+    cursors = {
+        "retention_cleanup:1/8": "40000000-0000-0000-0000-000000000000:2024-01-01T00:00:00+00:00:f1",
+        "retention_cleanup:1/8:payslips": "40000000-0000-0000-0000-000000000000:2024-01-01T00:00:00+00:00:p1",
+        "retention_cleanup:2/4": "90000000-0000-0000-0000-000000000000:2024-01-01T00:00:00+00:00:f2",
+        "purge": "user-1",
+    }
+    for name, cursor in cursors.items():
+        fake_supabase.insert_row("maintenance_checkpoints", {"name": name, "cursor": cursor})
+
+    monkeypatch.setenv("RETENTION_SHARDS", "4")
+    tasks.job_retention_cleanup()
+
+    remaining = {row["name"]: row["cursor"] for row in fake_supabase.tables["maintenance_checkpoints"]}
+    # The 8-shard run's ranges no longer line up; the current count's cursors and other jobs' are kept.
+    assert remaining["retention_cleanup:1/8"] is None and remaining["retention_cleanup:1/8:payslips"] is None
+    assert remaining["retention_cleanup:2/4"] == cursors["retention_cleanup:2/4"]
+    assert remaining["purge"] == "user-1"
+
+
+def test_retention_shard_uses_own_checkpoint(monkeypatch):
+    calls = {}
+
+    def fake_cleanup(**kwargs):
+        calls.update(kwargs)
+        return DeletionReport(users=1, per_user={"user-1": 2})
+
+    monkeypatch.setenv("RETENTION_STORAGE_RATE", "250")
+    monkeypatch.setattr(tasks, "retention_cleanup", fake_cleanup)
+    result = tasks.job_retention_shard(1, 4)
+
+    assert calls == {"shard": 1, "shards": 4, "max_storage_per_second": 250.0}
+    assert result["per_user"] == {"user-1": 2}
+
+
+def test_retention_finalize_bulk_inserts_events(monkeypatch, fake_supabase):
+    inserts = []
+    monkeypatch.setattr(tasks, "get_supabase", lambda: fake_supabase)
+    monkeypatch.setattr(tasks, "EVENT_BATCH_SIZE", 2)
+    monkeypatch.setattr(fake_supabase, "insert_rows", lambda table, rows: inserts.append((table, rows)))
+
+    summary = tasks.job_retention_finalize(
+        [
+            {"shard": 0, "per_user": {"user-a": 1, "user-b": 3}, "summary": {}},
+            {"shard": 1, "per_user": {"user-c": 2}, "summary": {}},
+        ]
+    )
+
+    assert summary == {"users": 3, "shards": 2, "removed": 6}
+    assert [len(rows) for _, rows in inserts] == [2, 1]
+    assert inserts[0][1][0] == {"user_id": "user-a", "type": "retention_cleanup", "payload": {"removed": 1}}
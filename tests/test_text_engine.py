@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from dataclasses import asdict
+from pathlib import Path
+
+import fitz
+import pytest
+
+from apps.worker import tasks
+from apps.worker.services import text_engine
+from apps.worker.services.native import parse_native
+from apps.worker.services.text_engine import engine_order, extract_text
+
+FIXTURES = Path(__file__).resolve().parents[1] / "scripts" / "fixtures"
+
+
+def _text_then_scan() -> bytes:
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    rows = [
+        ("Gross Pay", "£3,200.00"),
+        ("Income Tax", "£520.00"),
+        ("National Insurance", "£280.00"),
+        ("Net Pay", "£2,400.00"),
+    ]
+    for index, (label, value) in enumerate(rows):
+        page.insert_text((56, 90 + index * 22), label, fontname="helv", fontsize=11)
+        page.insert_text((360, 90 + index * 22), value, fontname="helv", fontsize=11)
+    scan = doc.new_page(width=595, height=842)
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 60, 80), False)
+    pixmap.clear_with(200)
+    pixmap.set_rect(fitz.IRect(8, 10, 52, 14), (30, 30, 30))
+    scan.insert_image(scan.rect, pixmap=pixmap)
+    return doc.tobytes()
+
+
+@pytest.mark.parametrize("fixture", ["uk_text.pdf", "ie_text.pdf", "uk_scan.pdf"])
+def test_engines_agree_on_native_fields(fixture):
+    data = (FIXTURES / fixture).read_bytes()
+    fast = extract_text(data, engines=["pymupdf"])
+    reference = extract_text(data, engines=["pdfplumber"])
+    assert (fast.engine, reference.engine) == ("pymupdf", "pdfplumber")
+    assert asdict(parse_native(fast)) == asdict(parse_native(reference))
+
+
+def test_image_pages_are_sent_to_ocr_up_front():
+    for engine in text_engine.ENGINES:
+        text = extract_text(_text_then_scan(), engines=[engine])
+        assert [page.kind for page in text.pages] == ["text", "image"]
+        assert text.pages[1].image_coverage > 0.9
+        native = parse_native(text)
+        assert not tasks._needs_ocr(native, text)
+        assert tasks._ocr_pages(native, text) == [1]
+
+
+def test_engine_order_falls_back_and_rejects_unknown_names(monkeypatch):
+    assert engine_order(" PyMuPDF , pdfplumber ") == ["pymupdf", "pdfplumber"]
+    with pytest.raises(ValueError):
+        engine_order("pymupdf,xpdf")
+    monkeypatch.setitem(text_engine.ENGINES, "pymupdf", lambda data: None)
+    text = extract_text((FIXTURES / "uk_text.pdf").read_bytes(), engines=["pymupdf", "pdfplumber"])
+    assert text.engine == "pdfplumber"
+
+
+def _bundle(pages: int, payslip_page: int) -> bytes:
+    doc = fitz.open()
+    for index in range(pages):
+        page = doc.new_page(width=595, height=842)
+        if index != payslip_page:
+            page.insert_text((56, 90), f"P60 continuation sheet {index + 1}", fontname="helv", fontsize=11)
+            continue
+        rows = [("Pay Date:", "28/03/2024"), ("Gross Pay", "£3,200.00"), ("Income Tax", "£520.00")]
+        rows.append(("Net Pay", "£2,680.00"))
+        for line, (label, value) in enumerate(rows):
+            page.insert_text((56, 90 + line * 22), label, fontname="helv", fontsize=11)
+            page.insert_text((360, 90 + line * 22), value, fontname="helv", fontsize=11)
+    return doc.tobytes()
+
+
+@pytest.mark.parametrize("engine", ["pymupdf", "pdfplumber"])
+def test_reading_stops_once_native_fields_are_complete(engine):
+    data = _bundle(12, payslip_page=1)
+    text = extract_text(data, engines=[engine])
+    assert ([page.index for page in text.pages], text.page_count) == ([0, 1], 12)
+    native = parse_native(text)
+    assert (native.pay_date, native.gross, native.net) == ("2024-03-28", 3200.0, 2680.0)
+
+    assert len(extract_text(data, engines=[engine], early_exit=False, page_cap=0).pages) == 12
+    assert len(extract_text(_bundle(12, payslip_page=11), engines=[engine], page_cap=5).pages) == 5
+
+
+def _cover_letter_bundle() -> bytes:
+    doc = fitz.open()
+    cover = doc.new_page(width=595, height=842)
+    letter = ["Dear employee,", "Please find enclosed your documents from the company.", "Kind regards, HR team"]
+    for line, sentence in enumerate(letter):
+        cover.insert_text((56, 90 + line * 18), sentence, fontname="helv", fontsize=11)
+    payslip = doc.new_page(width=595, height=842)
+    rows = [("Pay Date:", "28/03/2024"), ("Gross Pay", "£3,200.00"), ("Income Tax", "£520.00"), ("Net Pay", "£2,680.00")]
+    for line, (label, value) in enumerate(rows):
+        payslip.insert_text((56, 90 + line * 22), label, fontname="helv", fontsize=11)
+        payslip.insert_text((360, 90 + line * 22), value, fontname="helv", fontsize=11)
+    for ink in (False, True):
+        scan = doc.new_page(width=595, height=842)
+        pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 60, 80), False)
+        pixmap.clear_with(250)
+        if ink:
+            pixmap.set_rect(fitz.IRect(8, 10, 52, 14), (30, 30, 30))
+        scan.insert_image(scan.rect, pixmap=pixmap)
+    return doc.tobytes()
+
+
+def test_pages_are_ranked_and_blank_scans_skipped():
+    from apps.worker.services.page_rank import page_ink, rank_pages, score_pages
+
+    data = _cover_letter_bundle()
+    text = extract_text(data, early_exit=False)
+    ink = page_ink(data, text_engine.image_pages(text))
+    assert set(ink) == {2, 3} and ink[2] == 0.0 and ink[3] > 0.01
+    scores = {score.index: score for score in score_pages(text, ink=ink)}
+    assert scores[1].fields >= 4 and scores[2].blank
+    ranking = rank_pages(text, ink=ink)
+    # Payslip first, then the unread scan, then the cover letter; the blank back is dropped.
+    assert ranking == [1, 3, 0]
+
+    native = parse_native(text)
+    native.gross = None
+    assert tasks._ocr_pages(native, text, ranking) == [1, 3]
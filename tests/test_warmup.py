@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from apps.worker import warmup
+
+
+def test_run_warmup_runs_each_routine_once(monkeypatch):
+    calls: list[str] = []
+
+    def first() -> None:
+        calls.append("first")
+
+    def second() -> None:
+        calls.append("second")
+
+    monkeypatch.setattr(warmup, "WARMUP_ROUTINES", {"ocr": (first, second), "reports": (second,)})
+    timings = warmup.run_warmup(["ocr", "reports", "unknown"])
+    assert calls == ["first", "second"]
+    assert set(timings) == {"first", "second"}
+    assert all(value >= 0 for value in timings.values())
+
+
+def test_warmup_queue_override(monkeypatch):
+    monkeypatch.setenv("WORKER_WARMUP_QUEUES", "reports, ocr")
+    assert warmup.resolve_warmup_queues(["celery"]) == ["reports", "ocr"]
+    monkeypatch.delenv("WORKER_WARMUP_QUEUES")
+    assert warmup.resolve_warmup_queues(["celery"]) == ["celery"]
+
+
+def test_tesseract_warmup_loads_the_first_language_rung(monkeypatch):
+    import types
+
+    from PIL import Image
+
+    loaded = []
+    pytesseract = types.SimpleNamespace(image_to_data=lambda image, lang, config: loaded.append(lang))
+    monkeypatch.setattr(warmup, "load_backend", lambda name: {"pytesseract": pytesseract, "image": Image}.get(name))
+    warmup.warm_tesseract()
+    assert loaded == ["eng"]